@@ -0,0 +1,159 @@
+import os
+import tempfile
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Settings:
+    """Настройки на приложението, прочетени от environment променливи."""
+
+    def __init__(self):
+        # HTTP клиент
+        self.http_max_connections = _env_int('SEOAPP_HTTP_MAX_CONNECTIONS', 100)
+        self.http_max_keepalive = _env_int('SEOAPP_HTTP_MAX_KEEPALIVE', 20)
+        self.http_keepalive_expiry = _env_float('SEOAPP_HTTP_KEEPALIVE_EXPIRY', 30.0)
+        self.http_timeout = _env_float('SEOAPP_HTTP_TIMEOUT', 30.0)
+        self.http2 = _env_bool('SEOAPP_HTTP2', True)
+        self.http_per_host_limit = _env_int('SEOAPP_HTTP_PER_HOST_LIMIT', 4)
+        self.user_agent = os.getenv(
+            'SEOAPP_USER_AGENT',
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        )
+
+        # Кеш на резултатите (секунди за TTL-ите)
+        self.cache_enabled = _env_bool('SEOAPP_CACHE_ENABLED', True)
+        self.cache_max_bytes = _env_int('SEOAPP_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        self.cache_sqlite_path = os.getenv('SEOAPP_CACHE_SQLITE_PATH', '')
+        # Изтеклите записи в SQLite се изтриват на всеки N записа; 0 = никога
+        self.cache_purge_every = _env_int('SEOAPP_CACHE_PURGE_EVERY', 1000)
+        self.cache_ttl_whois = _env_float('SEOAPP_CACHE_TTL_WHOIS', 7 * 24 * 3600)
+        self.cache_ttl_infrastructure = _env_float('SEOAPP_CACHE_TTL_INFRASTRUCTURE', 6 * 3600)
+        self.cache_ttl_page = _env_float('SEOAPP_CACHE_TTL_PAGE', 10 * 60)
+        self.cache_ttl_sitemaps = _env_float('SEOAPP_CACHE_TTL_SITEMAPS', 6 * 3600)
+
+        # Batch анализ
+        self.batch_concurrency = _env_int('SEOAPP_BATCH_CONCURRENCY', 10)
+        self.batch_max_concurrency = _env_int('SEOAPP_BATCH_MAX_CONCURRENCY', 100)
+        self.batch_per_domain_concurrency = _env_int('SEOAPP_BATCH_PER_DOMAIN_CONCURRENCY', 2)
+        # Колонен експорт (CSV / Parquet) - редове в парче CSV / row group на Parquet
+        self.export_chunk_rows = _env_int('SEOAPP_EXPORT_CHUNK_ROWS', 5000)
+
+        # Обхождане на сайт (site crawl)
+        self.crawl_checkpoint_dir = os.getenv(
+            'SEOAPP_CRAWL_CHECKPOINT_DIR', os.path.join(tempfile.gettempdir(), 'seoapp-crawls')
+        )
+        self.crawl_max_pages = _env_int('SEOAPP_CRAWL_MAX_PAGES', 50000)
+
+        # WHOIS клиент
+        self.whois_timeout = _env_float('SEOAPP_WHOIS_TIMEOUT', 10.0)
+        self.whois_per_server_concurrency = _env_int('SEOAPP_WHOIS_PER_SERVER_CONCURRENCY', 2)
+        self.whois_per_server_interval = _env_float('SEOAPP_WHOIS_PER_SERVER_INTERVAL', 0.2)
+        self.whois_max_referrals = _env_int('SEOAPP_WHOIS_MAX_REFERRALS', 2)
+        self.whois_max_response_bytes = _env_int('SEOAPP_WHOIS_MAX_RESPONSE_BYTES', 256 * 1024)
+        # Public Suffix List за регистрируемия домейн; празно = копието в app/data
+        self.public_suffix_path = os.getenv('SEOAPP_PUBLIC_SUFFIX_PATH', '')
+
+        # Офлайн IP база (ipdb_builder); празно = изключена
+        self.ipdb_path = os.getenv('SEOAPP_IPDB_PATH', '')
+
+        # Обратен индекс IP -> домейни; празно = изключен
+        self.reverse_ip_path = os.getenv(
+            'SEOAPP_REVERSE_IP_PATH', os.path.join(tempfile.gettempdir(), 'seoapp-reverse-ip.sqlite3')
+        )
+        self.reverse_ip_limit = _env_int('SEOAPP_REVERSE_IP_LIMIT', 100)
+
+        # Process pool за парсването на HTML; 0 = в процеса на сървъра
+        self.html_pool_workers = _env_int('SEOAPP_HTML_POOL_WORKERS', min(4, os.cpu_count() or 1))
+        self.html_pool_max_queue = _env_int('SEOAPP_HTML_POOL_MAX_QUEUE', 32)
+
+        # Поточно парсване на HTML (без пълен DOM) и лимит за размера на документа
+        self.html_streaming = _env_bool('SEOAPP_HTML_STREAMING', False)
+        self.html_max_bytes = _env_int('SEOAPP_HTML_MAX_BYTES', 20 * 1024 * 1024)
+        self.html_fingerprint_bytes = _env_int('SEOAPP_HTML_FINGERPRINT_BYTES', 512 * 1024)
+
+        # Проверка на линковете (check_links); статусите се кешират между анализите
+        self.link_check_concurrency = _env_int('SEOAPP_LINK_CHECK_CONCURRENCY', 20)
+        self.link_check_timeout = _env_float('SEOAPP_LINK_CHECK_TIMEOUT', 10.0)
+        self.link_check_ttl = _env_float('SEOAPP_LINK_CHECK_TTL', 3600)
+        self.link_check_error_ttl = _env_float('SEOAPP_LINK_CHECK_ERROR_TTL', 300)
+        self.link_check_max_links = _env_int('SEOAPP_LINK_CHECK_MAX_LINKS', 500)
+        self.link_check_cache_size = _env_int('SEOAPP_LINK_CHECK_CACHE_SIZE', 100000)
+
+        # Одит на изображенията (audit_images) - чете се само началото на файловете
+        self.image_audit_concurrency = _env_int('SEOAPP_IMAGE_AUDIT_CONCURRENCY', 50)
+        self.image_audit_per_host = _env_int('SEOAPP_IMAGE_AUDIT_PER_HOST', 16)
+        self.image_audit_timeout = _env_float('SEOAPP_IMAGE_AUDIT_TIMEOUT', 10.0)
+        self.image_audit_ttl = _env_float('SEOAPP_IMAGE_AUDIT_TTL', 24 * 3600)
+        self.image_audit_error_ttl = _env_float('SEOAPP_IMAGE_AUDIT_ERROR_TTL', 300)
+        self.image_audit_max_images = _env_int('SEOAPP_IMAGE_AUDIT_MAX_IMAGES', 200)
+        self.image_audit_max_bytes = _env_int('SEOAPP_IMAGE_AUDIT_MAX_BYTES', 300 * 1024)
+        self.image_audit_max_dimension = _env_int('SEOAPP_IMAGE_AUDIT_MAX_DIMENSION', 2560)
+        self.image_audit_cache_size = _env_int('SEOAPP_IMAGE_AUDIT_CACHE_SIZE', 100000)
+
+        # robots.txt и sitemap-и: ingestion (/analyze/sitemap) и секцията robots_and_sitemaps
+        self.robots_user_agent = os.getenv('SEOAPP_ROBOTS_USER_AGENT', 'seoapp')
+        self.robots_ttl = _env_float('SEOAPP_ROBOTS_TTL', 24 * 3600)
+        self.robots_cache_size = _env_int('SEOAPP_ROBOTS_CACHE_SIZE', 10000)
+        self.sitemap_timeout = _env_float('SEOAPP_SITEMAP_TIMEOUT', 60.0)
+        self.sitemap_max_bytes = _env_int('SEOAPP_SITEMAP_MAX_BYTES', 64 * 1024 * 1024)
+        self.sitemap_max_sitemaps = _env_int('SEOAPP_SITEMAP_MAX_SITEMAPS', 1000)
+        self.sitemap_max_urls = _env_int('SEOAPP_SITEMAP_MAX_URLS', 1000000)
+        self.sitemap_scan_max_urls = _env_int('SEOAPP_SITEMAP_SCAN_MAX_URLS', 50000)
+        self.sitemap_scan_max_sitemaps = _env_int('SEOAPP_SITEMAP_SCAN_MAX_SITEMAPS', 20)
+
+        # Опашка за дълги задачи (/jobs) в SQLite; празно = изключена
+        self.jobs_path = os.getenv(
+            'SEOAPP_JOBS_PATH', os.path.join(tempfile.gettempdir(), 'seoapp-jobs.sqlite3')
+        )
+        self.jobs_workers = _env_int('SEOAPP_JOBS_WORKERS', 4)
+        self.jobs_per_tenant_concurrency = _env_int('SEOAPP_JOBS_PER_TENANT_CONCURRENCY', 2)
+        self.jobs_max_attempts = _env_int('SEOAPP_JOBS_MAX_ATTEMPTS', 3)
+        self.jobs_timeout = _env_float('SEOAPP_JOBS_TIMEOUT', 3600)
+        self.jobs_retention = _env_float('SEOAPP_JOBS_RETENTION', 7 * 24 * 3600)
+        # Колко често се изтриват задачите, по-стари от retention; 0 = само при старта
+        self.jobs_purge_interval = _env_float('SEOAPP_JOBS_PURGE_INTERVAL', 3600)
+
+        # Времена за зареждане по етапи (секция performance); пробите са последователни
+        self.performance_timeout = _env_float('SEOAPP_PERFORMANCE_TIMEOUT', 30.0)
+        self.performance_max_samples = _env_int('SEOAPP_PERFORMANCE_MAX_SAMPLES', 20)
+
+        # Timeout (секунди) на всеки етап от анализа - при изтичане секцията
+        # липсва и е в errors, а останалите секции се връщат
+        self.stage_timeout_page = _env_float('SEOAPP_STAGE_TIMEOUT_PAGE', 120.0)
+        self.stage_timeout_whois = _env_float('SEOAPP_STAGE_TIMEOUT_WHOIS', 20.0)
+        self.stage_timeout_infrastructure = _env_float('SEOAPP_STAGE_TIMEOUT_INFRASTRUCTURE', 20.0)
+        self.stage_timeout_sitemaps = _env_float('SEOAPP_STAGE_TIMEOUT_SITEMAPS', 60.0)
+        self.stage_timeout_links = _env_float('SEOAPP_STAGE_TIMEOUT_LINKS', 120.0)
+        self.stage_timeout_images = _env_float('SEOAPP_STAGE_TIMEOUT_IMAGES', 120.0)
+        self.stage_timeout_performance = _env_float('SEOAPP_STAGE_TIMEOUT_PERFORMANCE', 300.0)
+
+        # Sampling profiler за отделни заявки (?profile=true); изключен по подразбиране
+        self.profiling_enabled = _env_bool('SEOAPP_PROFILING_ENABLED', False)
+        self.profiling_interval = _env_float('SEOAPP_PROFILING_INTERVAL', 0.005)
+
+        # История на snapshot-ите; празно = изключена
+        self.snapshot_path = os.getenv(
+            'SEOAPP_SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), 'seoapp-snapshots.sqlite3')
+        )
+
+
+settings = Settings()
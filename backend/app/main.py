@@ -1,28 +1,759 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, HttpUrl
-from typing import Dict, Any
+from pydantic import BaseModel, HttpUrl, ValidationError
+from typing import Dict, Any, List, Optional
+from app.config import settings
 from app.services.analyzer import WebsiteAnalyzer
+from app.services.batch import BatchRunner, iter_file_chunks, iter_lines, iter_list, iter_urls, spool_stream
+from app.services.export import (
+    BATCH_COLUMNS, CRAWL_PAGE_COLUMNS, MEDIA_TYPES, ByteSink, Column, ExportError, filename, open_writer,
+    stream_export
+)
+from app.services.html_pool import HTMLAnalysisPool, PoolSaturated
+from app.services.image_audit import ImageAuditor
+from app.services.jobs import FINISHED_STATUSES, SUCCEEDED, JobHandler, JobQueue, get_job_store
+from app.services.link_checker import LinkChecker
+from app.services.http_client import HTTPClientPool
+from app.services.ipdb import get_ipdb
+from app.services.metrics import REGISTRY, MetricsMiddleware, Timings
+from app.services.pipeline import StageFailed
+from app.services.profiler import SamplingProfiler
+from app.services.reverse_ip import get_reverse_index
+from app.services.result_cache import ResultCache
+from app.services.single_flight import single_flight_stats
+from app.services.site_crawler import SiteCrawler, normalize_url
+from app.services.sitemaps import SitemapIngestor, new_report
+from app.services.snapshot_store import get_snapshot_store
+import asyncio
+import hashlib
+import json
 import os
 
-app = FastAPI(title="Website Intelligence / SEO Snapshot API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Един HTTP клиент за цялото приложение - връзките се преизползват между анализите
+    app.state.http_pool = HTTPClientPool.from_settings()
+    app.state.result_cache = ResultCache.from_settings() if settings.cache_enabled else None
+    # IP базата се отваря при старта, за да се види веднага грешна конфигурация
+    get_ipdb()
+    app.state.snapshot_store = get_snapshot_store()
+    # CPU стъпката (парсване на HTML) върви в отделни процеси
+    app.state.html_pool = HTMLAnalysisPool.from_settings()
+    app.state.link_checker = LinkChecker.from_settings(app.state.http_pool)
+    app.state.image_auditor = ImageAuditor.from_settings(app.state.http_pool)
+    app.state.sitemap_ingestor = SitemapIngestor.from_settings(app.state.http_pool)
+    if app.state.html_pool is not None:
+        await app.state.html_pool.warm_up()
+    _register_gauges(app)
+    # Дългите задачи (/jobs) - прекъснатите при предишното спиране се възстановяват
+    app.state.job_store = get_job_store()
+    app.state.job_queue = None
+    if app.state.job_store is not None:
+        app.state.job_queue = JobQueue.from_settings(app.state.job_store, _job_handlers(app))
+        await app.state.job_queue.start()
+    try:
+        yield
+    finally:
+        if app.state.job_queue is not None:
+            await app.state.job_queue.stop()
+        await app.state.http_pool.aclose()
+        if app.state.html_pool is not None:
+            await asyncio.to_thread(app.state.html_pool.shutdown)
+
+
+def _register_gauges(app: FastAPI):
+    """Gauge-ове за /metrics, които се четат от състоянието на приложението."""
+    http_pool = app.state.http_pool
+    REGISTRY.gauge(
+        'seoapp_http_pool_requests', 'Заявки в споделения HTTP клиент (в ход и чакащи лимита за host)',
+        ('state',)
+    ).set_function(lambda: {
+        ('in_flight',): http_pool.stats()['requests_in_flight'],
+        ('waiting_for_host',): http_pool.stats()['requests_waiting_for_host'],
+    })
+
+    REGISTRY.gauge(
+        'seoapp_single_flight_inflight', 'Споделени изчисления в ход по вид', ('flight',)
+    ).set_function(lambda: {
+        (name,): stats['inflight'] for name, stats in single_flight_stats().items()
+    })
+
+    html_pool = app.state.html_pool
+    if html_pool is not None:
+        REGISTRY.gauge(
+            'seoapp_html_pool_queue_depth', 'Задачи, чакащи свободен worker в HTML pool-а'
+        ).set_function(lambda: {(): html_pool.stats()['queue_depth']})
+        REGISTRY.gauge(
+            'seoapp_html_pool_busy_workers', 'Заети worker-и в HTML pool-а'
+        ).set_function(lambda: {(): html_pool.stats()['busy_workers']})
+        REGISTRY.gauge(
+            'seoapp_html_pool_workers', 'Брой worker-и в HTML pool-а'
+        ).set_function(lambda: {(): html_pool.workers})
+
+
+app = FastAPI(title="Website Intelligence / SEO Snapshot API", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 
 class AnalyzeRequest(BaseModel):
     url: HttpUrl
+    # Максимална възраст (секунди) на кешираните секции; None = според TTL-ите
+    max_age: Optional[int] = None
+    force_refresh: bool = False
+    # Времената по етапи в отговора (винаги се връщат и в Server-Timing header-а)
+    include_timings: bool = False
+    # Sampling профил на заявката (само при SEOAPP_PROFILING_ENABLED)
+    profile: bool = False
+    # Поточно парсване на HTML; None = SEOAPP_HTML_STREAMING
+    streaming: Optional[bool] = None
+    # Проверка на линковете на страницата (секция link_health)
+    check_links: bool = False
+    # Размер, размери и формат на изображенията (секция image_audit)
+    audit_images: bool = False
+    # Брой проби за времената по етапи и redirect hop-ове (секция performance); 0 = без
+    performance_samples: int = 0
+    # Само тези секции на snapshot-а (и нужните им етапи); None = всички
+    sections: Optional[List[str]] = None
+
+
+def _start_profiler(requested: bool) -> Optional[SamplingProfiler]:
+    if not requested:
+        return None
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=403, detail="Профилирането е изключено (SEOAPP_PROFILING_ENABLED)")
+    return SamplingProfiler(interval=settings.profiling_interval).start()
 
 
 @app.post("/analyze")
-async def analyze_website(request: AnalyzeRequest) -> Dict[str, Any]:
+async def analyze_website(request: AnalyzeRequest, http_request: Request, response: Response) -> Dict[str, Any]:
     """
     Анализира URL и връща snapshot с данни за домейна, технологии, SEO и WHOIS.
+
+    Бавен или неуспешен етап (напр. WHOIS) не проваля заявката - snapshot-ът
+    е частичен, а грешките по етапи са в errors. 500/504 се връщат само ако
+    самата страница не може да бъде взета.
     """
+    _check_sections(request.sections)
+    timings = Timings()
+    profiler = _start_profiler(request.profile)
     try:
-        analyzer = WebsiteAnalyzer()
-        result = await analyzer.analyze(str(request.url))
-        return result
+        result = await _run_analysis(http_request.app, request, timings)
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': str(e.retry_after)})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Грешка при анализ: {str(e)}")
+        raise HTTPException(
+            status_code=504 if isinstance(e, StageFailed) and e.reason == 'timeout' else 500,
+            detail=f"Грешка при анализ: {str(e)}",
+            headers={'Server-Timing': timings.server_timing()}
+        )
+    finally:
+        profile = profiler.stop() if profiler else None
+
+    response.headers['Server-Timing'] = timings.server_timing()
+    if request.include_timings:
+        result['timings'] = timings.as_dict()
+    if profile is not None:
+        result['profile'] = profile
+    return result
+
+
+async def _run_analysis(app: FastAPI, request: AnalyzeRequest, timings: Timings,
+                        wait_for_pool: bool = False) -> Dict[str, Any]:
+    analyzer = WebsiteAnalyzer(
+        http_pool=app.state.http_pool,
+        cache=app.state.result_cache,
+        snapshots=app.state.snapshot_store,
+        html_pool=app.state.html_pool,
+        wait_for_pool=wait_for_pool,
+        streaming=request.streaming,
+        link_checker=app.state.link_checker,
+        image_auditor=app.state.image_auditor,
+        sitemap_ingestor=app.state.sitemap_ingestor
+    )
+    return await analyzer.analyze(
+        str(request.url),
+        max_age=request.max_age,
+        force_refresh=request.force_refresh,
+        timings=timings,
+        check_links=request.check_links,
+        audit_images=request.audit_images,
+        performance_samples=request.performance_samples,
+        sections=request.sections
+    )
+
+
+def _check_sections(sections: Optional[List[str]]):
+    known = WebsiteAnalyzer.result_sections()
+    unknown = [section for section in sections or [] if section not in known]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Непознати секции: {', '.join(unknown)} (възможни: {', '.join(known)})"
+        )
+
+
+class CrawlRequest(BaseModel):
+    url: HttpUrl
+    max_depth: int = 2
+    max_pages: int = 100
+    per_host_delay: float = 1.0
+    concurrency: int = 4
+    # Идентификатор за checkpoint; по подразбиране се извежда от URL-а
+    crawl_id: Optional[str] = None
+    resume: bool = True
+
+
+def _sse_event(event: str, data: Any) -> bytes:
+    payload = json.dumps(data, default=str, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n".encode('utf-8')
+
+
+@app.get("/analyze/stream")
+async def analyze_website_stream(
+    http_request: Request,
+    url: HttpUrl,
+    max_age: Optional[int] = None,
+    force_refresh: bool = False,
+    timings: bool = False,
+    streaming: Optional[bool] = None,
+    check_links: bool = False,
+    audit_images: bool = False,
+    performance_samples: int = 0,
+    sections: Optional[List[str]] = Query(None)
+) -> StreamingResponse:
+    """
+    Анализира URL и изпраща всяка секция като Server-Sent Event, щом е готова.
+
+    Събития: crawl, technology_detection, on_page_seo,
+    metadata_and_structured_data, infrastructure, whois, robots_and_sitemaps (и link_health /
+    image_audit при check_links=true / audit_images=true, performance при
+    performance_samples > 0), накрая done
+    (с пълния snapshot) или error. С timings=true done съдържа и времената
+    по етапи (Server-Timing не е приложим - header-ите вече са изпратени).
+    С sections (повторяем параметър) се изпращат само събитията, нужни за
+    тези секции, а done съдържа само тях. Неуспешен етап (timeout, грешка)
+    изпраща section_error, а done е частичен snapshot с errors.
+    """
+    _check_sections(sections)
+    html_pool = http_request.app.state.html_pool
+    analyzer = WebsiteAnalyzer(
+        http_pool=http_request.app.state.http_pool,
+        cache=http_request.app.state.result_cache,
+        snapshots=http_request.app.state.snapshot_store,
+        html_pool=html_pool,
+        streaming=streaming,
+        link_checker=http_request.app.state.link_checker,
+        image_auditor=http_request.app.state.image_auditor,
+        sitemap_ingestor=http_request.app.state.sitemap_ingestor
+    )
+
+    if html_pool is not None and not analyzer.streaming and html_pool.saturated:
+        # Проверява се преди да започне потокът, за да може да се върне 503
+        retry_after = html_pool.retry_after()
+        raise HTTPException(
+            status_code=503,
+            detail=str(PoolSaturated(retry_after)),
+            headers={'Retry-After': str(retry_after)}
+        )
+
+    async def events():
+        stage_data = {}
+        stage_timings = Timings()
+        try:
+            async for name, data in analyzer.analyze_iter(
+                str(url), max_age, force_refresh, timings=stage_timings,
+                check_links=check_links, audit_images=audit_images,
+                performance_samples=performance_samples, sections=sections
+            ):
+                WebsiteAnalyzer.collect(stage_data, name, data)
+                if name != 'cache_status':
+                    yield _sse_event(name, data)
+            result = await analyzer.finalize(str(url), stage_data, timings=stage_timings, only=sections)
+            if timings:
+                result['timings'] = stage_timings.as_dict()
+            yield _sse_event('done', result)
+        except Exception as e:
+            yield _sse_event('error', {'detail': f"Грешка при анализ: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(
+    http_request: Request,
+    concurrency: int = settings.batch_concurrency,
+    per_domain_concurrency: int = settings.batch_per_domain_concurrency,
+    max_age: Optional[int] = None,
+    force_refresh: bool = False,
+    streaming: Optional[bool] = None,
+    sections: Optional[List[str]] = Query(None),
+    format: str = 'ndjson',
+    compression: Optional[str] = None
+) -> StreamingResponse:
+    """
+    Анализира списък от URL-и и връща всеки резултат като NDJSON ред веднага
+    щом е готов.
+
+    Тялото е JSON ({"urls": [...]}) или поток от редове (text/plain или
+    application/x-ndjson) с по един URL или {"url": ...} на ред. С sections
+    всеки резултат съдържа само тези секции. С format=csv / parquet
+    резултатите се връщат поточно като таблица с плоска схема
+    (export.BATCH_COLUMNS); compression - gzip за CSV, snappy / zstd / ... за
+    Parquet.
+    """
+    _check_sections(sections)
+    if format != 'ndjson':
+        _check_export(BATCH_COLUMNS, format, compression)
+    content_type = http_request.headers.get('content-type', '')
+    if content_type.startswith('application/json'):
+        body = await http_request.json()
+        urls = iter_list(body.get('urls', []) if isinstance(body, dict) else body)
+    else:
+        # Входът се буферира във временен файл, защото StreamingResponse
+        # слуша за disconnect на същия ASGI канал, от който идва тялото
+        spool = await spool_stream(http_request.stream())
+        urls = iter_urls(iter_lines(iter_file_chunks(spool)))
+
+    runner = _batch_runner(http_request, concurrency, per_domain_concurrency, max_age, force_refresh,
+                           streaming, sections)
+    if format != 'ndjson':
+        return _export_response(runner.run(urls), BATCH_COLUMNS, format, compression, 'batch')
+
+    async def ndjson():
+        async for item in runner.run(urls):
+            yield BatchRunner.to_ndjson(item)
+
+    return StreamingResponse(ndjson(), media_type='application/x-ndjson')
+
+
+def _check_export(columns: List[Column], format: str, compression: Optional[str]):
+    # Грешният формат/компресия (или липсващ pyarrow) е 400, преди да започне потокът
+    try:
+        open_writer(ByteSink(), columns, format, compression)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _export_response(records, columns: List[Column], format: str, compression: Optional[str],
+                     name: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(records, columns, format, compression),
+        media_type=MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="{filename(name, format, compression)}"'}
+    )
+
+
+def _batch_runner(http_request: Request, concurrency: int, per_domain_concurrency: int,
+                  max_age: Optional[int], force_refresh: bool, streaming: Optional[bool],
+                  sections: Optional[List[str]] = None) -> BatchRunner:
+    analyzer = WebsiteAnalyzer(
+        http_pool=http_request.app.state.http_pool,
+        cache=http_request.app.state.result_cache,
+        snapshots=http_request.app.state.snapshot_store,
+        html_pool=http_request.app.state.html_pool,
+        # Партидата има собствен лимит - изчаква pool-а вместо да получава 503
+        wait_for_pool=True,
+        streaming=streaming,
+        sitemap_ingestor=http_request.app.state.sitemap_ingestor
+    )
+    return BatchRunner(
+        lambda url: analyzer.analyze(url, max_age=max_age, force_refresh=force_refresh, sections=sections),
+        concurrency=min(max(1, concurrency), settings.batch_max_concurrency),
+        per_domain_concurrency=per_domain_concurrency
+    )
+
+
+class SitemapAnalyzeRequest(BaseModel):
+    url: HttpUrl
+    # Конкретни sitemap-и (или sitemap index); по подразбиране от robots.txt или /sitemap.xml
+    sitemaps: Optional[List[HttpUrl]] = None
+    max_urls: int = 1000
+    concurrency: int = settings.batch_concurrency
+    per_domain_concurrency: int = settings.batch_per_domain_concurrency
+    max_age: Optional[int] = None
+    force_refresh: bool = False
+    streaming: Optional[bool] = None
+    # Само тези секции на snapshot-а; None = всички
+    sections: Optional[List[str]] = None
+    # ndjson, csv или parquet (като в /analyze/batch)
+    format: str = 'ndjson'
+    compression: Optional[str] = None
+
+
+@app.post("/analyze/sitemap")
+async def analyze_sitemap(request: SitemapAnalyzeRequest, http_request: Request) -> StreamingResponse:
+    """
+    Анализира URL-ите от sitemap-ите на сайта, разрешени от robots.txt, и
+    връща всеки резултат като NDJSON ред (като /analyze/batch).
+
+    Sitemap-ите (и gzip-натите, и sitemap index-ите) се четат поточно, а
+    URL-ите се подават към анализите лениво - с темпото, с което се
+    освобождават места. Последният ред е {"sitemap_report": ...} с
+    находките от robots.txt и броя прочетени, пропуснати и анализирани URL-и.
+    С format=csv / parquet резултатите са таблица (без sitemap_report).
+    """
+    _check_sections(request.sections)
+    if request.format != 'ndjson':
+        _check_export(BATCH_COLUMNS, request.format, request.compression)
+    ingestor = http_request.app.state.sitemap_ingestor
+    report = new_report()
+    urls = ingestor.iter_urls(
+        str(request.url), report,
+        sitemaps=[str(sitemap) for sitemap in request.sitemaps or []],
+        max_urls=min(max(1, request.max_urls), settings.sitemap_max_urls)
+    )
+    runner = _batch_runner(
+        http_request, request.concurrency, request.per_domain_concurrency,
+        request.max_age, request.force_refresh, request.streaming, request.sections
+    )
+    if request.format != 'ndjson':
+        return _export_response(runner.run(urls), BATCH_COLUMNS, request.format, request.compression, 'sitemap')
+
+    async def ndjson():
+        async for item in runner.run(urls):
+            yield BatchRunner.to_ndjson(item)
+        yield BatchRunner.to_ndjson({'sitemap_report': report})
+
+    return StreamingResponse(ndjson(), media_type='application/x-ndjson')
+
+
+@app.post("/crawl")
+async def crawl_site(request: CrawlRequest, http_request: Request) -> Dict[str, Any]:
+    """
+    Обхожда вътрешните линкове на сайта (BFS) и връща обобщение за целия
+    сайт; данните по страници се взимат с GET /crawl/{crawl_id}/export.
+    Прекъснато обхождане продължава от последния checkpoint.
+    """
+    if not _valid_crawl_id(request.crawl_id):
+        raise HTTPException(status_code=400, detail="Невалиден crawl_id")
+    try:
+        return await _run_crawl(http_request.app, request)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Грешка при обхождане: {str(e)}")
+
+
+@app.get("/crawl/{crawl_id}/export")
+async def crawl_export(crawl_id: str, format: str = 'csv', compression: Optional[str] = None) -> StreamingResponse:
+    """
+    Страниците на обхождане (и на незавършено) като CSV или Parquet с плоска
+    схема (export.CRAWL_PAGE_COLUMNS); файлът се чете и пише поточно.
+    """
+    if not _valid_crawl_id(crawl_id):
+        raise HTTPException(status_code=400, detail="Невалиден crawl_id")
+    pages_path = os.path.join(settings.crawl_checkpoint_dir, f'{crawl_id}.json.pages.jsonl')
+    if not os.path.exists(pages_path):
+        raise HTTPException(status_code=404, detail="Обхождането не е намерено")
+    _check_export(CRAWL_PAGE_COLUMNS, format, compression)
+
+    async def pages():
+        async for line in iter_lines(iter_file_chunks(open(pages_path, 'rb'))):
+            if line.strip():
+                yield json.loads(line)
+
+    return _export_response(pages(), CRAWL_PAGE_COLUMNS, format, compression, f'crawl-{crawl_id}')
+
+
+def _valid_crawl_id(crawl_id: Optional[str]) -> bool:
+    return crawl_id is None or crawl_id.replace('-', '').replace('_', '').isalnum()
+
+
+async def _run_crawl(app: FastAPI, request: CrawlRequest) -> Dict[str, Any]:
+    start_url = normalize_url(str(request.url))
+    crawl_id = request.crawl_id or hashlib.sha1(start_url.encode('utf-8')).hexdigest()[:16]
+    checkpoint_path = os.path.join(settings.crawl_checkpoint_dir, f'{crawl_id}.json')
+    if not request.resume:
+        for path in (checkpoint_path, f'{checkpoint_path}.pages.jsonl'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    crawler = SiteCrawler(
+        http_pool=app.state.http_pool,
+        max_depth=max(0, request.max_depth),
+        max_pages=min(max(1, request.max_pages), settings.crawl_max_pages),
+        per_host_delay=max(0.0, request.per_host_delay),
+        concurrency=min(max(1, request.concurrency), settings.batch_max_concurrency),
+        checkpoint_path=checkpoint_path,
+        html_pool=app.state.html_pool
+    )
+    result = await crawler.crawl(start_url)
+    result.pop('pages_path', None)
+    result['crawl_id'] = crawl_id
+    result['export_url'] = f'/crawl/{crawl_id}/export'
+    return result
+
+
+# Видовете задачи за /jobs и моделите на параметрите им
+JOB_REQUEST_MODELS = {'analyze': AnalyzeRequest, 'crawl': CrawlRequest}
+
+
+def _job_handlers(app: FastAPI) -> Dict[str, JobHandler]:
+    async def analyze(params: Dict[str, Any]) -> Dict[str, Any]:
+        request = AnalyzeRequest(**params)
+        timings = Timings()
+        # Задачата изчаква HTML pool-а, вместо да получи 503
+        result = await _run_analysis(app, request, timings, wait_for_pool=True)
+        if request.include_timings:
+            result['timings'] = timings.as_dict()
+        return result
+
+    async def crawl(params: Dict[str, Any]) -> Dict[str, Any]:
+        return await _run_crawl(app, CrawlRequest(**params))
+
+    return {'analyze': analyze, 'crawl': crawl}
+
+
+class JobRequest(BaseModel):
+    kind: str = 'analyze'
+    # Параметрите на /analyze или /crawl
+    params: Dict[str, Any]
+    # По-високият приоритет се изпълнява първи
+    priority: int = 0
+    # Клиент за справедливото разпределение; по подразбиране от X-Tenant header-а
+    tenant: Optional[str] = None
+
+
+def _job_queue(http_request: Request) -> JobQueue:
+    queue = http_request.app.state.job_queue
+    if queue is None:
+        raise HTTPException(status_code=404, detail="Опашката за задачи е изключена")
+    return queue
+
+
+async def _job_or_404(queue: JobQueue, job_id: str) -> Dict[str, Any]:
+    job = await asyncio.to_thread(queue.store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задачата не е намерена")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: JobRequest, http_request: Request) -> Dict[str, Any]:
+    """
+    Поставя анализ или обхождане в опашката и връща веднага job_id.
+    Статусът се следи с GET /jobs/{job_id}, а резултатът - с
+    GET /jobs/{job_id}/result.
+    """
+    queue = _job_queue(http_request)
+    model = JOB_REQUEST_MODELS.get(request.kind)
+    if model is None:
+        raise HTTPException(status_code=400, detail=f"Непознат вид задача: {request.kind}")
+    try:
+        params = model(**request.params)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    if isinstance(params, CrawlRequest) and not _valid_crawl_id(params.crawl_id):
+        raise HTTPException(status_code=400, detail="Невалиден crawl_id")
+    if isinstance(params, AnalyzeRequest):
+        _check_sections(params.sections)
+
+    tenant = request.tenant or http_request.headers.get('x-tenant') or 'default'
+    job_id = await queue.submit(request.kind, params.model_dump(mode='json'), tenant, request.priority)
+    return {'job_id': job_id, 'status': 'queued'}
+
+
+@app.get("/jobs")
+async def list_jobs(http_request: Request, tenant: Optional[str] = None,
+                    status: Optional[str] = None, limit: int = 100) -> Dict[str, Any]:
+    """
+    Последните задачи (най-новата първа), по избор само за tenant и/или статус.
+    """
+    queue = _job_queue(http_request)
+    jobs = await asyncio.to_thread(queue.store.list, tenant, status, max(1, min(limit, 1000)))
+    return {'jobs': jobs}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str, http_request: Request) -> Dict[str, Any]:
+    """
+    Статусът на задачата: queued, running, succeeded, failed или cancelled.
+    """
+    return await _job_or_404(_job_queue(http_request), job_id)
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, http_request: Request, response: Response) -> Dict[str, Any]:
+    """
+    Резултатът на завършена задача. Докато задачата чака или се изпълнява,
+    връща 202 със статуса ѝ; за неуспешна или отменена задача - 409.
+    """
+    queue = _job_queue(http_request)
+    job = await _job_or_404(queue, job_id)
+    if job['status'] not in FINISHED_STATUSES:
+        response.status_code = 202
+        return {'job_id': job_id, 'status': job['status']}
+    if job['status'] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail={'status': job['status'], 'error': job['error']})
+    return await asyncio.to_thread(queue.store.result, job_id)
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, http_request: Request) -> Dict[str, Any]:
+    """
+    Отменя чакаща или изпълняваща се задача. Работа, споделена с други
+    заявки (single-flight), продължава за тях.
+    """
+    queue = _job_queue(http_request)
+    previous = await queue.cancel(job_id)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Задачата не е намерена")
+    if previous in FINISHED_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Задачата вече е завършена ({previous})")
+    return {'job_id': job_id, 'status': 'cancelled'}
+
+
+@app.get("/stats/jobs")
+async def job_queue_stats(http_request: Request) -> Dict[str, Any]:
+    """
+    Брой задачи по статус и заетост на worker-ите.
+    """
+    queue = http_request.app.state.job_queue
+    if queue is None:
+        return {'enabled': False}
+    counts = await asyncio.to_thread(queue.store.counts)
+    return dict(queue.stats(), jobs=counts)
+
+
+@app.get("/stats/http")
+async def http_pool_stats(http_request: Request) -> Dict[str, Any]:
+    """
+    Статистика за споделения HTTP connection pool.
+    """
+    return http_request.app.state.http_pool.stats()
+
+
+@app.get("/stats/html-pool")
+async def html_pool_stats(http_request: Request) -> Dict[str, Any]:
+    """
+    Опашка и натоварване на process pool-а за парсване на HTML.
+    """
+    html_pool = http_request.app.state.html_pool
+    return html_pool.stats() if html_pool else {'enabled': False}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> Response:
+    """
+    Метрики в Prometheus text формат: времена по етапи, кеш, HTTP заявки и pool-ове.
+    """
+    return Response(REGISTRY.render(), media_type=REGISTRY.CONTENT_TYPE)
+
+
+@app.get("/stats/links")
+async def link_checker_stats(http_request: Request) -> Dict[str, Any]:
+    """
+    Кешът на статусите на линковете и изпратените проверки.
+    """
+    return http_request.app.state.link_checker.stats()
+
+
+@app.get("/stats/images")
+async def image_audit_stats(http_request: Request) -> Dict[str, Any]:
+    """
+    Кешът на одита на изображенията и прочетените байтове.
+    """
+    return http_request.app.state.image_auditor.stats()
+
+
+@app.get("/stats/single-flight")
+async def single_flight_stats_endpoint() -> Dict[str, Any]:
+    """
+    Обединени едновременни изчисления (цял анализ, страница, WHOIS,
+    инфраструктура) - в ход, leaders/followers и дял на обединените.
+    """
+    return single_flight_stats()
+
+
+@app.get("/stats/cache")
+async def result_cache_stats(http_request: Request) -> Dict[str, Any]:
+    """
+    Статистика за кеша на резултатите.
+    """
+    cache = http_request.app.state.result_cache
+    return cache.stats() if cache else {'enabled': False}
+
+
+def _snapshot_store(http_request: Request):
+    store = http_request.app.state.snapshot_store
+    if store is None:
+        raise HTTPException(status_code=404, detail="Историята на snapshot-ите е изключена")
+    return store
+
+
+@app.get("/snapshots")
+async def snapshot_history(http_request: Request, url: str, limit: int = 50) -> Dict[str, Any]:
+    """
+    История на snapshot-ите за URL (най-новият първи) с променените секции.
+    """
+    store = _snapshot_store(http_request)
+    items = await asyncio.to_thread(store.history, url, max(1, min(limit, 1000)))
+    return {'url': url, 'snapshots': items}
+
+
+@app.get("/snapshots/diff")
+async def snapshot_diff(
+    http_request: Request,
+    url: Optional[str] = None,
+    from_id: Optional[int] = None,
+    to_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Промени между два snapshot-а (from_id/to_id) или между последните два за url.
+    """
+    store = _snapshot_store(http_request)
+    if from_id is None or to_id is None:
+        if not url:
+            raise HTTPException(status_code=400, detail="Нужни са from_id и to_id или url")
+        ids = await asyncio.to_thread(store.latest_ids, url, 2)
+        if len(ids) < 2:
+            raise HTTPException(status_code=404, detail="Няма два snapshot-а за този URL")
+        to_id, from_id = ids
+    result = await asyncio.to_thread(store.diff, from_id, to_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Snapshot не е намерен")
+    return result
+
+
+@app.get("/snapshots/{snapshot_id}")
+async def snapshot_get(snapshot_id: int, http_request: Request) -> Dict[str, Any]:
+    """
+    Пълният snapshot по id.
+    """
+    store = _snapshot_store(http_request)
+    result = await asyncio.to_thread(store.get, snapshot_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Snapshot не е намерен")
+    return result
+
+
+@app.get("/reverse-ip/{value}")
+async def reverse_ip_lookup(value: str, scope: str = 'ip', limit: int = 100) -> Dict[str, Any]:
+    """
+    Домейни от обратния индекс за IP, неговата /24 (/48) мрежа или ASN.
+    """
+    index = get_reverse_index()
+    if index is None:
+        raise HTTPException(status_code=404, detail="Обратният IP индекс е изключен")
+    limit = max(1, min(limit, 1000))
+    if scope == 'ip':
+        domains = await asyncio.to_thread(index.domains_for_ip, value, None, limit)
+    elif scope == 'subnet':
+        domains = await asyncio.to_thread(index.domains_for_subnet, value, None, limit)
+    elif scope == 'asn':
+        try:
+            asn = int(value.upper().lstrip('AS'))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Невалиден ASN")
+        domains = await asyncio.to_thread(index.domains_for_asn, asn, None, limit)
+    else:
+        raise HTTPException(status_code=400, detail="scope трябва да е ip, subnet или asn")
+    return {'value': value, 'scope': scope, 'domains': domains}
 
 
 # Serve static files (must be after route definitions)
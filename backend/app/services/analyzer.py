@@ -1,79 +1,470 @@
+import asyncio
+from contextlib import aclosing
 from urllib.parse import urlparse
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Callable, Awaitable, AsyncIterator, Iterator, Tuple
+from app.config import settings as default_settings
 from app.services.crawler import WebsiteCrawler
-from app.services.technology_detector import TechnologyDetector
-from app.services.seo_parser import SEOParser
-from app.services.metadata_parser import MetadataParser
+from app.services.http_client import HTTPClientPool
+from app.services.image_audit import ImageAuditor, summarize as summarize_images
+from app.services.link_checker import LinkChecker, summarize as summarize_links
+from app.services.result_cache import ResultCache
+from app.services.reverse_ip import get_reverse_index
+from app.services.snapshot_store import SnapshotStore
+from app.services.streaming_parser import StreamingHTMLAnalyzer
+from app.services.html_pool import HTMLAnalysisPool, analyze_html
+from app.services.single_flight import get_single_flight
+from app.services.site_crawler import normalize_url
+from app.services.sitemaps import SitemapIngestor
+from app.services.metrics import Timings, stage
+from app.services.performance import PerformanceProbe
+from app.services.pipeline import Pipeline, Stage, StageContext, registered_stages
 from app.services.whois_enricher import WhoisEnricher
 from app.services.infrastructure_detector import InfrastructureDetector
 
 
 class WebsiteAnalyzer:
-    """Главният анализатор, който координира всички модули."""
-    
-    async def analyze(self, url: str) -> Dict[str, Any]:
+    """
+    Главният анализатор, който координира всички модули.
+
+    Анализът е граф от етапи (pipeline.Stage): страницата ('page'), а след
+    нея паралелно WHOIS, инфраструктурата, robots.txt/sitemap-ите и
+    поисканите проверки; performance не зависи от страницата. Всеки етап има
+    собствен timeout, а грешката му връща частичен snapshot с грешка за
+    етапа (errors) вместо неуспех на целия анализ. Етапи отвън се добавят с
+    pipeline.register_stage.
+    """
+
+    # Секциите, които analyze_iter връща в реда на готовност (плюс тези на регистрираните етапи)
+    SECTIONS = (
+        'crawl', 'technology_detection', 'on_page_seo',
+        'metadata_and_structured_data', 'infrastructure', 'whois', 'robots_and_sitemaps',
+        'link_health', 'image_audit', 'performance'
+    )
+    # Секциите на snapshot-а (параметърът sections) и етапите на pipeline-а, които са им нужни
+    RESULT_SECTIONS = {
+        'domain_and_infrastructure': ('page', 'whois', 'infrastructure'),
+        'technology_detection': ('page',),
+        'on_page_seo': ('page',),
+        'metadata_and_structured_data': ('page',),
+        'whois_and_ip_whois': ('whois',),
+        'robots_and_sitemaps': ('robots_and_sitemaps',),
+        'link_health': ('link_health',),
+        'image_audit': ('image_audit',),
+        'performance': ('performance',),
+    }
+    CRAWL_FIELDS = ('final_url', 'domain', 'ip_address', 'headers', 'web_server', 'http_to_https_redirect')
+    PAGE_SECTIONS = ('technology_detection', 'on_page_seo', 'metadata_and_structured_data')
+
+    def __init__(self, http_pool: Optional[HTTPClientPool] = None,
+                 cache: Optional[ResultCache] = None,
+                 snapshots: Optional[SnapshotStore] = None,
+                 html_pool: Optional[HTMLAnalysisPool] = None,
+                 wait_for_pool: bool = False,
+                 streaming: Optional[bool] = None,
+                 link_checker: Optional[LinkChecker] = None,
+                 image_auditor: Optional[ImageAuditor] = None,
+                 sitemap_ingestor: Optional[SitemapIngestor] = None):
+        self.http_pool = http_pool
+        self.cache = cache
+        self.snapshots = snapshots
+        self.html_pool = html_pool
+        # False - при пълна опашка на pool-а се хвърля PoolSaturated (-> 503)
+        self.wait_for_pool = wait_for_pool
+        # Поточно парсване - без буфериране на HTML и без process pool-а
+        self.streaming = default_settings.html_streaming if streaming is None else streaming
+        # Споделен checker - обединява проверките на едни и същи линкове между анализите
+        self.link_checker = link_checker
+        self.image_auditor = image_auditor
+        self.sitemap_ingestor = sitemap_ingestor
+
+    async def analyze(self, url: str, max_age: Optional[float] = None,
+                      force_refresh: bool = False,
+                      timings: Optional[Timings] = None,
+                      check_links: bool = False,
+                      audit_images: bool = False,
+                      performance_samples: int = 0,
+                      sections: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Анализира URL и връща пълен snapshot.
+
+        max_age ограничава възрастта на кешираните секции (в секунди),
+        а force_refresh пропуска четенето от кеша. В timings (ако е подаден)
+        се записва времето на всеки етап. С check_links се проверяват и
+        линковете на страницата (секция link_health), с audit_images -
+        изображенията (секция image_audit), а с performance_samples > 0 се
+        измерват времената за зареждане по етапи (секция performance).
+        С sections (имена от result_sections()) се изчисляват само тези
+        секции и етапите, от които зависят; такъв частичен резултат не се
+        записва в историята. Неуспешните етапи (без страницата) са в errors.
+
+        Едновременните анализи на един и същ (нормализиран) URL със същите
+        параметри се изпълняват веднъж - всички извикващи получават общия
+        резултат, а timings съдържа етапите на споделеното изчисление.
+        """
+        timings = timings or Timings()
+        with timings.stage('total'):
+            async def compute() -> Tuple[Dict[str, Any], Dict[str, float]]:
+                shared_timings = Timings()
+                stage_data = {}
+                async for name, data in self.analyze_iter(url, max_age, force_refresh, shared_timings,
+                                                             check_links, audit_images, performance_samples,
+                                                             sections):
+                    self.collect(stage_data, name, data)
+                result = await self.finalize(url, stage_data, shared_timings, sections)
+                return result, dict(shared_timings.durations)
+
+            key = (normalize_url(url), max_age, force_refresh, check_links, audit_images, performance_samples,
+                   tuple(sorted(sections)) if sections is not None else None)
+            result, durations = await get_single_flight('analysis').run(key, compute)
+            timings.merge(durations, observe=False)
+            return dict(result, url=url)
+
+    async def finalize(self, url: str, sections: Dict[str, Any],
+                       timings: Optional[Timings] = None,
+                       only: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Сглобява snapshot-а от секциите и го записва в историята (ако има
+        такава). Частичен резултат (с only или с неуспешни етапи) не се
+        записва - иначе липсващите секции биха изглеждали като промени.
+        """
+        result = self.assemble(url, sections, only)
+        if self.snapshots is not None and only is None and not sections.get('errors'):
+            with stage(timings, 'snapshot'):
+                result['snapshot_id'] = await asyncio.to_thread(self.snapshots.save, result)
+        return result
+
+    @staticmethod
+    def collect(sections: Dict[str, Any], name: str, data: Any):
+        """Добавя двойка от analyze_iter към секциите за finalize/assemble."""
+        if name == 'section_error':
+            sections.setdefault('errors', {})[data['stage']] = data['detail']
+        else:
+            sections[name] = data
+
+    async def analyze_iter(self, url: str, max_age: Optional[float] = None,
+                           force_refresh: bool = False,
+                           timings: Optional[Timings] = None,
+                           check_links: bool = False,
+                           audit_images: bool = False,
+                           performance_samples: int = 0,
+                           sections: Optional[List[str]] = None) -> AsyncIterator[Tuple[str, Any]]:
         """
-        crawler = WebsiteCrawler()
-        
+        Връща двойки (секция, данни) веднага щом всяка секция е готова.
+
+        Секциите от страницата идват след нейното взимане, а WHOIS,
+        инфраструктурата, robots.txt/sitemap-ите (и link_health/image_audit/
+        performance, ако са поискани) се изчисляват паралелно. Неуспешен етап
+        връща ('section_error', {'stage', 'reason', 'detail'}) - само грешката
+        на страницата прекъсва анализа. Последната двойка е ('cache_status', ...).
+
+        С sections се изпълняват само нужните им етапи: без WHOIS, ако няма
+        whois_and_ip_whois/domain_and_infrastructure, и без HTML (само
+        header-ите на страницата), ако не е поискана секция от страницата.
+        """
+        cache_status = {}
+        timings = timings or Timings()
+
+        async def cached(section: str, key: str, compute: Callable[[], Awaitable[Any]],
+                         cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+            return await self._cached(section, key, compute, max_age, force_refresh,
+                                      cache_status, cacheable)
+
+        names = self.stages_for(sections, check_links, audit_images, performance_samples)
+        page_sections = [
+            section for section in self.PAGE_SECTIONS if sections is None or section in sections
+        ]
+        check_links, audit_images = 'link_health' in names, 'image_audit' in names
+        crawler = WebsiteCrawler(http_pool=self.http_pool, timings=timings)
+        context = StageContext(url, options={
+            'check_links': check_links,
+            'audit_images': audit_images,
+            'performance_samples': performance_samples,
+            'page_sections': page_sections,
+            'parse_html': check_links or audit_images or bool(page_sections),
+            'link_limit': default_settings.link_check_max_links if check_links else 0,
+            'image_limit': default_settings.image_audit_max_images if audit_images else 0,
+        }, analyzer=self, crawler=crawler, timings=timings, cached=cached)
+
+        pipeline = self.pipeline()
         try:
-            # 1. Взимане на HTML и инфраструктурни данни
-            crawl_data = await crawler.fetch(url)
-            html = crawl_data['html']
-            headers = crawl_data['headers']
-            domain = crawl_data['domain']
-            ip_address = crawl_data.get('ip_address')
-            
-            # 2. Technology Detection
-            tech_detector = TechnologyDetector()
-            technology_data = tech_detector.detect(html, headers, url)
-            
-            # 3. On-page SEO
-            seo_parser = SEOParser()
-            seo_data = seo_parser.parse(html, crawl_data['final_url'])
-            
-            # 4. Metadata & Structured Data
-            metadata_parser = MetadataParser()
-            metadata_data = metadata_parser.parse(html)
-            
-            # 5. WHOIS & IP WHOIS
-            whois_enricher = WhoisEnricher()
-            whois_data = whois_enricher.enrich(domain, ip_address)
-            
-            # 6. Infrastructure Detection
-            infra_detector = InfrastructureDetector()
-            infra_data = infra_detector.detect(domain, ip_address, headers)
-            
-            # Събиране на всички данни
-            result = {
-                'url': url,
-                'final_url': crawl_data['final_url'],
-                'domain_and_infrastructure': {
-                    'domain': domain,
-                    'domain_age_days': whois_data['domain_whois'].get('domain_age_days'),
-                    'registrar': whois_data['domain_whois'].get('registrar'),
-                    'expiry_date': whois_data['domain_whois'].get('expiry_date'),
-                    'name_servers': whois_data['domain_whois'].get('name_servers', []),
-                    'ip_address': ip_address,
-                    'hosting_provider': infra_data.get('hosting_provider'),
-                    'server_location_country': infra_data.get('server_location_country'),
-                    'web_server': crawl_data.get('web_server'),
-                    'http_to_https_redirect': crawl_data.get('http_to_https_redirect', False),
-                    'response_headers': headers
-                },
-                'technology_detection': technology_data,
-                'on_page_seo': seo_data,
-                'metadata_and_structured_data': metadata_data,
-                'whois_and_ip_whois': {
-                    'domain_whois': whois_data['domain_whois'],
-                    'ip_whois': whois_data['ip_whois'],
-                    'same_ip_websites': whois_data['same_ip_websites']
-                }
-            }
-            
-            return result
-            
+            async with aclosing(pipeline.run(context, names)) as results:
+                async for name, result, error in results:
+                    if error is None:
+                        for section, data in pipeline.stages[name].emit(result, context):
+                            yield section, data
+                    elif name == 'page':
+                        # Без страницата няма snapshot - грешката е на целия анализ
+                        raise error.cause if error.reason == 'error' else error
+                    else:
+                        yield 'section_error', {'stage': name, 'reason': error.reason, 'detail': str(error)}
+            yield 'cache_status', cache_status
         finally:
             await crawler.close()
 
+    def pipeline(self) -> Pipeline:
+        """Вградените етапи и регистрираните (етап със същото име замества вградения)."""
+        config = default_settings
+        return Pipeline([
+            Stage('page', self._page_stage, emit=self._emit_page, timeout=config.stage_timeout_page),
+            Stage('whois', self._whois_stage, requires=('page',), timeout=config.stage_timeout_whois),
+            Stage('infrastructure', self._infrastructure_stage, requires=('page',),
+                  timeout=config.stage_timeout_infrastructure),
+            Stage('robots_and_sitemaps', self._robots_stage, requires=('page',),
+                  timeout=config.stage_timeout_sitemaps),
+            Stage('link_health', self._link_stage, requires=('page',), timeout=config.stage_timeout_links),
+            Stage('image_audit', self._image_stage, requires=('page',), timeout=config.stage_timeout_images),
+            # Собствени заявки към URL-а - не чака страницата
+            Stage('performance', self._performance_stage, timeout=config.stage_timeout_performance),
+            *registered_stages()
+        ])
+
+    @classmethod
+    def result_sections(cls) -> Dict[str, Tuple[str, ...]]:
+        """RESULT_SECTIONS плюс секциите на регистрираните етапи."""
+        sections = dict(cls.RESULT_SECTIONS)
+        for extra in registered_stages():
+            sections.setdefault(extra.name, (extra.name,))
+        return sections
+
+    @classmethod
+    def stages_for(cls, sections: Optional[List[str]], check_links: bool = False,
+                   audit_images: bool = False, performance_samples: int = 0) -> List[str]:
+        """Етапите на pipeline-а, нужни за секциите на snapshot-а (None - всички)."""
+        result_sections = cls.result_sections()
+        if sections is None:
+            sections = list(cls.RESULT_SECTIONS) + [extra.name for extra in registered_stages() if extra.default]
+        unknown = [section for section in sections if section not in result_sections]
+        if unknown:
+            raise ValueError(f"Непознати секции: {', '.join(unknown)}")
+
+        # Проверките, които се правят само по изрично искане
+        requested = {'link_health': check_links, 'image_audit': audit_images, 'performance': performance_samples > 0}
+        names = ['page']
+        for section in sections:
+            if requested.get(section, True):
+                names.extend(name for name in result_sections[section] if name not in names)
+        return names
+
+    def _emit_page(self, page: Dict[str, Any], context: StageContext) -> Iterator[Tuple[str, Any]]:
+        yield 'crawl', {key: page[key] for key in self.CRAWL_FIELDS}
+        for section in context.options['page_sections']:
+            yield section, page[section]
+
+    async def _page_stage(self, context: StageContext) -> Dict[str, Any]:
+        # Страницата и производните ѝ секции (кешират се заедно); записът с
+        # линковете/изображенията за проверка е под отделен ключ
+        options, url = context.options, context.url
+        with context.timings.stage('page'):
+            if not options['parse_html']:
+                return await context.cached('page', url + '|headers', lambda: self._fetch_page(context.crawler, url))
+            page_key = url + ('|links' if options['check_links'] else '') + ('|images' if options['audit_images'] else '')
+            return await context.cached('page', page_key, lambda: self._analyze_page(
+                context.crawler, url, context.timings, options['link_limit'], options['image_limit']
+            ))
+
+    async def _whois_stage(self, context: StageContext) -> Dict[str, Any]:
+        page = context.results['page']
+        domain, ip_address = page['domain'], page.get('ip_address')
+        hostname = self._hostname(page)
+        enricher = WhoisEnricher()
+        with context.timings.stage('whois'):
+            data = await context.cached(
+                'whois_and_ip_whois', f'{hostname}|{ip_address}',
+                lambda: enricher.enrich(domain, ip_address),
+                # Неуспешните WHOIS заявки не се кешират за дни напред
+                cacheable=lambda data: 'error' not in data['domain_whois']
+            )
+        with context.timings.stage('reverse_ip'):
+            # Обратният индекс расте с всеки анализ - не се взима от кеша
+            same_ip = await enricher.same_ip_websites(hostname, ip_address)
+        return dict(data, same_ip_websites=same_ip)
+
+    async def _infrastructure_stage(self, context: StageContext) -> Dict[str, Any]:
+        page = context.results['page']
+        domain, ip_address = page['domain'], page.get('ip_address')
+        hostname = self._hostname(page)
+        with context.timings.stage('infrastructure'):
+            data = await context.cached(
+                'infrastructure', f'{hostname}|{ip_address}',
+                lambda: InfrastructureDetector().detect(domain, ip_address, page['headers'])
+            )
+        # Обратният индекс се попълва заедно с ASN-а от инфраструктурата
+        with context.timings.stage('reverse_ip'):
+            await self._record_ip(hostname, ip_address, data.get('asn'))
+        return data
+
+    async def _robots_stage(self, context: StageContext) -> Dict[str, Any]:
+        page = context.results['page']
+        with context.timings.stage('sitemaps'):
+            ingestor = self.sitemap_ingestor or SitemapIngestor.from_settings(context.crawler.http)
+            final = urlparse(page['final_url'])
+            origin = f'{final.scheme}://{final.netloc}'
+            # Находките са за целия сайт; дали страницата е разрешена - за конкретния URL
+            data = await context.cached('robots_and_sitemaps', origin, lambda: ingestor.findings(
+                origin,
+                max_urls=default_settings.sitemap_scan_max_urls,
+                max_sitemaps=default_settings.sitemap_scan_max_sitemaps
+            ))
+            robots = await ingestor.robots(page['final_url'])
+            return dict(data, url_allowed=robots.allowed(page['final_url']))
+
+    async def _link_stage(self, context: StageContext) -> Dict[str, Any]:
+        page = context.results['page']
+        with context.timings.stage('links'):
+            checker = self.link_checker or LinkChecker.from_settings(context.crawler.http)
+            links = page.get('links_to_check') or {'urls': [], 'limit_reached': False}
+            results = await checker.check_many(links['urls'])
+            return summarize_links(results, links['limit_reached'])
+
+    async def _image_stage(self, context: StageContext) -> Dict[str, Any]:
+        page = context.results['page']
+        with context.timings.stage('images'):
+            auditor = self.image_auditor or ImageAuditor.from_settings(context.crawler.http)
+            images = page.get('images_to_audit') or {'urls': [], 'limit_reached': False}
+            results = await auditor.audit_many(images['urls'])
+            return summarize_images(results, images['limit_reached'])
+
+    async def _performance_stage(self, context: StageContext) -> Dict[str, Any]:
+        with context.timings.stage('performance'):
+            # Измерване, а не данни за сайта - не се кешира
+            samples = min(context.options['performance_samples'], default_settings.performance_max_samples)
+            return await PerformanceProbe.from_settings().measure(context.url, samples)
+
+    @staticmethod
+    def _hostname(page: Dict[str, Any]) -> str:
+        return urlparse(page['final_url']).hostname or page['domain']
+
+    @classmethod
+    def assemble(cls, url: str, sections: Dict[str, Any],
+                 only: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Събира секциите от analyze_iter (през collect) в snapshot; с only -
+        само поисканите секции. Секциите на неуспешните етапи липсват (или
+        полетата им са None), а грешките са в errors.
+        """
+        crawl = sections['crawl']
+        result = {'url': url, 'final_url': crawl['final_url']}
+        wanted = set(cls.result_sections()) if only is None else set(only)
+
+        if 'domain_and_infrastructure' in wanted:
+            whois_data = sections.get('whois') or {'domain_whois': {}}
+            infra_data = sections.get('infrastructure') or {}
+            result['domain_and_infrastructure'] = {
+                'domain': crawl['domain'],
+                'domain_age_days': whois_data['domain_whois'].get('domain_age_days'),
+                'registrar': whois_data['domain_whois'].get('registrar'),
+                'expiry_date': whois_data['domain_whois'].get('expiry_date'),
+                'name_servers': whois_data['domain_whois'].get('name_servers', []),
+                'ip_address': crawl.get('ip_address'),
+                'hosting_provider': infra_data.get('hosting_provider'),
+                'server_location_country': infra_data.get('server_location_country'),
+                'asn': infra_data.get('asn'),
+                'as_organization': infra_data.get('as_organization'),
+                'web_server': crawl.get('web_server'),
+                'http_to_https_redirect': crawl.get('http_to_https_redirect', False),
+                'response_headers': crawl['headers']
+            }
+        for section in cls.PAGE_SECTIONS:
+            if section in wanted and section in sections:
+                result[section] = sections[section]
+        if 'whois_and_ip_whois' in wanted and 'whois' in sections:
+            whois_data = sections['whois']
+            result['whois_and_ip_whois'] = {
+                'domain_whois': whois_data['domain_whois'],
+                'ip_whois': whois_data['ip_whois'],
+                'same_ip_websites': whois_data['same_ip_websites']
+            }
+        result['cache_status'] = sections.get('cache_status', {})
+        extra = [extra.name for extra in registered_stages()]
+        for section in ('robots_and_sitemaps', 'link_health', 'image_audit', 'performance', *extra):
+            if section in wanted and section in sections:
+                result[section] = sections[section]
+        if sections.get('errors'):
+            result['errors'] = sections['errors']
+        return result
+
+    async def _record_ip(self, hostname: str, ip_address: Optional[str], asn: Optional[int]):
+        """Добавя двойката домейн -> IP в обратния индекс."""
+        index = get_reverse_index()
+        if index is not None and ip_address:
+            await asyncio.to_thread(index.add, hostname, ip_address, asn)
+
+    async def _analyze_page(self, crawler: WebsiteCrawler, url: str,
+                            timings: Optional[Timings] = None,
+                            link_limit: int = 0, image_limit: int = 0) -> Dict[str, Any]:
+        """Взима страницата и изчислява секциите, които зависят от HTML."""
+        if self.streaming:
+            extractor = StreamingHTMLAnalyzer(
+                url, fingerprint_bytes=default_settings.html_fingerprint_bytes,
+                timings=timings, link_limit=link_limit, image_limit=image_limit
+            )
+            crawl_data = await crawler.fetch_streaming(url, extractor)
+            page_sections = extractor.close()
+            return self._page_result(crawl_data, page_sections)
+
+        crawl_data = await crawler.fetch(url)
+        headers = crawl_data['headers']
+
+        # 2-4. Technology detection, on-page SEO и metadata - CPU стъпката,
+        # изпълнява се в process pool-а, ако има такъв
+        if self.html_pool is not None:
+            page_sections = await self.html_pool.run(
+                crawl_data['html'], headers, url, crawl_data['final_url'],
+                wait=self.wait_for_pool, timings=timings,
+                link_limit=link_limit, image_limit=image_limit
+            )
+        else:
+            page_sections = analyze_html(
+                crawl_data['html'], headers, url, crawl_data['final_url'], timings, link_limit, image_limit
+            )
+        return self._page_result(crawl_data, page_sections)
+
+    async def _fetch_page(self, crawler: WebsiteCrawler, url: str) -> Dict[str, Any]:
+        """Само header-ите и инфраструктурните данни на страницата - без HTML."""
+        return self._page_result(await crawler.fetch_headers(url), {})
+
+    @staticmethod
+    def _page_result(crawl_data: Dict[str, Any], page_sections: Dict[str, Any]) -> Dict[str, Any]:
+        if not page_sections:
+            return {key: crawl_data.get(key) for key in WebsiteAnalyzer.CRAWL_FIELDS}
+        return {
+            'final_url': crawl_data['final_url'],
+            'domain': crawl_data['domain'],
+            'ip_address': crawl_data.get('ip_address'),
+            'headers': crawl_data['headers'],
+            'web_server': crawl_data.get('web_server'),
+            'http_to_https_redirect': crawl_data.get('http_to_https_redirect', False),
+            **page_sections,
+            # Протоколите са от реалната връзка, а не от HTML/header-ите
+            'technology_detection': dict(
+                page_sections['technology_detection'],
+                http_version=crawl_data.get('http_version'),
+                tls_version=crawl_data.get('tls_version')
+            )
+        }
+
+    async def _cached(self, section: str, key: str, compute: Callable[[], Awaitable[Any]],
+                      max_age: Optional[float], force_refresh: bool,
+                      cache_status: Dict[str, Any],
+                      cacheable: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Връща секцията от кеша или я изчислява и записва. Едновременните
+        изчисления на една секция със същия ключ (URL, домейн) се обединяват.
+        """
+        if self.cache is not None and not force_refresh:
+            hit = await self.cache.get(section, key, max_age)
+            if hit is not None:
+                value, age = hit
+                cache_status[section] = {'hit': True, 'age_seconds': round(age, 1)}
+                return value
+
+        async def compute_and_store() -> Any:
+            value = await compute()
+            if self.cache is not None and (cacheable is None or cacheable(value)):
+                await self.cache.set(section, key, value)
+            return value
+
+        value = await get_single_flight(section).run(key, compute_and_store)
+        if self.cache is not None:
+            cache_status[section] = {'hit': False, 'age_seconds': None}
+        return value
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import tempfile
+from collections import deque
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+
+_DONE = object()
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int = 64 * 1024) -> AsyncIterator[str]:
+    """Разбива поток от байтове на редове, без да буферира целия вход."""
+    buffer = b''
+    async for chunk in chunks:
+        buffer += chunk
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            yield line.decode('utf-8', 'replace').strip()
+        if len(buffer) > max_line_bytes:
+            # Прекалено дълъг ред - връщаме го, за да бъде отчетен като грешка
+            yield buffer.decode('utf-8', 'replace').strip()
+            buffer = b''
+    if buffer.strip():
+        yield buffer.decode('utf-8', 'replace').strip()
+
+
+async def iter_urls(lines: AsyncIterable[str]) -> AsyncIterator[str]:
+    """URL-и от NDJSON / plain text редове ("https://..." или {"url": "..."})."""
+    async for line in lines:
+        if not line:
+            continue
+        if line.startswith('{'):
+            try:
+                line = str(json.loads(line).get('url', ''))
+            except (ValueError, AttributeError):
+                pass
+        yield line
+
+
+async def iter_list(urls) -> AsyncIterator[str]:
+    """Асинхронен итератор върху вече зареден списък с URL-и."""
+    for url in urls:
+        yield str(url)
+
+
+async def spool_stream(chunks: AsyncIterable[bytes], max_memory_bytes: int = 1024 * 1024):
+    """
+    Записва входния поток във временен файл (в паметта до max_memory_bytes,
+    след това на диск) и връща файла, позициониран в началото.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory_bytes)
+    async for chunk in chunks:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+async def iter_file_chunks(file, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+
+class BatchRunner:
+    """
+    Изпълнява анализи за поток от URL-и с глобален и per-domain лимит.
+
+    Входът се чете лениво, а опашките между четенето, анализите и изхода са
+    ограничени, така че паметта не зависи от размера на партидата. Всеки
+    резултат се връща веднага щом е готов (в реда на завършване), а грешките
+    се отчитат за отделния URL.
+
+    URL на домейн, който вече е на per-domain лимита, не заема глобален
+    слот, а се отлага (най-много max_deferred URL-а общо) и тръгва, щом
+    приключи анализ на същия домейн - междувременно другите домейни
+    продължават.
+    """
+
+    def __init__(self, analyze: Callable[[str], Awaitable[Dict[str, Any]]],
+                 concurrency: int = 10, per_domain_concurrency: int = 2,
+                 max_deferred: int = 1000):
+        self.analyze = analyze
+        self.concurrency = max(1, concurrency)
+        self.per_domain_concurrency = max(1, per_domain_concurrency)
+        self.max_deferred = max(1, max_deferred)
+
+    async def run(self, urls: AsyncIterable[str]) -> AsyncIterator[Dict[str, Any]]:
+        results: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        slots = asyncio.Semaphore(self.concurrency)
+        active: Dict[str, int] = {}
+        deferred: Dict[str, Deque[Tuple[int, str]]] = {}
+        deferred_total = 0
+        running: Set[asyncio.Task] = set()
+        changed = asyncio.Event()
+        input_errors = []
+
+        def start(host: str, index: int, url: str):
+            running.add(asyncio.create_task(run_item(host, index, url)))
+
+        async def run_item(host: str, index: int, url: str):
+            nonlocal deferred_total
+            task = asyncio.current_task()
+            try:
+                await results.put(await self._run_one(index, url))
+            finally:
+                running.discard(task)
+                # При прекъсване от run() нищо ново не се стартира
+                if not task.cancelling():
+                    queue = deferred.get(host)
+                    if queue:
+                        # Слотът на домейна и глобалният слот минават на следващия URL
+                        deferred_total -= 1
+                        start(host, *queue.popleft())
+                        if not queue:
+                            del deferred[host]
+                    else:
+                        active[host] -= 1
+                        if not active[host]:
+                            del active[host]
+                        slots.release()
+                changed.set()
+
+        async def dispatch():
+            nonlocal deferred_total
+            index = 0
+            try:
+                async for url in urls:
+                    item_index, index = index, index + 1
+                    host = self._host(url)
+                    if host is None:
+                        await results.put({'index': item_index, 'url': url, 'ok': False, 'error': 'Невалиден URL'})
+                    elif active.get(host, 0) >= self.per_domain_concurrency:
+                        deferred.setdefault(host, deque()).append((item_index, url))
+                        deferred_total += 1
+                        while deferred_total >= self.max_deferred:
+                            changed.clear()
+                            await changed.wait()
+                    else:
+                        await slots.acquire()
+                        active[host] = active.get(host, 0) + 1
+                        start(host, item_index, url)
+            except Exception as e:
+                input_errors.append(str(e))
+            # Отложените URL-и се стартират от завършващите анализи на домейна им
+            while running:
+                changed.clear()
+                await changed.wait()
+            await results.put(_DONE)
+
+        dispatcher = asyncio.create_task(dispatch())
+        try:
+            while True:
+                item = await results.get()
+                if item is _DONE:
+                    break
+                yield item
+            # Грешка при четенето на входа (напр. прекъсната заявка)
+            for error in input_errors:
+                yield {'index': None, 'url': None, 'ok': False, 'error': f'Грешка при четене на входа: {error}'}
+        finally:
+            tasks = [dispatcher, *running]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    def _host(url: str) -> Optional[str]:
+        """Host-ът на http(s) URL (ключът на per-domain лимита) или None за невалиден URL."""
+        try:
+            parsed = urlparse(url)
+            hostname = parsed.hostname
+        except ValueError:
+            # Напр. http://[bad/ - urlparse хвърля ValueError
+            return None
+        if parsed.scheme not in ('http', 'https') or not hostname:
+            return None
+        return hostname.lower()
+
+    async def _run_one(self, index: int, url: str) -> Dict[str, Any]:
+        item: Dict[str, Any] = {'index': index, 'url': url}
+        try:
+            item['result'] = await self.analyze(url)
+            item['ok'] = True
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            item.update({'ok': False, 'error': str(e)})
+        return item
+
+    @staticmethod
+    def to_ndjson(item: Dict[str, Any]) -> bytes:
+        return (json.dumps(item, default=str, ensure_ascii=False) + '\n').encode('utf-8')
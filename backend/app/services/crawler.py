@@ -1,79 +1,133 @@
-import httpx
+import codecs
 from urllib.parse import urlparse, urljoin
 from typing import Dict, List, Optional, Tuple
-import socket
+
+import httpx
+
+from app.config import settings as default_settings
+from app.services.dns_resolver import AsyncResolver, get_resolver
+from app.services.http_client import HTTPClientPool
+from app.services.metrics import Timings, stage
+from app.services.performance import connection_info
+from app.services.streaming_parser import StreamingHTMLAnalyzer
 
 
 class WebsiteCrawler:
     """Взима HTML съдържанието и инфраструктурни данни от URL."""
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(
-            follow_redirects=True,
-            timeout=30.0,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-        )
+    def __init__(self, resolver: Optional[AsyncResolver] = None,
+                 http_pool: Optional[HTTPClientPool] = None,
+                 timings: Optional[Timings] = None):
+        self.resolver = resolver or get_resolver()
+        self.timings = timings
+        # Без подаден pool crawler-ът създава и затваря собствен клиент
+        self._owns_pool = http_pool is None
+        self.http = http_pool or HTTPClientPool.from_settings()
     
     async def fetch(self, url: str) -> Dict:
         """
         Взима страницата и връща HTML, headers, redirect chain и инфраструктурни данни.
         """
         try:
-            response = await self.client.get(url)
-            html = response.text
-            headers = dict(response.headers)
-            
-            # Парсване на URL за домейн
-            parsed = urlparse(str(response.url))
-            domain = parsed.netloc
-            
-            # IP адрес
-            ip_address = None
-            try:
-                ip_address = socket.gethostbyname(domain)
-            except:
-                pass
-            
-            # Redirect chain
-            redirect_chain = []
-            if response.history:
-                redirect_chain = [str(r.url) for r in response.history]
-            redirect_chain.append(str(response.url))
-            
-            # Проверка за HTTP -> HTTPS redirect
-            http_to_https = False
-            if redirect_chain:
-                first_url = redirect_chain[0]
-                final_url = redirect_chain[-1]
-                if first_url.startswith('http://') and final_url.startswith('https://'):
-                    http_to_https = True
-            
-            # Web server от headers
-            web_server = headers.get('Server', '')
-            
-            # HTTP/2 и TLS
-            http_version = 'HTTP/1.1'
-            if hasattr(response, 'http_version'):
-                http_version = f"HTTP/{response.http_version}"
-            
-            return {
-                'html': html,
-                'headers': headers,
-                'status_code': response.status_code,
-                'final_url': str(response.url),
-                'domain': domain,
-                'ip_address': ip_address,
-                'redirect_chain': redirect_chain,
-                'http_to_https_redirect': http_to_https,
-                'web_server': web_server,
-                'http_version': http_version,
-                'content_length': len(response.content)
-            }
+            with stage(self.timings, 'http'):
+                response = await self.http.get(url)
+                html = response.text
+            page = await self._page_info(response)
+            page['html'] = html
+            page['content_length'] = len(response.content)
+            return page
         except Exception as e:
             raise Exception(f"Грешка при взимане на страницата: {str(e)}")
+
+    async def fetch_streaming(self, url: str, extractor: StreamingHTMLAnalyzer,
+                              max_bytes: Optional[int] = None) -> Dict:
+        """
+        Като fetch, но тялото се подава на парчета към extractor-а, вместо да
+        се буферира; HTML не се връща. Чете се най-много max_bytes байта
+        (след декомпресия) - при по-голяма страница extractor.truncated е True.
+        """
+        max_bytes = max_bytes if max_bytes is not None else default_settings.html_max_bytes
+        try:
+            with stage(self.timings, 'http'):
+                async with self.http.stream('GET', url) as response:
+                    extractor.begin(str(response.url), dict(response.headers))
+                    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+                    received = 0
+                    async for chunk in response.aiter_bytes():
+                        if received + len(chunk) > max_bytes:
+                            chunk = chunk[:max_bytes - received]
+                            extractor.truncated = True
+                        received += len(chunk)
+                        extractor.feed(decoder.decode(chunk))
+                        if extractor.truncated:
+                            break
+                    extractor.feed(decoder.decode(b'', final=True))
+            page = await self._page_info(response)
+            page['content_length'] = received
+            return page
+        except Exception as e:
+            raise Exception(f"Грешка при взимане на страницата: {str(e)}")
+
+    async def fetch_headers(self, url: str) -> Dict:
+        """
+        Като fetch, но без тялото - връзката се затваря след header-ите. За
+        анализи, на които HTML не е нужен (само инфраструктура, WHOIS и т.н.).
+        """
+        try:
+            with stage(self.timings, 'http'):
+                async with self.http.stream('GET', url) as response:
+                    pass
+            page = await self._page_info(response)
+            page['content_length'] = None
+            return page
+        except Exception as e:
+            raise Exception(f"Грешка при взимане на страницата: {str(e)}")
+
+    async def _page_info(self, response: httpx.Response) -> Dict:
+        """Инфраструктурните данни за отговора (без тялото)."""
+        headers = dict(response.headers)
+        
+        # Парсване на URL за домейн
+        parsed = urlparse(str(response.url))
+        domain = parsed.netloc
+        
+        # IP адрес (асинхронно, през споделения DNS кеш)
+        with stage(self.timings, 'dns'):
+            ip_address = await self.resolver.resolve_ip(parsed.hostname or '')
+        
+        # Redirect chain
+        redirect_chain = []
+        if response.history:
+            redirect_chain = [str(r.url) for r in response.history]
+        redirect_chain.append(str(response.url))
+        
+        # Проверка за HTTP -> HTTPS redirect
+        http_to_https = False
+        if redirect_chain:
+            first_url = redirect_chain[0]
+            final_url = redirect_chain[-1]
+            if first_url.startswith('http://') and final_url.startswith('https://'):
+                http_to_https = True
+        
+        # Web server от headers (ключовете на httpx са с малки букви)
+        web_server = response.headers.get('server', '')
+        
+        # HTTP версия, TLS версия и cipher от реалната връзка
+        connection = connection_info(response)
+        
+        return {
+            'headers': headers,
+            'status_code': response.status_code,
+            'final_url': str(response.url),
+            'domain': domain,
+            'ip_address': ip_address,
+            'redirect_chain': redirect_chain,
+            'http_to_https_redirect': http_to_https,
+            'web_server': web_server,
+            **connection
+        }
     
     async def close(self):
-        await self.client.aclose()
+        if self._owns_pool:
+            await self.http.aclose()
 
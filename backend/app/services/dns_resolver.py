@@ -0,0 +1,410 @@
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+from typing import Dict, List, Optional, Tuple
+
+from app.services.ttl_cache import MISSING, TTLCache
+
+
+TYPE_A = 1
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_PTR = 12
+TYPE_AAAA = 28
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+
+class DNSError(Exception):
+    """Грешка при DNS заявка (timeout, SERVFAIL, невалиден отговор)."""
+
+
+def _encode_name(name: str) -> bytes:
+    try:
+        parts = [label.encode('idna') for label in name.rstrip('.').split('.') if label]
+    except UnicodeError as e:
+        raise DNSError(f'Невалидно име {name!r}: {e}')
+    if any(len(part) > 63 for part in parts) or sum(len(part) + 1 for part in parts) > 254:
+        raise DNSError(f'Твърде дълго име {name!r}')
+    return b''.join(struct.pack('!B', len(part)) + part for part in parts) + b'\x00'
+
+
+def build_query(query_id: int, name: str, qtype: int) -> bytes:
+    """Строи DNS заявка (RD=1, един въпрос, клас IN)."""
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    return header + _encode_name(name) + struct.pack('!HH', qtype, 1)
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """Чете (евентуално компресирано) име и връща (име, offset след него)."""
+    labels = []
+    end_offset = None
+    jumps = 0
+    while True:
+        if offset >= len(data):
+            raise DNSError('Прекъснат DNS отговор')
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if end_offset is None:
+                end_offset = offset + 2
+            offset = struct.unpack_from('!H', data, offset)[0] & 0x3FFF
+            jumps += 1
+            if jumps > 64:
+                raise DNSError('Цикъл при компресия на име')
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('ascii', 'replace'))
+        offset += length
+    return '.'.join(labels), (end_offset if end_offset is not None else offset)
+
+
+def parse_response(data: bytes) -> dict:
+    """
+    Парсва DNS отговор и връща id, флагове, rcode, answers и authority
+    (списъци от (name, type, ttl, value)). При невалиден отговор - DNSError.
+    """
+    try:
+        return _parse_response(data)
+    except (struct.error, ValueError, IndexError) as e:
+        raise DNSError(f'Невалиден DNS отговор: {e}')
+
+
+def _parse_response(data: bytes) -> dict:
+    if len(data) < 12:
+        raise DNSError('Твърде кратък DNS отговор')
+    query_id, flags, qdcount, ancount, nscount, _ = struct.unpack_from('!HHHHHH', data, 0)
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+
+    def read_records(count: int, offset: int):
+        records = []
+        for _ in range(count):
+            name, offset = _read_name(data, offset)
+            rtype, _, ttl, rdlength = struct.unpack_from('!HHIH', data, offset)
+            offset += 10
+            rdata_offset = offset
+            offset += rdlength
+            if rtype == TYPE_A and rdlength == 4:
+                value = socket.inet_ntop(socket.AF_INET, data[rdata_offset:offset])
+            elif rtype == TYPE_AAAA and rdlength == 16:
+                value = socket.inet_ntop(socket.AF_INET6, data[rdata_offset:offset])
+            elif rtype in (TYPE_PTR, TYPE_CNAME):
+                value, _ = _read_name(data, rdata_offset)
+            elif rtype == TYPE_SOA:
+                _, pos = _read_name(data, rdata_offset)
+                _, pos = _read_name(data, pos)
+                value = struct.unpack_from('!IIIII', data, pos)[4]
+            else:
+                value = data[rdata_offset:offset]
+            records.append((name, rtype, ttl, value))
+        return records, offset
+
+    answers, offset = read_records(ancount, offset)
+    authority, offset = read_records(nscount, offset)
+    return {
+        'id': query_id,
+        'truncated': bool(flags & 0x0200),
+        'rcode': flags & 0x000F,
+        'answers': answers,
+        'authority': authority,
+    }
+
+
+def read_hosts(path: str = '/etc/hosts') -> Dict[str, List[str]]:
+    """Чете hosts файла: име (малки букви) -> адреси, в реда на файла."""
+    hosts: Dict[str, List[str]] = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split('#', 1)[0].split()
+                if len(parts) < 2:
+                    continue
+                try:
+                    address = str(ipaddress.ip_address(parts[0].split('%', 1)[0]))
+                except ValueError:
+                    continue
+                for name in parts[1:]:
+                    addresses = hosts.setdefault(name.rstrip('.').lower(), [])
+                    if address not in addresses:
+                        addresses.append(address)
+    except OSError:
+        pass
+    return hosts
+
+
+def system_nameservers(path: str = '/etc/resolv.conf') -> List[str]:
+    """Чете nameserver-ите от resolv.conf."""
+    nameservers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    nameservers.append(parts[1])
+    except OSError:
+        pass
+    return nameservers
+
+
+def _matches_query(data: bytes, payload: bytes) -> bool:
+    """Отговорът е за заявката payload: същото id и същият въпрос (без значение от регистъра)."""
+    question = payload[12:]
+    return (len(data) >= len(payload) and data[:2] == payload[:2]
+            and data[4:6] == payload[4:6] and data[12:len(payload)].lower() == question.lower())
+
+
+class _UDPQuery(asyncio.DatagramProtocol):
+    def __init__(self, payload: bytes, future: asyncio.Future):
+        self.payload = payload
+        self.future = future
+
+    def connection_made(self, transport):
+        transport.sendto(self.payload)
+
+    def datagram_received(self, data, addr):
+        # Чужди или подправени отговори се игнорират - чака се верният до timeout
+        if not self.future.done() and _matches_query(data, self.payload):
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class AsyncResolver:
+    """
+    Асинхронен DNS resolver за A/AAAA и PTR заявки.
+
+    Отговорите се кешират за процеса според TTL-а от DNS, едновременните
+    заявки за едно и също име се обединяват, а неуспешните (NXDOMAIN / празен
+    отговор) се пазят в ограничен negative кеш.
+
+    Както системният resolver, първо се проверява hosts файлът, а имената
+    без точка (за search домейните от resolv.conf) отиват към getaddrinfo.
+    Ако няма конфигурирани nameserver-и или никой не отговаря, се използва
+    системният resolver в executor.
+    """
+
+    def __init__(self, nameservers: Optional[List[str]] = None, port: int = 53,
+                 timeout: float = 2.0, attempts: int = 2, cache_size: int = 10000,
+                 negative_cache_size: int = 1000, negative_ttl: float = 60.0,
+                 max_ttl: float = 86400.0, fallback_ttl: float = 300.0,
+                 hosts: Optional[Dict[str, List[str]]] = None):
+        self.nameservers = nameservers if nameservers is not None else system_nameservers()
+        self.hosts = hosts if hosts is not None else read_hosts()
+        self.port = port
+        self.timeout = timeout
+        self.attempts = attempts
+        self.negative_ttl = negative_ttl
+        self.max_ttl = max_ttl
+        self.fallback_ttl = fallback_ttl
+        self._cache = TTLCache(cache_size)
+        self._negative_cache = TTLCache(negative_cache_size)
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+        self.queries_sent = 0
+        self.coalesced = 0
+
+    async def resolve(self, host: str, qtype: int = TYPE_A) -> List[str]:
+        """Връща IP адресите за host (A или AAAA); празен списък при неуспех."""
+        host = (host or '').strip().rstrip('.').lower()
+        if not host:
+            return []
+        try:
+            literal = ipaddress.ip_address(host)
+            expected = 4 if qtype == TYPE_A else 6
+            return [str(literal)] if literal.version == expected else []
+        except ValueError:
+            pass
+        return await self._lookup(host, qtype)
+
+    async def resolve_ip(self, host: str) -> Optional[str]:
+        """Първият IPv4 адрес на host, иначе първият IPv6, иначе None."""
+        for qtype in (TYPE_A, TYPE_AAAA):
+            addresses = await self.resolve(host, qtype)
+            if addresses:
+                return addresses[0]
+        return None
+
+    async def reverse(self, ip_address: str) -> Optional[str]:
+        """Reverse DNS (PTR) за IP адрес."""
+        try:
+            name = ipaddress.ip_address(ip_address).reverse_pointer
+        except ValueError:
+            return None
+        names = await self._lookup(name, TYPE_PTR)
+        return names[0] if names else None
+
+    def stats(self) -> dict:
+        return {
+            'cache_entries': len(self._cache),
+            'negative_cache_entries': len(self._negative_cache),
+            'cache_hits': self._cache.hits,
+            'cache_misses': self._cache.misses,
+            'queries_sent': self.queries_sent,
+            'coalesced': self.coalesced,
+            'inflight': len(self._inflight),
+        }
+
+    async def _lookup(self, name: str, qtype: int) -> List[str]:
+        key = (name, qtype)
+        cached = self._cache.get(key)
+        if cached is not MISSING:
+            return list(cached)
+        if self._negative_cache.get(key) is not MISSING:
+            return []
+
+        # Обединяване на едновременните заявки за същото име
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return list(await asyncio.shield(inflight))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            values, ttl = await self._query(name, qtype)
+            if values:
+                self._cache.set(key, tuple(values), min(ttl, self.max_ttl))
+            else:
+                self._negative_cache.set(key, True, min(ttl, self.negative_ttl))
+            future.set_result(tuple(values))
+            return values
+        except (DNSError, OSError, EOFError, asyncio.TimeoutError):
+            # Временните грешки не се кешират (EOFError - прекъснат TCP отговор)
+            return []
+        finally:
+            if not future.done():
+                future.set_result(())
+            self._inflight.pop(key, None)
+
+    async def _query(self, name: str, qtype: int) -> Tuple[List[str], float]:
+        from_hosts = self._hosts_lookup(name, qtype)
+        if from_hosts:
+            return from_hosts, self.fallback_ttl
+        if not self.nameservers or (qtype != TYPE_PTR and '.' not in name):
+            return await self._system_query(name, qtype)
+
+        _encode_name(name)  # невалидното име не се праща към nameserver-ите
+        last_error: Optional[Exception] = None
+        for _ in range(self.attempts):
+            for nameserver in self.nameservers:
+                try:
+                    response = await self._exchange(nameserver, name, qtype)
+                except (asyncio.TimeoutError, OSError, EOFError, DNSError) as e:
+                    last_error = e
+                    continue
+                return self._extract(response, name, qtype)
+        # Никой nameserver не отговаря - опитваме системния resolver (getaddrinfo)
+        try:
+            return await self._system_query(name, qtype)
+        except OSError:
+            raise DNSError(f'Няма отговор от DNS за {name}: {last_error}')
+
+    def _hosts_lookup(self, name: str, qtype: int) -> List[str]:
+        if qtype == TYPE_PTR:
+            try:
+                ip = _ip_from_reverse_pointer(name)
+            except ValueError:
+                return []
+            return [host for host, addresses in self.hosts.items() if ip in addresses][:1]
+        version = 4 if qtype == TYPE_A else 6
+        return [address for address in self.hosts.get(name, [])
+                if ipaddress.ip_address(address).version == version]
+
+    async def _exchange(self, nameserver: str, name: str, qtype: int) -> dict:
+        query_id = random.randint(0, 0xFFFF)
+        payload = build_query(query_id, name, qtype)
+        self.queries_sent += 1
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: _UDPQuery(payload, future), remote_addr=(nameserver, self.port)
+        )
+        try:
+            data = await asyncio.wait_for(future, self.timeout)
+        finally:
+            transport.close()
+
+        response = parse_response(data)
+        if response['truncated']:
+            response = await self._exchange_tcp(nameserver, payload)
+        return response
+
+    async def _exchange_tcp(self, nameserver: str, payload: bytes) -> dict:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(nameserver, self.port), self.timeout
+        )
+        try:
+            writer.write(struct.pack('!H', len(payload)) + payload)
+            await writer.drain()
+            length = struct.unpack('!H', await asyncio.wait_for(reader.readexactly(2), self.timeout))[0]
+            data = await asyncio.wait_for(reader.readexactly(length), self.timeout)
+        finally:
+            writer.close()
+        if not _matches_query(data, payload):
+            raise DNSError(f'TCP отговорът от {nameserver} не съответства на заявката')
+        return parse_response(data)
+
+    def _extract(self, response: dict, name: str, qtype: int) -> Tuple[List[str], float]:
+        rcode = response['rcode']
+        if rcode not in (RCODE_NOERROR, RCODE_NXDOMAIN):
+            raise DNSError(f'DNS rcode {rcode} за {name}')
+
+        values = []
+        ttls = []
+        for _, rtype, ttl, value in response['answers']:
+            if rtype == qtype:
+                values.append(value)
+                ttls.append(ttl)
+            elif rtype == TYPE_CNAME:
+                ttls.append(ttl)
+        if values:
+            return values, float(min(ttls))
+
+        # Negative TTL от SOA записа (RFC 2308)
+        for _, rtype, ttl, minimum in response['authority']:
+            if rtype == TYPE_SOA:
+                return [], float(min(ttl, minimum))
+        return [], self.negative_ttl
+
+    async def _system_query(self, name: str, qtype: int) -> Tuple[List[str], float]:
+        """Fallback към системния resolver, без да блокира event loop-а."""
+        loop = asyncio.get_running_loop()
+        try:
+            if qtype == TYPE_PTR:
+                ip = _ip_from_reverse_pointer(name)
+                hostname = (await loop.run_in_executor(None, socket.gethostbyaddr, ip))[0]
+                return [hostname], self.fallback_ttl
+            family = socket.AF_INET if qtype == TYPE_A else socket.AF_INET6
+            infos = await loop.getaddrinfo(name, None, family=family, type=socket.SOCK_STREAM)
+        except (socket.herror, socket.gaierror):
+            return [], self.negative_ttl
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        return addresses, self.fallback_ttl
+
+
+def _ip_from_reverse_pointer(name: str) -> str:
+    labels = name.split('.')
+    if name.endswith('.in-addr.arpa'):
+        return '.'.join(reversed(labels[:4]))
+    nibbles = ''.join(reversed(labels[:32]))
+    return str(ipaddress.ip_address(':'.join(nibbles[i:i + 4] for i in range(0, 32, 4))))
+
+
+_default_resolver: Optional[AsyncResolver] = None
+
+
+def get_resolver() -> AsyncResolver:
+    """Връща споделения за процеса resolver."""
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = AsyncResolver()
+    return _default_resolver
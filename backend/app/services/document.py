@@ -0,0 +1,124 @@
+from bs4 import BeautifulSoup, Tag
+from typing import Dict, List, Optional, Tuple, Union
+
+
+class ParsedDocument:
+    """
+    Веднъж парсната HTML страница, която се споделя между всички анализатори.
+
+    Дървото се строи само веднъж, а производните изгледи (lowercase HTML,
+    get_text(), индекси на таговете по име и атрибут) се изчисляват при
+    първо поискване и се кешират.
+    """
+
+    def __init__(self, html: str, parser: str = 'lxml'):
+        self.html = html or ''
+        self.soup = BeautifulSoup(self.html, parser)
+        self._lower: Optional[str] = None
+        self._text: Optional[str] = None
+        self._size_bytes: Optional[int] = None
+        self._tags_by_name: Optional[Dict[str, List[Tag]]] = None
+        self._attr_index: Dict[Tuple[str, str], Dict[str, List[Tag]]] = {}
+
+    @classmethod
+    def ensure(cls, source: Union['ParsedDocument', str]) -> 'ParsedDocument':
+        """Връща документа непроменен или парсва подадения HTML низ."""
+        if isinstance(source, cls):
+            return source
+        return cls(source)
+
+    @property
+    def lower(self) -> str:
+        """HTML изходният код с малки букви."""
+        if self._lower is None:
+            self._lower = self.html.lower()
+        return self._lower
+
+    @property
+    def text(self) -> str:
+        """Видимият текст на страницата (soup.get_text())."""
+        if self._text is None:
+            self._text = self.soup.get_text()
+        return self._text
+
+    @property
+    def size_bytes(self) -> int:
+        """Размер на HTML в байтове (UTF-8)."""
+        if self._size_bytes is None:
+            self._size_bytes = len(self.html.encode('utf-8'))
+        return self._size_bytes
+
+    def find_all(self, name: str, attrs: Optional[Dict] = None) -> List[Tag]:
+        """
+        Връща всички тагове с дадено име, филтрирани по атрибути.
+
+        Стойностите в attrs следват семантиката на BeautifulSoup: низ за точно
+        съвпадение, компилиран regex за search и True за наличие на атрибута.
+        """
+        if not attrs:
+            return list(self._tags(name))
+
+        candidates = None
+        for attr, expected in attrs.items():
+            if isinstance(expected, str):
+                candidates = self._attr_values(name, attr).get(expected, [])
+                break
+        if candidates is None:
+            candidates = self._tags(name)
+
+        return [tag for tag in candidates if self._matches(tag, attrs)]
+
+    def find(self, name: str, attrs: Optional[Dict] = None) -> Optional[Tag]:
+        """Връща първия таг, отговарящ на условията, или None."""
+        found = self.find_all(name, attrs)
+        return found[0] if found else None
+
+    def _tags(self, name: str) -> List[Tag]:
+        """Индекс на таговете по име, построен с едно обхождане на дървото."""
+        if self._tags_by_name is None:
+            index: Dict[str, List[Tag]] = {}
+            for tag in self.soup.find_all(True):
+                index.setdefault(tag.name, []).append(tag)
+            self._tags_by_name = index
+        return self._tags_by_name.get(name, [])
+
+    def _attr_values(self, name: str, attr: str) -> Dict[str, List[Tag]]:
+        """Индекс стойност на атрибут -> тагове за дадено име на таг."""
+        key = (name, attr)
+        if key not in self._attr_index:
+            index: Dict[str, List[Tag]] = {}
+            for tag in self._tags(name):
+                for value in self._candidate_values(tag.get(attr)):
+                    bucket = index.setdefault(value, [])
+                    if not bucket or bucket[-1] is not tag:
+                        bucket.append(tag)
+            self._attr_index[key] = index
+        return self._attr_index[key]
+
+    @staticmethod
+    def _candidate_values(value) -> List[str]:
+        """Стойностите, с които BeautifulSoup сравнява (вкл. multi-valued атрибути)."""
+        if value is None:
+            return []
+        if isinstance(value, list):
+            if len(value) > 1:
+                return value + [' '.join(value)]
+            return list(value)
+        return [value]
+
+    def _matches(self, tag: Tag, attrs: Dict) -> bool:
+        for attr, expected in attrs.items():
+            actual = tag.get(attr)
+            if expected is True:
+                if actual is None:
+                    return False
+                continue
+            values = self._candidate_values(actual)
+            if not values:
+                return False
+            if hasattr(expected, 'search'):
+                if not any(expected.search(value) for value in values):
+                    return False
+            elif expected not in values:
+                return False
+        return True
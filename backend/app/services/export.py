@@ -0,0 +1,398 @@
+"""
+Колонен експорт (CSV / Parquet) на резултатите от batch анализи и обхождания.
+
+Вложените snapshot-и се свеждат до плоска схема с фиксирани колони и типове
+(BATCH_COLUMNS, CRAWL_PAGE_COLUMNS) - едни и същи при всеки експорт, така че
+файловете се четат директно от pandas / DuckDB. Редовете се пишат поточно:
+CSV на парчета, Parquet на row group-и от по chunk_rows реда, т.е. паметта
+не зависи от броя резултати.
+
+Конвертиране на вече записани резултати (от директорията backend):
+    python -m app.services.export batch results.ndjson results.parquet
+    python -m app.services.export crawl <crawl_id>.json.pages.jsonl pages.csv.gz
+
+Входът е NDJSON от /analyze/batch или /analyze/sitemap (редът
+sitemap_report се пропуска), съответно страниците на обхождане; "-" е stdin.
+Форматът се определя от разширението (или --format), а компресията -
+с --compression (gzip за CSV; snappy, zstd, gzip, brotli, lz4 за Parquet).
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import time
+import zlib
+from typing import Any, AsyncIterable, AsyncIterator, BinaryIO, Callable, Dict, Iterable, List, Optional
+
+from app.config import settings
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - Parquet е по избор
+    pyarrow = None
+
+
+STRING, INT, FLOAT, BOOL, LIST = 'string', 'int', 'float', 'bool', 'list'
+
+FORMATS = ('csv', 'parquet')
+CSV_COMPRESSIONS = ('none', 'gzip')
+PARQUET_COMPRESSIONS = ('none', 'snappy', 'zstd', 'gzip', 'brotli', 'lz4')
+MEDIA_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+# Разделител на елементите на списъчните колони в CSV
+LIST_SEPARATOR = '|'
+
+
+class ExportError(Exception):
+    """Неподдържан формат или компресия, или липсващ pyarrow."""
+
+
+class Column:
+    """Колона от схемата: име, тип и функция, която взима стойността от записа."""
+
+    def __init__(self, name: str, kind: str, get: Callable[[Dict[str, Any]], Any]):
+        self.name = name
+        self.kind = kind
+        self.get = get
+
+    def value(self, record: Dict[str, Any]) -> Any:
+        return _coerce(self.kind, self.get(record))
+
+
+def _at(*keys: str) -> Callable[[Dict[str, Any]], Any]:
+    def get(record: Dict[str, Any]) -> Any:
+        for key in keys:
+            if not isinstance(record, dict):
+                return None
+            record = record.get(key)
+        return record
+    return get
+
+
+def _count(*keys: str) -> Callable[[Dict[str, Any]], Any]:
+    get = _at(*keys)
+    return lambda record: len(get(record)) if isinstance(get(record), (list, dict)) else None
+
+
+def _json(*keys: str) -> Callable[[Dict[str, Any]], Any]:
+    get = _at(*keys)
+    return lambda record: json.dumps(get(record), ensure_ascii=False, sort_keys=True) if get(record) else None
+
+
+def _coerce(kind: str, value: Any) -> Any:
+    if value is None:
+        return None
+    try:
+        if kind == LIST:
+            return [str(item) for item in value] if isinstance(value, (list, tuple)) else [str(value)]
+        if kind == BOOL:
+            return bool(value)
+        if kind == INT:
+            return int(value)
+        if kind == FLOAT:
+            return float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+_RESULT = ('result',)
+_DOMAIN = (*_RESULT, 'domain_and_infrastructure')
+_TECH = (*_RESULT, 'technology_detection')
+_SEO = (*_RESULT, 'on_page_seo')
+_META = (*_RESULT, 'metadata_and_structured_data')
+_WHOIS = (*_RESULT, 'whois_and_ip_whois', 'domain_whois')
+_PERFORMANCE = (*_RESULT, 'performance', 'summary_ms')
+
+# Редовете на /analyze/batch и /analyze/sitemap ({'index', 'url', 'ok', 'error', 'result'})
+BATCH_COLUMNS: List[Column] = [
+    Column('index', INT, _at('index')),
+    Column('url', STRING, _at('url')),
+    Column('ok', BOOL, _at('ok')),
+    Column('error', STRING, _at('error')),
+    Column('final_url', STRING, _at(*_RESULT, 'final_url')),
+    Column('snapshot_id', INT, _at(*_RESULT, 'snapshot_id')),
+    # Домейн и инфраструктура
+    *[Column(name, kind, _at(*_DOMAIN, name)) for name, kind in (
+        ('domain', STRING), ('ip_address', STRING), ('hosting_provider', STRING),
+        ('server_location_country', STRING), ('asn', INT), ('as_organization', STRING),
+        ('web_server', STRING), ('http_to_https_redirect', BOOL),
+    )],
+    # WHOIS (датите са ISO низове, както в snapshot-а)
+    Column('registrar', STRING, _at(*_WHOIS, 'registrar')),
+    Column('creation_date', STRING, _at(*_WHOIS, 'creation_date')),
+    Column('expiry_date', STRING, _at(*_WHOIS, 'expiry_date')),
+    Column('domain_age_days', INT, _at(*_DOMAIN, 'domain_age_days')),
+    Column('name_servers', LIST, _at(*_WHOIS, 'name_servers')),
+    # Технологии
+    *[Column(name, kind, _at(*_TECH, name)) for name, kind in (
+        ('cms', STRING), ('cms_version', STRING), ('plugins', LIST), ('javascript_libraries', LIST),
+        ('cache_systems', LIST), ('cdn', STRING), ('tag_managers', LIST), ('social_embeds', LIST),
+        ('http_version', STRING), ('tls_version', STRING),
+    )],
+    # On-page SEO
+    *[Column(name, kind, _at(*_SEO, name)) for name, kind in (
+        ('title', STRING), ('meta_description', STRING), ('language', STRING),
+        ('page_size', INT), ('text_size', INT), ('text_to_code_ratio', FLOAT),
+    )],
+    *[Column(f'{level}_count', INT, _at(*_SEO, 'headings', level, 'count'))
+      for level in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')],
+    *[Column(f'links_{name}', INT, _at(*_SEO, 'links', name))
+      for name in ('internal', 'external', 'nofollow', 'duplicated')],
+    *[Column(f'images_{name}', INT, _at(*_SEO, 'images', name))
+      for name in ('missing_alt', 'duplicated', 'with_title')],
+    # Метаданни, Open Graph и Twitter
+    Column('canonical', STRING, _at(*_META, 'canonical')),
+    Column('robots_meta', STRING, _at(*_META, 'robots_meta')),
+    *[Column(f'og_{name}', STRING, _at(*_META, 'open_graph', name))
+      for name in ('title', 'description', 'image', 'type', 'url', 'site_name')],
+    *[Column(f'twitter_{name}', STRING, _at(*_META, 'twitter_cards', name))
+      for name in ('card', 'title', 'description', 'image', 'site')],
+    Column('json_ld_count', INT, _count(*_META, 'json_ld')),
+    Column('feeds_count', INT, _count(*_META, 'feeds')),
+    # Проверките по избор (празни, ако не са поискани)
+    Column('robots_url_allowed', BOOL, _at(*_RESULT, 'robots_and_sitemaps', 'url_allowed')),
+    *[Column(f'link_{name}', INT, _at(*_RESULT, 'link_health', name))
+      for name in ('checked', 'ok', 'broken', 'redirected')],
+    *[Column(f'image_{name}', INT, _at(*_RESULT, 'image_audit', name))
+      for name in ('audited', 'total_bytes', 'errors')],
+    *[Column(f'{metric}_p50_ms', FLOAT, _at(*_PERFORMANCE, metric, 'p50'))
+      for metric in ('ttfb', 'total')],
+    # Грешките по етапи на частичните snapshot-и (JSON)
+    Column('stage_errors', STRING, _json(*_RESULT, 'errors')),
+]
+
+# Страниците на обхождане (/crawl и <crawl_id>.json.pages.jsonl)
+CRAWL_PAGE_COLUMNS: List[Column] = [
+    Column(name, kind, _at(name)) for name, kind in (
+        ('url', STRING), ('depth', INT), ('status_code', INT), ('final_url', STRING),
+        ('title', STRING), ('h1_count', INT), ('canonical', STRING), ('robots_meta', STRING),
+        ('skipped', STRING), ('error', STRING),
+    )
+]
+
+
+class ByteSink:
+    """Файл само за писане, който събира байтовете за поточен HTTP отговор."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ExportWriter:
+    """Общата част на писачите: буфер от chunk_rows реда, който се записва наведнъж."""
+
+    def __init__(self, out: BinaryIO, columns: List[Column], chunk_rows: int):
+        self.out = out
+        self.columns = columns
+        self.chunk_rows = max(1, chunk_rows)
+        self.rows_written = 0
+        self._rows: List[List[Any]] = []
+
+    def write(self, record: Dict[str, Any]):
+        self._rows.append([column.value(record) for column in self.columns])
+        if len(self._rows) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self._rows:
+            self._write_chunk(self._rows)
+            self.rows_written += len(self._rows)
+            self._rows = []
+
+    def close(self):
+        self.flush()
+
+    def _write_chunk(self, rows: List[List[Any]]):
+        raise NotImplementedError
+
+
+class CSVExportWriter(ExportWriter):
+    """CSV с header ред; списъците са съединени с LIST_SEPARATOR, gzip - поточно."""
+
+    def __init__(self, out: BinaryIO, columns: List[Column], chunk_rows: int = 5000,
+                 compression: Optional[str] = None, compression_level: Optional[int] = None):
+        super().__init__(out, columns, chunk_rows)
+        if (compression or 'none') not in CSV_COMPRESSIONS:
+            raise ExportError(f"Неподдържана компресия за CSV: {compression} ({', '.join(CSV_COMPRESSIONS)})")
+        # wbits=31 - gzip header и trailer, т.е. валиден .csv.gz файл
+        self._compressor = zlib.compressobj(
+            compression_level if compression_level is not None else 6, zlib.DEFLATED, 31
+        ) if compression == 'gzip' else None
+        self._emit(self._encode([[column.name for column in columns]]))
+
+    def _write_chunk(self, rows: List[List[Any]]):
+        self._emit(self._encode(
+            [[LIST_SEPARATOR.join(value) if isinstance(value, list) else value for value in row] for row in rows]
+        ))
+
+    def close(self):
+        super().close()
+        if self._compressor is not None:
+            self.out.write(self._compressor.flush())
+
+    @staticmethod
+    def _encode(rows: List[List[Any]]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+    def _emit(self, data: bytes):
+        self.out.write(self._compressor.compress(data) if self._compressor is not None else data)
+
+
+class ParquetExportWriter(ExportWriter):
+    """Parquet с по един row group на chunk_rows реда (изисква pyarrow)."""
+
+    ARROW_TYPES = {STRING: 'string', INT: 'int64', FLOAT: 'float64', BOOL: 'bool_'}
+
+    def __init__(self, out: BinaryIO, columns: List[Column], chunk_rows: int = 5000,
+                 compression: Optional[str] = 'snappy', compression_level: Optional[int] = None):
+        super().__init__(out, columns, chunk_rows)
+        if pyarrow is None:
+            raise ExportError("Parquet експортът изисква pyarrow (pip install -r requirements.txt)")
+        if (compression or 'none') not in PARQUET_COMPRESSIONS:
+            raise ExportError(
+                f"Неподдържана компресия за Parquet: {compression} ({', '.join(PARQUET_COMPRESSIONS)})"
+            )
+        self.schema = pyarrow.schema([
+            (column.name, pyarrow.list_(pyarrow.string()) if column.kind == LIST
+             else getattr(pyarrow, self.ARROW_TYPES[column.kind])())
+            for column in columns
+        ])
+        self._writer = pyarrow.parquet.ParquetWriter(
+            out, self.schema, compression=compression or 'none', compression_level=compression_level
+        )
+
+    def _write_chunk(self, rows: List[List[Any]]):
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array([row[i] for row in rows], type=field.type) for i, field in enumerate(self.schema)],
+            schema=self.schema
+        )
+        self._writer.write_table(table, row_group_size=len(rows))
+
+    def close(self):
+        super().close()
+        # Footer-ът на файла се записва тук
+        self._writer.close()
+
+
+def open_writer(out: BinaryIO, columns: List[Column], format: str = 'csv',
+                compression: Optional[str] = None, compression_level: Optional[int] = None,
+                chunk_rows: Optional[int] = None) -> ExportWriter:
+    """Писач за format; compression=None - gzip-ът на CSV е изключен, а Parquet е snappy."""
+    chunk_rows = chunk_rows or settings.export_chunk_rows
+    if format == 'csv':
+        return CSVExportWriter(out, columns, chunk_rows, compression, compression_level)
+    if format == 'parquet':
+        return ParquetExportWriter(out, columns, chunk_rows, compression or 'snappy', compression_level)
+    raise ExportError(f"Неподдържан формат: {format} ({', '.join(FORMATS)})")
+
+
+def filename(name: str, format: str, compression: Optional[str] = None) -> str:
+    return f"{name}.{format}" + ('.gz' if format == 'csv' and compression == 'gzip' else '')
+
+
+async def stream_export(records: AsyncIterable[Dict[str, Any]], columns: List[Column],
+                        format: str = 'csv', compression: Optional[str] = None,
+                        compression_level: Optional[int] = None,
+                        chunk_rows: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Пише записите във format и връща байтовете веднага след всяко парче -
+    за StreamingResponse. Грешките в конфигурацията (ExportError) се хвърлят
+    още при създаването на писача - извикайте open_writer предварително, ако
+    трябва да се върне 400.
+    """
+    sink = ByteSink()
+    writer = open_writer(sink, columns, format, compression, compression_level, chunk_rows)
+    async for record in records:
+        writer.write(record)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def export_records(records: Iterable[Dict[str, Any]], out: BinaryIO, columns: List[Column],
+                   format: str = 'csv', compression: Optional[str] = None,
+                   compression_level: Optional[int] = None, chunk_rows: Optional[int] = None) -> int:
+    """Синхронният вариант на stream_export за файлове; връща броя редове."""
+    writer = open_writer(out, columns, format, compression, compression_level, chunk_rows)
+    for record in records:
+        writer.write(record)
+    writer.close()
+    return writer.rows_written
+
+
+def _read_records(file, kind: str) -> Iterable[Dict[str, Any]]:
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        record = json.loads(line)
+        # Финалният ред на /analyze/sitemap и т.н. не е резултат
+        if isinstance(record, dict) and 'url' in record and (kind == 'crawl' or 'index' in record):
+            yield record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('kind', choices=('batch', 'crawl'), help='вид на входа (определя схемата)')
+    parser.add_argument('input', help='NDJSON файл ("-" за stdin)')
+    parser.add_argument('output', help='изходен файл')
+    parser.add_argument('--format', choices=FORMATS, help='по подразбиране - от разширението на output')
+    parser.add_argument('--compression', help='gzip за CSV; snappy (по подразбиране), zstd, gzip, brotli, lz4 за Parquet')
+    parser.add_argument('--compression-level', type=int)
+    parser.add_argument('--chunk-rows', type=int, default=settings.export_chunk_rows,
+                        help='редове в парче CSV / row group на Parquet')
+    args = parser.parse_args()
+
+    format = args.format or ('parquet' if args.output.endswith('.parquet') else 'csv')
+    compression = args.compression or ('gzip' if format == 'csv' and args.output.endswith('.gz') else None)
+    columns = BATCH_COLUMNS if args.kind == 'batch' else CRAWL_PAGE_COLUMNS
+
+    try:
+        # Проверка преди да се създаде изходният файл
+        open_writer(ByteSink(), columns, format, compression, args.compression_level)
+    except ExportError as e:
+        parser.error(str(e))
+
+    started = time.perf_counter()
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    try:
+        with open(args.output, 'wb') as out:
+            rows = export_records(_read_records(source, args.kind), out, columns, format,
+                                  compression, args.compression_level, args.chunk_rows)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(json.dumps({'rows': rows, 'format': format, 'compression': compression,
+                      'seconds': round(time.perf_counter() - started, 2)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from app.services.document import ParsedDocument
+
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - по избор, има regex fallback
+    ahocorasick = None
+
+
+DEFAULT_SIGNATURES_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'data', 'technologies.json'
+)
+
+
+class LiteralMatcher:
+    """
+    Търси едновременно много литерални низове с едно преминаване през текста.
+
+    Използва Aho-Corasick автомат (pyahocorasick), ако е инсталиран, иначе
+    компилира литералите в един trie-regex. И в двата случая цената на
+    сканирането почти не зависи от броя на литералите.
+    """
+
+    def __init__(self, literals: Iterable[str]):
+        self.literals = sorted({literal for literal in literals if literal})
+        self._automaton = None
+        self._pattern = None
+        self._prefixes: Dict[str, List[str]] = {}
+
+        if not self.literals:
+            return
+
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for literal in self.literals:
+                automaton.add_word(literal, literal)
+            automaton.make_automaton()
+            self._automaton = automaton
+        else:
+            self._pattern = re.compile(self._trie_pattern(self.literals))
+            # Regex-ът връща най-дългия литерал за дадена позиция, затова
+            # предварително пазим кои други литерали са негови префикси
+            literal_set = set(self.literals)
+            for literal in self.literals:
+                self._prefixes[literal] = [
+                    literal[:i] for i in range(1, len(literal) + 1) if literal[:i] in literal_set
+                ]
+
+    def scan(self, text: str) -> Set[str]:
+        """Връща множеството литерали, които се срещат в текста."""
+        found: Set[str] = set()
+        if not text or not self.literals:
+            return found
+
+        if self._automaton is not None:
+            for _, literal in self._automaton.iter(text):
+                found.add(literal)
+            return found
+
+        search = self._pattern.search
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if not match:
+                break
+            found.update(self._prefixes[match.group(0)])
+            pos = match.start() + 1
+        return found
+
+    @staticmethod
+    def _trie_pattern(literals: List[str]) -> str:
+        """Строи regex от trie на литералите, за да няма backtracking по алтернативи."""
+        root: Dict = {}
+        for literal in literals:
+            node = root
+            for char in literal:
+                node = node.setdefault(char, {})
+            node[''] = {}
+
+        def build(node: Dict) -> str:
+            is_end = '' in node
+            branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            if is_end:
+                return '(?:' + body + ')?'
+            return body
+
+        return build(root)
+
+
+class FingerprintEngine:
+    """
+    Компилира база от сигнатури на технологии в multi-pattern matcher-и.
+
+    Всяка сигнатура е запис с name, category и някое от полетата:
+    html (литерали, case-sensitive), html_i (литерали, case-insensitive),
+    script_src (литерали в src на <script>), meta ({name: [литерали]}),
+    headers ({header: литерал в стойността или "" за наличие}),
+    version ([{source, regex}]), extract (regex, чиято група дава името)
+    и report_header (стойността на header-а се връща като име).
+    """
+
+    def __init__(self, signatures: List[dict]):
+        self.signatures = signatures
+
+        html_literals: Dict[str, List[int]] = {}
+        html_i_literals: Dict[str, List[int]] = {}
+        script_literals: Dict[str, List[int]] = {}
+        meta_literals: Dict[str, Dict[str, List[int]]] = {}
+        self._header_rules: Dict[str, List[tuple]] = {}
+        self._versions: Dict[int, List[tuple]] = {}
+        self._extracts: Dict[int, re.Pattern] = {}
+
+        for index, signature in enumerate(signatures):
+            for literal in signature.get('html', []):
+                html_literals.setdefault(literal, []).append(index)
+            for literal in signature.get('html_i', []):
+                html_i_literals.setdefault(literal.lower(), []).append(index)
+            for literal in signature.get('script_src', []):
+                script_literals.setdefault(literal.lower(), []).append(index)
+            for meta_name, literals in signature.get('meta', {}).items():
+                bucket = meta_literals.setdefault(meta_name, {})
+                for literal in literals:
+                    bucket.setdefault(literal.lower(), []).append(index)
+            for header, value in signature.get('headers', {}).items():
+                self._header_rules.setdefault(header.lower(), []).append((value.lower(), index))
+            for rule in signature.get('version', []):
+                self._versions.setdefault(index, []).append(
+                    (rule['source'], re.compile(rule['regex'], re.I))
+                )
+            if signature.get('extract'):
+                self._extracts[index] = re.compile(signature['extract'])
+
+        self._html = (LiteralMatcher(html_literals), html_literals)
+        self._html_i = (LiteralMatcher(html_i_literals), html_i_literals)
+        self._script = (LiteralMatcher(script_literals), script_literals)
+        self._meta = {
+            name: (LiteralMatcher(literals), literals) for name, literals in meta_literals.items()
+        }
+
+    @classmethod
+    def from_file(cls, path: str) -> 'FingerprintEngine':
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def match(self, doc: ParsedDocument, headers: Dict) -> List[dict]:
+        """
+        Сканира документа и headers веднъж и връща всички открити технологии
+        (name, category, version) в реда на сигнатурите.
+        """
+        headers_lower = {str(k).lower(): str(v) for k, v in (headers or {}).items()}
+        script_srcs = [tag.get('src', '').lower() for tag in doc.find_all('script', {'src': True})]
+
+        hits: Set[int] = set()
+        hits.update(self._scan(self._html, doc.html))
+        hits.update(self._scan(self._html_i, doc.lower))
+        hits.update(self._scan(self._script, '\n'.join(script_srcs)))
+        for meta_name, matcher in self._meta.items():
+            contents = self._meta_contents(doc, meta_name)
+            hits.update(self._scan(matcher, '\n'.join(contents)))
+        for header, rules in self._header_rules.items():
+            if header not in headers_lower:
+                continue
+            value = headers_lower[header].lower()
+            hits.update(index for expected, index in rules if expected in value)
+
+        results = []
+        for index in sorted(hits):
+            signature = self.signatures[index]
+            category = signature.get('category')
+
+            if index in self._extracts:
+                for name in dict.fromkeys(self._extracts[index].findall(doc.html)):
+                    results.append({'name': name, 'category': category, 'version': None})
+                continue
+
+            name = signature['name']
+            if signature.get('report_header'):
+                name = headers_lower.get(signature['report_header'].lower(), name)
+
+            version = self._detect_version(index, doc, headers_lower, script_srcs)
+            results.append({'name': name, 'category': category, 'version': version})
+
+        return results
+
+    @staticmethod
+    def _scan(compiled: tuple, text: str) -> Set[int]:
+        matcher, literal_map = compiled
+        indexes: Set[int] = set()
+        for literal in matcher.scan(text):
+            indexes.update(literal_map[literal])
+        return indexes
+
+    @staticmethod
+    def _meta_contents(doc: ParsedDocument, meta_name: str) -> List[str]:
+        return [tag.get('content', '').lower() for tag in doc.find_all('meta', {'name': meta_name})]
+
+    def _detect_version(self, index: int, doc: ParsedDocument, headers_lower: Dict,
+                        script_srcs: List[str]) -> Optional[str]:
+        """Прилага version regex-ите само за вече откритите технологии."""
+        for source, pattern in self._versions.get(index, []):
+            if source == 'html':
+                candidates = [doc.lower]
+            elif source == 'script_src':
+                candidates = script_srcs
+            elif source.startswith('meta:'):
+                candidates = self._meta_contents(doc, source[len('meta:'):])
+            elif source.startswith('header:'):
+                candidates = [headers_lower.get(source[len('header:'):].lower(), '').lower()]
+            else:
+                continue
+            for candidate in candidates:
+                match = pattern.search(candidate)
+                if match:
+                    return match.group(1)
+        return None
+
+
+_default_engine: Optional[FingerprintEngine] = None
+
+
+def get_default_engine() -> FingerprintEngine:
+    """Връща engine-а за вградената база сигнатури (компилира се веднъж на процес)."""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = FingerprintEngine.from_file(DEFAULT_SIGNATURES_PATH)
+    return _default_engine
@@ -0,0 +1,194 @@
+import asyncio
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Optional
+
+from app.config import Settings, settings as default_settings
+from app.services.document import ParsedDocument
+from app.services.fingerprints import get_default_engine
+from app.services.metadata_parser import MetadataParser
+from app.services.metrics import Timings, stage
+from app.services.seo_parser import SEOParser
+from app.services.technology_detector import TechnologyDetector
+
+
+def analyze_html(html: str, headers: Dict[str, str], url: str, final_url: str,
+                 timings: Optional[Timings] = None, link_limit: int = 0,
+                 image_limit: int = 0) -> Dict[str, Any]:
+    """
+    CPU стъпката на анализа: парсва HTML веднъж и изчислява секциите
+    technology_detection, on_page_seo и metadata_and_structured_data.
+    С link_limit > 0 връща и links_to_check - линковете за проверка, а с
+    image_limit > 0 - images_to_audit.
+    """
+    # HTML се парсва само веднъж и документът се споделя от анализаторите
+    with stage(timings, 'parse'):
+        document = ParsedDocument(html)
+    with stage(timings, 'technology'):
+        technology_data = TechnologyDetector().detect(document, headers, url)
+    with stage(timings, 'seo'):
+        seo_data = SEOParser().parse(document, final_url)
+    with stage(timings, 'metadata'):
+        metadata_data = MetadataParser().parse(document)
+    result = {
+        'technology_detection': technology_data,
+        'on_page_seo': seo_data,
+        'metadata_and_structured_data': metadata_data,
+    }
+    if link_limit > 0:
+        urls, limit_reached = SEOParser().link_urls(document, final_url, link_limit)
+        result['links_to_check'] = {'urls': urls, 'limit_reached': limit_reached}
+    if image_limit > 0:
+        urls, limit_reached = SEOParser().image_urls(document, final_url, image_limit)
+        result['images_to_audit'] = {'urls': urls, 'limit_reached': limit_reached}
+    return result
+
+
+def _warm_worker():
+    """Initializer на worker процесите - компилира сигнатурите и загрява парсерите."""
+    get_default_engine()
+    analyze_html(
+        '<html lang="en"><head><title>warm-up</title></head><body><a href="/">x</a></body></html>',
+        {}, 'http://localhost/', 'http://localhost/'
+    )
+
+
+def _ping() -> bool:
+    return True
+
+
+def _run_in_worker(html: str, headers: Dict[str, str], url: str, final_url: str,
+                   link_limit: int = 0, image_limit: int = 0):
+    # Метриките се отчитат в родителския процес (merge), тук само се мери
+    timings = Timings(observe=False)
+    started = time.perf_counter()
+    result = analyze_html(html, headers, url, final_url, timings, link_limit, image_limit)
+    return result, time.perf_counter() - started, timings.durations
+
+
+class PoolSaturated(Exception):
+    """Опашката на pool-а е пълна; retry_after е препоръчителното изчакване в секунди."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'HTML анализът е претоварен, опитайте отново след {retry_after} s')
+        self.retry_after = retry_after
+
+
+class HTMLAnalysisPool:
+    """
+    Process pool за CPU стъпката на анализа (lxml/BeautifulSoup).
+
+    Работата се изпълнява извън event loop-а, така че голяма страница не
+    блокира останалите заявки на uvicorn worker-а. Едновременно приетите
+    задачи са най-много workers + max_queue; при пълна опашка run() хвърля
+    PoolSaturated (или чака, ако wait=True - за batch и crawl).
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 32):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.capacity = self.workers + self.max_queue
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._executor = self._create_executor()
+        self._started_at = time.monotonic()
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.busy_seconds = 0.0
+        self.avg_seconds = 0.0
+
+    @classmethod
+    def from_settings(cls, config: Optional[Settings] = None) -> Optional['HTMLAnalysisPool']:
+        config = config or default_settings
+        if config.html_pool_workers <= 0:
+            return None
+        return cls(workers=config.html_pool_workers, max_queue=config.html_pool_max_queue)
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # spawn - worker-ите не наследяват нишките и event loop-а на сървъра
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_warm_worker
+        )
+
+    async def warm_up(self):
+        """Стартира всички worker-и предварително (initializer-ът загрява парсерите)."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _ping) for _ in range(self.workers)
+        ))
+
+    async def run(self, html: str, headers: Dict[str, str], url: str, final_url: str,
+                  wait: bool = False, timings: Optional[Timings] = None,
+                  link_limit: int = 0, image_limit: int = 0) -> Dict[str, Any]:
+        """Изпълнява analyze_html в pool-а."""
+        submitted_at = time.perf_counter()
+        if not wait and self.saturated:
+            self.rejected += 1
+            raise PoolSaturated(self.retry_after())
+
+        async with self._slots:
+            self.in_flight += 1
+            self.submitted += 1
+            executor = self._executor
+            try:
+                loop = asyncio.get_running_loop()
+                result, elapsed, durations = await loop.run_in_executor(
+                    executor, _run_in_worker, html, dict(headers), url, final_url, link_limit, image_limit
+                )
+            except BrokenProcessPool:
+                # Worker е умрял (напр. OOM) - pool-ът се създава наново за следващите задачи
+                self.failed += 1
+                if executor is self._executor:
+                    self._executor = self._create_executor()
+                    executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+        if timings is not None:
+            # Чакане в опашката + сериализация към/от worker-а
+            timings.record('html_pool_wait', max(0.0, time.perf_counter() - submitted_at - elapsed))
+            timings.merge(durations)
+
+        self.completed += 1
+        self.busy_seconds += elapsed
+        # Експоненциално плъзгащо се средно за оценката на Retry-After
+        self.avg_seconds = elapsed if self.completed == 1 else 0.8 * self.avg_seconds + 0.2 * elapsed
+        return result
+
+    @property
+    def saturated(self) -> bool:
+        return self._slots.locked()
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_seconds * self.in_flight / self.workers))
+
+    def stats(self) -> dict:
+        uptime = max(1e-9, time.monotonic() - self._started_at)
+        return {
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'queue_depth': max(0, self.in_flight - self.workers),
+            'busy_workers': min(self.in_flight, self.workers),
+            'utilization': round(min(self.in_flight, self.workers) / self.workers, 3),
+            'utilization_avg': round(min(1.0, self.busy_seconds / (self.workers * uptime)), 3),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'avg_task_ms': round(self.avg_seconds * 1000, 2),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,132 @@
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.config import Settings, settings as default_settings
+from app.services.limits import KeyedLimiter
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:  # pragma: no cover - HTTP/2 е по избор
+    HTTP2_AVAILABLE = False
+
+
+class HTTPClientPool:
+    """
+    Споделен за приложението httpx клиент с connection pool.
+
+    Връзките (TCP/TLS) се преизползват между анализите, броят едновременни
+    заявки към един host е ограничен (за всеки redirect hop), а stats()
+    връща статистика за pool-а.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20,
+                 keepalive_expiry: float = 30.0, timeout: float = 30.0,
+                 http2: bool = True, per_host_limit: int = 4,
+                 user_agent: str = 'Mozilla/5.0'):
+        self.per_host_limit = max(1, per_host_limit)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.client = httpx.AsyncClient(
+            follow_redirects=True,
+            timeout=timeout,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            headers={'User-Agent': user_agent},
+        )
+        self._hosts = KeyedLimiter(self.per_host_limit)
+        self.requests_total = 0
+        self.requests_sent = 0
+        self.connections_created = 0
+
+    @classmethod
+    def from_settings(cls, config: Optional[Settings] = None) -> 'HTTPClientPool':
+        config = config or default_settings
+        return cls(
+            max_connections=config.http_max_connections,
+            max_keepalive=config.http_max_keepalive,
+            keepalive_expiry=config.http_keepalive_expiry,
+            timeout=config.http_timeout,
+            http2=config.http2,
+            per_host_limit=config.http_per_host_limit,
+            user_agent=config.user_agent,
+        )
+
+    def host_slot(self, host: str):
+        """Ограничава едновременните заявки към един host (без порт, малки букви)."""
+        return self._hosts.slot(host.lower())
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        async with self.stream(method, url, **kwargs) as response:
+            await response.aread()
+        return response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, limit_host: bool = True,
+                     follow_redirects: bool = True, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Като httpx stream(), но redirect-ите се следват тук - лимитът за host
+        важи за всеки hop, включително към други host-ове.
+        limit_host=False - извикващият прилага собствен лимит.
+        """
+        request = self.client.build_request(method, url, extensions=self._extensions(kwargs), **kwargs)
+        history = []
+        while True:
+            async with self.host_slot(request.url.host) if limit_host else nullcontext():
+                self.requests_total += 1
+                response = await self.client.send(request, stream=True, follow_redirects=False)
+                try:
+                    response.history = list(history)
+                    next_request = response.next_request if follow_redirects else None
+                    if next_request is None:
+                        yield response
+                        return
+                    await response.aread()
+                finally:
+                    await response.aclose()
+            history.append(response)
+            if len(history) > self.client.max_redirects:
+                raise httpx.TooManyRedirects('Exceeded maximum allowed redirects.', request=next_request)
+            request = next_request
+
+    def stats(self) -> dict:
+        """
+        Статистика по trace събитията на httpcore и лимита за host: създадени
+        връзки и изпратени заявки (при HTTP/2 - потоци), заявки в ход и чакащи.
+        """
+        return {
+            'http2_enabled': self.http2,
+            'per_host_limit': self.per_host_limit,
+            'connections_created': self.connections_created,
+            'requests_total': self.requests_total,
+            'requests_sent': self.requests_sent,
+            'requests_in_flight': self._hosts.active,
+            'requests_waiting_for_host': self._hosts.waiting,
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    def _extensions(self, kwargs: dict) -> dict:
+        """Добавя httpcore trace callback, който брои новите връзки и изпратените заявки."""
+        extensions = dict(kwargs.pop('extensions', None) or {})
+        user_trace = extensions.get('trace')
+
+        async def trace(event_name: str, info: dict):
+            if event_name == 'connection.connect_tcp.started':
+                self.connections_created += 1
+            elif event_name.endswith('send_request_headers.started'):
+                self.requests_sent += 1
+            if user_trace is not None:
+                await user_trace(event_name, info)
+
+        extensions['trace'] = trace
+        return extensions
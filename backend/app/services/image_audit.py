@@ -0,0 +1,320 @@
+import asyncio
+import struct
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+from app.config import Settings, settings as default_settings
+from app.services.http_client import HTTPClientPool
+from app.services.limits import KeyedLimiter
+from app.services.metrics import REGISTRY
+from app.services.ttl_cache import MISSING, TTLCache
+
+
+IMAGE_FETCHES = REGISTRY.counter(
+    'seoapp_image_audit_total', 'Одитирани изображения по резултат (cache = от кеша)', ('result',)
+)
+
+# Стандартни маркери SOF на JPEG (без DHT, JPG и DAC)
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Маркери без дължина
+JPEG_STANDALONE_MARKERS = frozenset(range(0xD0, 0xDA)) | {0x01}
+LEGACY_FORMATS = ('jpeg', 'png', 'gif')
+LOSSY_FORMATS = ('jpeg', 'webp')
+
+
+class NeedMoreData(Exception):
+    """Заглавието на изображението не се побира в прочетените байтове."""
+
+
+def image_info(data: bytes) -> Optional[Tuple[str, Optional[int], Optional[int]]]:
+    """
+    (формат, ширина, височина) от първите байтове на файла или None за
+    непознат формат. Хвърля NeedMoreData, ако заглавието е отрязано.
+    """
+    try:
+        if data.startswith(b'\x89PNG\r\n\x1a\n'):
+            if len(data) < 24:
+                raise NeedMoreData()
+            width, height = struct.unpack('>II', data[16:24])
+            return 'png', width, height
+
+        if data[:6] in (b'GIF87a', b'GIF89a'):
+            if len(data) < 10:
+                raise NeedMoreData()
+            width, height = struct.unpack('<HH', data[6:10])
+            return 'gif', width, height
+
+        if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+            return _webp_info(data)
+
+        if data[:2] == b'\xff\xd8':
+            return _jpeg_info(data)
+
+        if data[4:8] == b'ftyp' and data[8:12] in (b'avif', b'avis'):
+            box = data.find(b'ispe')
+            if box < 0 or len(data) < box + 16:
+                raise NeedMoreData()
+            width, height = struct.unpack('>II', data[box + 8:box + 16])
+            return 'avif', width, height
+
+        head = data[:256].lstrip().lower()
+        if head.startswith(b'<svg') or (head.startswith(b'<?xml') and b'<svg' in head):
+            return 'svg', None, None
+    except struct.error:
+        raise NeedMoreData()
+    return None
+
+
+def _webp_info(data: bytes) -> Tuple[str, int, int]:
+    if len(data) < 30:
+        raise NeedMoreData()
+    chunk = data[12:16]
+    if chunk == b'VP8 ':
+        width, height = struct.unpack('<HH', data[26:30])
+        return 'webp', width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        b0, b1, b2, b3 = data[21:25]
+        width = 1 + (((b1 & 0x3F) << 8) | b0)
+        height = 1 + (((b3 & 0x0F) << 10) | (b2 << 2) | ((b1 & 0xC0) >> 6))
+        return 'webp', width, height
+    if chunk == b'VP8X':
+        width = 1 + int.from_bytes(data[24:27], 'little')
+        height = 1 + int.from_bytes(data[27:30], 'little')
+        return 'webp', width, height
+    return 'webp', None, None
+
+
+def _jpeg_info(data: bytes) -> Tuple[str, int, int]:
+    """Обхожда сегментите до първия SOF маркер (EXIF/ICC блоковете се прескачат)."""
+    position = 2
+    while True:
+        while position < len(data) and data[position] != 0xFF:
+            position += 1
+        while position < len(data) and data[position] == 0xFF:
+            position += 1
+        if position >= len(data):
+            raise NeedMoreData()
+        marker = data[position]
+        position += 1
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if len(data) < position + 7:
+            raise NeedMoreData()
+        length = struct.unpack('>H', data[position:position + 2])[0]
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', data[position + 3:position + 7])
+            return 'jpeg', width, height
+        position += length
+
+
+def _total_size(response: httpx.Response) -> Optional[int]:
+    """Пълният размер от Content-Range (206) или Content-Length (200)."""
+    if response.status_code == 206:
+        content_range = response.headers.get('content-range', '')
+        total = content_range.rpartition('/')[2]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get('content-length', '')
+    return int(length) if length.isdigit() else None
+
+
+class ImageAuditor:
+    """
+    Размер, размери и формат на изображенията без да се свалят целите файлове.
+
+    Чете се само началото на файла (Range: bytes=0-N) - достатъчно за
+    заглавията на JPEG, PNG, GIF, WebP и AVIF; размерът идва от
+    Content-Range/Content-Length. Изображенията на една страница се проверяват
+    паралелно (до per_host едновременно към host, отделно от общия лимит на
+    HTTPClientPool - CDN-ите понасят много паралелни заявки, особено по
+    HTTP/2), така че одитът отнема колкото един round trip. Резултатите се
+    кешират в общ за процеса TTL кеш, а едновременните заявки за един URL се
+    обединяват.
+    """
+
+    def __init__(self, http_pool: HTTPClientPool, cache: Optional[TTLCache] = None,
+                 concurrency: int = 50, per_host: int = 16, timeout: float = 10.0,
+                 ttl: float = 24 * 3600, error_ttl: float = 300,
+                 header_bytes: int = 16 * 1024, max_header_bytes: int = 256 * 1024,
+                 max_bytes: int = 300 * 1024, max_dimension: int = 2560,
+                 legacy_format_bytes: int = 100 * 1024, max_bits_per_pixel: float = 4.0):
+        self.http = http_pool
+        self.cache = cache if cache is not None else get_image_cache()
+        self.timeout = timeout
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.header_bytes = header_bytes
+        self.max_header_bytes = max(header_bytes, max_header_bytes)
+        self.max_bytes = max_bytes
+        self.max_dimension = max_dimension
+        self.legacy_format_bytes = legacy_format_bytes
+        self.max_bits_per_pixel = max_bits_per_pixel
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._hosts = KeyedLimiter(per_host)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.requests_sent = 0
+        self.bytes_read = 0
+
+    @classmethod
+    def from_settings(cls, http_pool: HTTPClientPool, config: Optional[Settings] = None) -> 'ImageAuditor':
+        config = config or default_settings
+        return cls(
+            http_pool,
+            concurrency=config.image_audit_concurrency,
+            per_host=config.image_audit_per_host,
+            timeout=config.image_audit_timeout,
+            ttl=config.image_audit_ttl,
+            error_ttl=config.image_audit_error_ttl,
+            max_bytes=config.image_audit_max_bytes,
+            max_dimension=config.image_audit_max_dimension,
+        )
+
+    async def audit(self, url: str) -> dict:
+        """
+        Връща {url, status, format, width, height, bytes, flags, error, cached}
+        за едно изображение.
+        """
+        cached = self.cache.get(url)
+        if cached is not MISSING:
+            IMAGE_FETCHES.inc(result='cache')
+            return dict(cached, cached=True)
+
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            return dict(await asyncio.shield(inflight), cached=True)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            async with self._slots:
+                result = await self._audit(url)
+            failed = result['error'] is not None
+            self.cache.set(url, result, self.error_ttl if failed else self.ttl)
+            IMAGE_FETCHES.inc(result='error' if failed else 'flagged' if result['flags'] else 'ok')
+            future.set_result(result)
+        finally:
+            if not future.done():
+                future.set_result(self._empty(url, error='Заявката беше прекъсната'))
+            self._inflight.pop(url, None)
+        return dict(result, cached=False)
+
+    async def audit_many(self, urls: Iterable[str]) -> List[dict]:
+        unique = list(dict.fromkeys(urls))
+        return list(await asyncio.gather(*(self.audit(url) for url in unique)))
+
+    async def _audit(self, url: str) -> dict:
+        result = self._empty(url)
+        try:
+            async with self._hosts.slot(httpx.URL(url).host):
+                response, data = await self._read_head(url, self.header_bytes)
+                try:
+                    info = image_info(data)
+                except NeedMoreData:
+                    # Напр. JPEG с голям EXIF блок преди SOF - още един (по-дълъг) Range
+                    info = None
+                    if len(data) >= self.header_bytes and self.max_header_bytes > self.header_bytes:
+                        response, data = await self._read_head(url, self.max_header_bytes)
+                        try:
+                            info = image_info(data)
+                        except NeedMoreData:
+                            pass
+        except (httpx.HTTPError, httpx.InvalidURL, OSError) as e:
+            result['error'] = str(e) or type(e).__name__
+            return result
+
+        result['status'] = response.status_code
+        if response.status_code >= 400:
+            result['error'] = f'HTTP {response.status_code}'
+            return result
+
+        result['bytes'] = _total_size(response)
+        if info is not None:
+            result['format'], result['width'], result['height'] = info
+        else:
+            content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+            if content_type.startswith('image/'):
+                result['format'] = content_type[len('image/'):].replace('svg+xml', 'svg')
+        result['flags'] = self._flags(result)
+        return result
+
+    async def _read_head(self, url: str, size: int) -> Tuple[httpx.Response, bytes]:
+        """Първите size байта; ако сървърът игнорира Range, останалото не се чете."""
+        self.requests_sent += 1
+        chunks = []
+        received = 0
+        async with self.http.stream('GET', url, limit_host=False, timeout=self.timeout,
+                                    headers={'Range': f'bytes=0-{size - 1}'}) as response:
+            if response.status_code < 400:
+                async for chunk in response.aiter_bytes():
+                    chunks.append(chunk)
+                    received += len(chunk)
+                    if received >= size:
+                        break
+        self.bytes_read += received
+        return response, b''.join(chunks)[:size]
+
+    def _flags(self, result: dict) -> List[str]:
+        flags = []
+        size, width, height, image_format = result['bytes'], result['width'], result['height'], result['format']
+        if size is not None and size > self.max_bytes:
+            flags.append('oversized')
+        if width and height and max(width, height) > self.max_dimension:
+            flags.append('large_dimensions')
+        if size is not None and image_format in LEGACY_FORMATS and size > self.legacy_format_bytes:
+            # WebP/AVIF биха били по-малки
+            flags.append('legacy_format')
+        if size and width and height and image_format in LOSSY_FORMATS:
+            if size * 8 / (width * height) > self.max_bits_per_pixel:
+                flags.append('poorly_compressed')
+        return flags
+
+    @staticmethod
+    def _empty(url: str, error: Optional[str] = None) -> dict:
+        return {
+            'url': url, 'status': None, 'format': None, 'width': None, 'height': None,
+            'bytes': None, 'flags': [], 'error': error,
+        }
+
+    def stats(self) -> dict:
+        return {
+            'cache_entries': len(self.cache),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'requests_sent': self.requests_sent,
+            'bytes_read': self.bytes_read,
+            'inflight': len(self._inflight),
+        }
+
+
+def summarize(results: List[dict], limit_reached: bool = False) -> dict:
+    """Обобщение на одита за секцията image_audit."""
+    formats: Dict[str, int] = {}
+    flagged: Dict[str, int] = {}
+    for result in results:
+        if result['format']:
+            formats[result['format']] = formats.get(result['format'], 0) + 1
+        for flag in result['flags']:
+            flagged[flag] = flagged.get(flag, 0) + 1
+
+    return {
+        'audited': len(results),
+        'total_bytes': sum(result['bytes'] or 0 for result in results),
+        'unknown_size': sum(1 for result in results if result['bytes'] is None and not result['error']),
+        'errors': sum(1 for result in results if result['error']),
+        'from_cache': sum(1 for result in results if result.get('cached')),
+        'limit_reached': limit_reached,
+        'formats': formats,
+        'flagged': flagged,
+        'images': results,
+    }
+
+
+_image_cache: Optional[TTLCache] = None
+
+
+def get_image_cache() -> TTLCache:
+    """Споделеният за процеса кеш URL на изображение -> резултат от одита."""
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = TTLCache(max_entries=default_settings.image_audit_cache_size)
+    return _image_cache
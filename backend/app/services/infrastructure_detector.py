@@ -1,39 +1,48 @@
-import socket
 from urllib.parse import urlparse
 from typing import Dict, Optional
+from app.services.dns_resolver import AsyncResolver, get_resolver
+from app.services.ipdb import IPDatabase, get_ipdb
 import re
 
 
 class InfrastructureDetector:
     """Открива инфраструктурни данни - hosting provider, server location и т.н."""
     
-    def detect(self, domain: str, ip_address: Optional[str], headers: Dict) -> dict:
+    def __init__(self, resolver: Optional[AsyncResolver] = None, ipdb: Optional[IPDatabase] = None):
+        self.resolver = resolver or get_resolver()
+        self.ipdb = ipdb or get_ipdb()
+    
+    async def detect(self, domain: str, ip_address: Optional[str], headers: Dict) -> dict:
         """
         Открива hosting provider и server location от IP и headers.
         """
         result = {
             'hosting_provider': None,
-            'server_location_country': None
+            'server_location_country': None,
+            'asn': None,
+            'as_organization': None
         }
         
-        if ip_address:
+        if ip_address and self.ipdb:
+            # Офлайн IP база - държава, ASN и cloud/CDN провайдер без мрежова заявка
+            record = self.ipdb.lookup(ip_address)
+            if record:
+                result['server_location_country'] = record['country']
+                result['asn'] = record['asn']
+                result['as_organization'] = record['as_organization']
+                result['hosting_provider'] = record['provider'] or record['as_organization']
+        
+        if ip_address and not result['hosting_provider']:
             # Опитваме се да открием hosting provider от hostname
-            hostname = self._get_hostname(ip_address)
+            hostname = await self._get_hostname(ip_address)
             if hostname:
                 result['hosting_provider'] = self._detect_hosting_from_hostname(hostname)
         
-        # Server location - за MVP не можем да го определим без GeoIP база
-        # Оставяме празно
-        
         return result
     
-    def _get_hostname(self, ip_address: str) -> Optional[str]:
-        """Взима hostname от IP."""
-        try:
-            hostname = socket.gethostbyaddr(ip_address)[0]
-            return hostname
-        except:
-            return None
+    async def _get_hostname(self, ip_address: str) -> Optional[str]:
+        """Взима hostname от IP (PTR заявка през споделения resolver)."""
+        return await self.resolver.reverse(ip_address)
     
     def _detect_hosting_from_hostname(self, hostname: str) -> Optional[str]:
         """Открива hosting provider от hostname."""
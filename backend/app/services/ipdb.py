@@ -0,0 +1,163 @@
+import ipaddress
+import mmap
+import struct
+from typing import List, Optional
+
+from app.config import settings
+
+
+MAGIC = b'SEOIPDB1'
+
+# magic, брой IPv4 записи, брой IPv6 записи, брой низове,
+# offset на IPv4 записите, offset на IPv6 записите, offset на таблицата с низове
+HEADER = struct.Struct('<8sIIIQQQ')
+
+# След началото и края на диапазона (big-endian, 4 или 16 байта):
+# ISO код на държава, ASN, индекс на AS организацията, индекс на провайдера
+RECORD_TAIL = struct.Struct('<2sIII')
+
+STRING_OFFSET = struct.Struct('<I')
+
+
+def record_size(width: int) -> int:
+    return width * 2 + RECORD_TAIL.size
+
+
+class IPDatabase:
+    """
+    Memory-mapped база с IP диапазони (държава, ASN, hosting/cloud провайдер).
+
+    Файлът се генерира с ipdb_builder и съдържа сортирани, неприпокриващи се
+    диапазони, така че търсенето е двоично търсене директно върху mmap-а - без
+    зареждане в паметта и споделено между worker процесите през page cache-а.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f'Празен IP database файл: {path}')
+
+        magic, v4_count, v6_count, strings_count, v4_offset, v6_offset, strings_offset = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'Невалиден IP database файл: {path}')
+
+        self._tables = {
+            4: (v4_offset, v4_count, 4),
+            6: (v6_offset, v6_count, 16),
+        }
+        self._strings_offset = strings_offset
+        self.strings_count = strings_count
+        self.v4_ranges = v4_count
+        self.v6_ranges = v6_count
+
+    def lookup(self, ip: str) -> Optional[dict]:
+        """Връща данните за IP адреса или None, ако не попада в нито един диапазон."""
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+
+        offset, count, width = self._tables[address.version]
+        key = address.packed
+        size = record_size(width)
+        mm = self._mm
+
+        # Последният диапазон с начало <= key
+        low, high = 0, count
+        while low < high:
+            mid = (low + high) // 2
+            start = offset + mid * size
+            if mm[start:start + width] <= key:
+                low = mid + 1
+            else:
+                high = mid
+        if low == 0:
+            return None
+
+        position = offset + (low - 1) * size
+        end = mm[position + width:position + 2 * width]
+        if key > end:
+            return None
+
+        country, asn, org_index, provider_index = RECORD_TAIL.unpack_from(mm, position + 2 * width)
+        return {
+            'country': country.decode('ascii').strip('\x00') or None,
+            'asn': asn or None,
+            'as_organization': self._string(org_index),
+            'provider': self._string(provider_index),
+            'range_start': str(ipaddress.ip_address(mm[position:position + width])),
+            'range_end': str(ipaddress.ip_address(end)),
+        }
+
+    def _string(self, index: int) -> Optional[str]:
+        if not index or index >= self.strings_count:
+            return None
+        table = self._strings_offset
+        start, end = struct.unpack_from('<II', self._mm, table + index * STRING_OFFSET.size)
+        blob = table + (self.strings_count + 1) * STRING_OFFSET.size
+        return self._mm[blob + start:blob + end].decode('utf-8')
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+    def stats(self) -> dict:
+        return {
+            'path': self.path,
+            'ipv4_ranges': self.v4_ranges,
+            'ipv6_ranges': self.v6_ranges,
+            'strings': self.strings_count,
+        }
+
+
+def write_database(path: str, v4_records: List[tuple], v6_records: List[tuple], strings: List[str]):
+    """
+    Записва базата. Записите са (start, end, country, asn, org_index, provider_index)
+    със start/end като int, сортирани и без припокриване; strings[0] трябва да е ''.
+    """
+    encoded = [value.encode('utf-8') for value in strings]
+    string_offsets = [0]
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    v4_offset = HEADER.size
+    v6_offset = v4_offset + len(v4_records) * record_size(4)
+    strings_offset = v6_offset + len(v6_records) * record_size(16)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(v4_records), len(v6_records), len(strings),
+                            v4_offset, v6_offset, strings_offset))
+        for width, records in ((4, v4_records), (16, v6_records)):
+            for start, end, country, asn, org_index, provider_index in records:
+                f.write(start.to_bytes(width, 'big'))
+                f.write(end.to_bytes(width, 'big'))
+                f.write(RECORD_TAIL.pack((country or '').encode('ascii')[:2], asn or 0,
+                                         org_index, provider_index))
+        for offset in string_offsets:
+            f.write(STRING_OFFSET.pack(offset))
+        for value in encoded:
+            f.write(value)
+
+
+_default_database: Optional[IPDatabase] = None
+_default_loaded = False
+
+
+def get_ipdb() -> Optional[IPDatabase]:
+    """Споделената IP база от SEOAPP_IPDB_PATH (None, ако не е конфигурирана)."""
+    global _default_database, _default_loaded
+    if not _default_loaded:
+        _default_loaded = True
+        if settings.ipdb_path:
+            _default_database = IPDatabase(settings.ipdb_path)
+    return _default_database
@@ -0,0 +1,311 @@
+"""
+Компилира локални IP набори от данни в бинарния файл на IPDatabase.
+
+Поддържани входове:
+    --geoip      GeoIP CSV: MaxMind GeoLite2 Country Blocks (network, geoname_id, ...)
+                 заедно с --geoip-locations, или диапазони "start,end,country"
+                 (DB-IP / IP2Location lite)
+    --asn        ASN таблица: GeoLite2 ASN Blocks CSV (network,
+                 autonomous_system_number, autonomous_system_organization)
+                 или iptoasn TSV (start, end, ASN, country, описание)
+    --cloud      "Име=път" към публикуваните CIDR списъци на cloud/CDN
+                 доставчиците (AWS ip-ranges.json, GCP cloud.json, Azure
+                 ServiceTags, Cloudflare ips-v4 и т.н.); от JSON се взимат
+                 всички стойности, които са валидни мрежи
+
+Припокриващите се диапазони се "изравняват": по-специфичният диапазон печели
+в рамките на един набор, а трите набора се комбинират поле по поле.
+
+Стартиране (от директорията backend):
+    python -m app.services.ipdb_builder build --out ipdb.bin --geoip blocks.csv \\
+        --geoip-locations locations.csv --asn asn.csv --cloud "Amazon AWS=ip-ranges.json"
+    python -m app.services.ipdb_builder lookup --db ipdb.bin 8.8.8.8
+"""
+import argparse
+import csv
+import heapq
+import ipaddress
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.services.ipdb import IPDatabase, write_database
+
+
+# (start, end, стойност) за едно семейство адреси
+Range = Tuple[int, int, tuple]
+
+
+def _network_range(value: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        network = ipaddress.ip_network(value.strip(), strict=False)
+    except ValueError:
+        return None
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def _address_range(start: str, end: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        first = ipaddress.ip_address(start.strip())
+        last = ipaddress.ip_address(end.strip())
+    except ValueError:
+        return None
+    if first.version != last.version or int(last) < int(first):
+        return None
+    return first.version, int(first), int(last)
+
+
+def read_geoip(path: str, locations_path: Optional[str] = None) -> Iterator[Tuple[int, int, int, tuple]]:
+    """(версия, start, end, (country,)) от GeoIP CSV."""
+    locations: Dict[str, str] = {}
+    if locations_path:
+        with open(locations_path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                locations[row.get('geoname_id', '')] = (row.get('country_iso_code') or '').upper()
+
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        first_row = next(reader, None)
+        if first_row is None:
+            return
+        if 'network' in first_row:
+            columns = {name: index for index, name in enumerate(first_row)}
+            for row in reader:
+                span = _network_range(row[columns['network']])
+                if span is None:
+                    continue
+                country = ''
+                for column in ('country_iso_code', 'country_code'):
+                    if column in columns and row[columns[column]]:
+                        country = row[columns[column]].upper()
+                        break
+                if not country:
+                    for column in ('geoname_id', 'registered_country_geoname_id'):
+                        if column in columns and row[columns[column]] in locations:
+                            country = locations[row[columns[column]]]
+                            break
+                if country:
+                    yield (*span, (country,))
+        else:
+            rows = [first_row] if len(first_row) >= 2 and _address_range(first_row[0], first_row[1]) else []
+            for row in _chain(rows, reader):
+                if len(row) < 3:
+                    continue
+                span = _address_range(row[0], row[1])
+                country = row[2].strip().upper()
+                if span and len(country) == 2:
+                    yield (*span, (country,))
+
+
+def read_asn(path: str) -> Iterator[Tuple[int, int, int, tuple]]:
+    """(версия, start, end, (asn, organization)) от ASN CSV/TSV."""
+    with open(path, newline='', encoding='utf-8') as f:
+        sample = f.readline()
+        f.seek(0)
+        if '\t' in sample:
+            for row in csv.reader(f, delimiter='\t'):
+                if len(row) < 3:
+                    continue
+                span = _address_range(row[0], row[1])
+                asn = _parse_asn(row[2])
+                if span and asn:
+                    yield (*span, (asn, row[4].strip() if len(row) > 4 else ''))
+            return
+
+        for row in csv.DictReader(f):
+            span = _network_range(row.get('network', ''))
+            asn = _parse_asn(row.get('autonomous_system_number', ''))
+            if span and asn:
+                yield (*span, (asn, (row.get('autonomous_system_organization') or '').strip()))
+
+
+def _parse_asn(value: str) -> int:
+    value = value.strip().upper()
+    if value.startswith('AS'):
+        value = value[2:]
+    try:
+        return int(value)
+    except ValueError:
+        return 0
+
+
+def read_cloud(path: str, provider: str) -> Iterator[Tuple[int, int, int, tuple]]:
+    """(версия, start, end, (provider,)) от JSON или текстов CIDR списък."""
+    with open(path, encoding='utf-8') as f:
+        content = f.read()
+    try:
+        values = list(_json_strings(json.loads(content)))
+    except ValueError:
+        values = content.split()
+    for value in values:
+        if '/' in value:
+            span = _network_range(value)
+            if span:
+                yield (*span, (provider,))
+
+
+def _json_strings(node) -> Iterator[str]:
+    if isinstance(node, str):
+        yield node
+    elif isinstance(node, dict):
+        for value in node.values():
+            yield from _json_strings(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _json_strings(value)
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+
+def flatten(ranges: List[Range]) -> List[Range]:
+    """
+    Превръща припокриващи се диапазони в сортирани, неприпокриващи се; при
+    припокриване печели по-малкият (по-специфичен) диапазон.
+    """
+    if not ranges:
+        return []
+    ranges = sorted(ranges, key=lambda item: (item[0], -item[1]))
+    points = sorted({start for start, _, _ in ranges} | {end + 1 for _, end, _ in ranges})
+
+    result: List[Range] = []
+    active: list = []  # heap от (размер, пореден номер, end, value)
+    index = 0
+    for point_index, point in enumerate(points[:-1]):
+        while index < len(ranges) and ranges[index][0] == point:
+            start, end, value = ranges[index]
+            heapq.heappush(active, (end - start, index, end, value))
+            index += 1
+        while active and active[0][2] < point:
+            heapq.heappop(active)
+        if active:
+            _append(result, point, points[point_index + 1] - 1, active[0][3])
+    return result
+
+
+def combine(layers: List[List[Range]]) -> List[Range]:
+    """
+    Обединява изравнените слоеве (geo, asn, cloud) в един списък от диапазони,
+    чиято стойност е кортеж с по една стойност (или None) от всеки слой.
+    """
+    points = set()
+    for layer in layers:
+        for start, end, _ in layer:
+            points.add(start)
+            points.add(end + 1)
+    points = sorted(points)
+
+    positions = [0] * len(layers)
+    result: List[Range] = []
+    for point_index, point in enumerate(points[:-1]):
+        segment_end = points[point_index + 1] - 1
+        values = []
+        for layer_index, layer in enumerate(layers):
+            position = positions[layer_index]
+            while position < len(layer) and layer[position][1] < point:
+                position += 1
+            positions[layer_index] = position
+            if position < len(layer) and layer[position][0] <= point:
+                values.append(layer[position][2])
+            else:
+                values.append(None)
+        if any(value is not None for value in values):
+            _append(result, point, segment_end, tuple(values))
+    return result
+
+
+def _append(result: List[Range], start: int, end: int, value):
+    # Съседни диапазони с еднаква стойност се сливат
+    if result and result[-1][1] + 1 == start and result[-1][2] == value:
+        result[-1] = (result[-1][0], end, value)
+    else:
+        result.append((start, end, value))
+
+
+def build(out_path: str, geoip: Optional[str] = None, geoip_locations: Optional[str] = None,
+          asn: Optional[str] = None, clouds: Optional[List[Tuple[str, str]]] = None) -> dict:
+    """Чете входните файлове и записва базата в out_path. Връща статистика."""
+    sources = [
+        read_geoip(geoip, geoip_locations) if geoip else iter(()),
+        read_asn(asn) if asn else iter(()),
+        _chain(*(read_cloud(path, name) for name, path in clouds or [])),
+    ]
+
+    strings = ['']
+    string_index: Dict[str, int] = {'': 0}
+
+    def intern(value: str) -> int:
+        if value not in string_index:
+            string_index[value] = len(strings)
+            strings.append(value)
+        return string_index[value]
+
+    tables = {}
+    stats = {'input_ranges': 0}
+    layers_by_version = {4: [[], [], []], 6: [[], [], []]}
+    for layer_index, source in enumerate(sources):
+        for version, start, end, value in source:
+            layers_by_version[version][layer_index].append((start, end, value))
+            stats['input_ranges'] += 1
+
+    for version in (4, 6):
+        layers = [flatten(layer) for layer in layers_by_version[version]]
+        records = []
+        for start, end, (geo, asn_value, cloud) in combine(layers):
+            country = geo[0] if geo else ''
+            asn_number, organization = asn_value if asn_value else (0, '')
+            provider = cloud[0] if cloud else ''
+            records.append((start, end, country, asn_number, intern(organization), intern(provider)))
+        tables[version] = records
+
+    tmp_path = out_path + '.tmp'
+    write_database(tmp_path, tables[4], tables[6], strings)
+    os.replace(tmp_path, out_path)
+
+    stats.update({
+        'ipv4_ranges': len(tables[4]),
+        'ipv6_ranges': len(tables[6]),
+        'strings': len(strings),
+        'bytes': os.path.getsize(out_path),
+    })
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='компилира базата')
+    build_parser.add_argument('--out', required=True)
+    build_parser.add_argument('--geoip')
+    build_parser.add_argument('--geoip-locations')
+    build_parser.add_argument('--asn')
+    build_parser.add_argument('--cloud', action='append', default=[], metavar='ИМЕ=ПЪТ')
+
+    lookup_parser = commands.add_parser('lookup', help='търси IP адреси в базата')
+    lookup_parser.add_argument('--db', required=True)
+    lookup_parser.add_argument('ips', nargs='+')
+
+    args = parser.parse_args()
+    if args.command == 'build':
+        clouds = []
+        for item in args.cloud:
+            name, separator, path = item.partition('=')
+            if not separator:
+                parser.error(f'--cloud очаква ИМЕ=ПЪТ, получено: {item}')
+            clouds.append((name.strip(), path.strip()))
+        stats = build(args.out, args.geoip, args.geoip_locations, args.asn, clouds)
+        print(json.dumps(stats, indent=2))
+    else:
+        database = IPDatabase(args.db)
+        try:
+            for ip in args.ips:
+                print(ip, json.dumps(database.lookup(ip), ensure_ascii=False))
+        finally:
+            database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from app.config import Settings, settings
+from app.services.metrics import REGISTRY
+
+
+JOBS_FINISHED = REGISTRY.counter(
+    'seoapp_jobs_finished_total', 'Завършени задачи от опашката по вид и статус', ('kind', 'status')
+)
+JOB_DURATION = REGISTRY.histogram(
+    'seoapp_job_duration_seconds', 'Време за изпълнение на задачите от опашката', ('kind',),
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 900.0, 1800.0, 3600.0)
+)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+_JOB_COLUMNS = (
+    'id, kind, tenant, priority, status, params, error, attempts,'
+    ' created_at, started_at, finished_at'
+)
+
+JobHandler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class JobStore:
+    """
+    Задачите и резултатите им в SQLite (WAL) - оцеляват рестарт на процеса.
+
+    Резултатите се пазят компресирани (zlib JSON). Изборът и маркирането на
+    следващата задача стават в една транзакция под lock, така че две
+    worker-а никога не взимат една и съща задача.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE,'
+            ' kind TEXT NOT NULL, tenant TEXT NOT NULL, priority INTEGER NOT NULL,'
+            ' status TEXT NOT NULL, params TEXT NOT NULL, result BLOB, error TEXT,'
+            ' attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL,'
+            ' started_at REAL, finished_at REAL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, tenant, seq)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at)')
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def submit(self, kind: str, params: Dict[str, Any], tenant: str = 'default', priority: int = 0) -> str:
+        job_id = uuid.uuid4().hex
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT INTO jobs (id, kind, tenant, priority, status, params, created_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job_id, kind, tenant, priority, QUEUED, json.dumps(params, default=str), time.time())
+            )
+        return job_id
+
+    def claim(self, exclude_tenants: Optional[List[str]] = None,
+              served: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Маркира като running и връща следващата задача: най-високият
+        приоритет, а в него - tenant-ът, обслужен най-отдавна (served е
+        tenant -> пореден номер на последното обслужване), и неговата
+        най-стара задача. Tenant-ите от exclude_tenants се прескачат.
+        """
+        exclude = list(exclude_tenants or [])
+        served = served or {}
+        placeholders = ','.join('?' * len(exclude))
+        tenant_filter = f' AND tenant NOT IN ({placeholders})' if exclude else ''
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                row = conn.execute(
+                    f'SELECT max(priority) FROM jobs WHERE status = ?{tenant_filter}', (QUEUED, *exclude)
+                ).fetchone()
+                if row[0] is None:
+                    return None
+                priority = row[0]
+                candidates = conn.execute(
+                    f'SELECT tenant, min(seq) FROM jobs WHERE status = ? AND priority = ?{tenant_filter}'
+                    ' GROUP BY tenant', (QUEUED, priority, *exclude)
+                ).fetchall()
+                tenant, seq = min(candidates, key=lambda item: (served.get(item[0], -1), item[1]))
+                conn.execute(
+                    'UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1 WHERE seq = ?',
+                    (RUNNING, time.time(), seq)
+                )
+                job = conn.execute(f'SELECT {_JOB_COLUMNS} FROM jobs WHERE seq = ?', (seq,)).fetchone()
+        return self._row(job)
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        payload = None
+        if result is not None:
+            payload = zlib.compress(json.dumps(result, default=str, ensure_ascii=False).encode('utf-8'))
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?'
+                ' WHERE id = ? AND status = ?',
+                (status, payload, error, time.time(), job_id, RUNNING)
+            )
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Отменя незавършена задача; връща предишния статус (None, ако няма такава задача)."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                row = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is None:
+                    return None
+                if row[0] in (QUEUED, RUNNING):
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, finished_at = ? WHERE id = ?',
+                        (CANCELLED, time.time(), job_id)
+                    )
+        return row[0]
+
+    def recover(self, max_attempts: int) -> Dict[str, int]:
+        """
+        Задачите, прекъснати от спиране на процеса (останали running), се
+        връщат в опашката; тези, които вече са опитвани max_attempts пъти, се
+        маркират като failed.
+        """
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            failed = conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND attempts >= ?',
+                (FAILED, 'Прекъсната при рестарт твърде много пъти', now, RUNNING, max_attempts)
+            ).rowcount
+            requeued = conn.execute(
+                'UPDATE jobs SET status = ?, started_at = NULL WHERE status = ?', (QUEUED, RUNNING)
+            ).rowcount
+        return {'requeued': requeued, 'failed': failed}
+
+    def purge(self, older_than: float) -> int:
+        """Изтрива завършените задачи, по-стари от older_than секунди."""
+        conn = self._connection()
+        with conn:
+            return conn.execute(
+                'DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                (time.time() - older_than,)
+            ).rowcount
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(f'SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def result(self, job_id: str) -> Any:
+        row = self._connection().execute('SELECT result FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def list(self, tenant: Optional[str] = None, status: Optional[str] = None,
+             limit: int = 100) -> List[Dict[str, Any]]:
+        conditions, values = [], []
+        if tenant is not None:
+            conditions.append('tenant = ?')
+            values.append(tenant)
+        if status is not None:
+            conditions.append('status = ?')
+            values.append(status)
+        where = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        rows = self._connection().execute(
+            f'SELECT {_JOB_COLUMNS} FROM jobs{where} ORDER BY seq DESC LIMIT ?', (*values, limit)
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connection().execute('SELECT status, count(*) FROM jobs GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    @staticmethod
+    def _row(row) -> Dict[str, Any]:
+        (job_id, kind, tenant, priority, status, params, error, attempts,
+         created_at, started_at, finished_at) = row
+        return {
+            'job_id': job_id, 'kind': kind, 'tenant': tenant, 'priority': priority,
+            'status': status, 'params': json.loads(params), 'error': error, 'attempts': attempts,
+            'created_at': created_at, 'started_at': started_at, 'finished_at': finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Worker pool, който изпълнява задачите от JobStore.
+
+    По-високият priority се изпълнява първи; в рамките на един приоритет
+    tenant-ите се редуват (round-robin), а един tenant заема най-много
+    per_tenant_concurrency worker-а - голяма партида на един клиент не
+    блокира останалите. При старта прекъснатите задачи се възстановяват.
+    Отменена running задача се прекъсва (asyncio cancel); неочаквана грешка
+    на handler-а прави задачата failed, без повторен опит. Завършените
+    задачи, по-стари от retention, се изтриват при старта и на всеки
+    purge_interval секунди.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, JobHandler],
+                 workers: int = 4, per_tenant_concurrency: int = 2,
+                 max_attempts: int = 3, timeout: float = 3600,
+                 retention: float = 7 * 24 * 3600, poll_interval: float = 1.0,
+                 purge_interval: float = 3600):
+        self.store = store
+        self.handlers = dict(handlers)
+        self.workers = max(1, workers)
+        self.per_tenant_concurrency = max(1, per_tenant_concurrency)
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_tenants: Dict[str, int] = {}
+        self._served: Dict[str, int] = {}
+        self._served_seq = 0
+        self._claim_lock = asyncio.Lock()
+
+    @classmethod
+    def from_settings(cls, store: JobStore, handlers: Dict[str, JobHandler],
+                      config: Optional[Settings] = None) -> 'JobQueue':
+        config = config or settings
+        return cls(
+            store, handlers,
+            workers=config.jobs_workers,
+            per_tenant_concurrency=config.jobs_per_tenant_concurrency,
+            max_attempts=config.jobs_max_attempts,
+            timeout=config.jobs_timeout,
+            retention=config.jobs_retention,
+            purge_interval=config.jobs_purge_interval,
+        )
+
+    async def start(self) -> Dict[str, int]:
+        recovered = await asyncio.to_thread(self.store.recover, self.max_attempts)
+        await asyncio.to_thread(self.store.purge, self.retention)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.purge_interval > 0:
+            self._tasks.append(asyncio.create_task(self._purge_periodically()))
+        return recovered
+
+    async def stop(self):
+        """Спира worker-ите; прекъснатите задачи остават running и се възстановяват при старта."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, params: Dict[str, Any], tenant: str = 'default', priority: int = 0) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f'Непознат вид задача: {kind}')
+        job_id = await asyncio.to_thread(self.store.submit, kind, params, tenant, priority)
+        self._wakeup.set()
+        return job_id
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        previous = await asyncio.to_thread(self.store.cancel, job_id)
+        task = self._running.get(job_id)
+        if previous == RUNNING and task is not None:
+            task.cancel()
+        return previous
+
+    async def _worker(self):
+        while True:
+            # Нулира се преди избора, за да не се изпусне submit между двете
+            self._wakeup.clear()
+            job = await self._claim()
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _purge_periodically(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                await asyncio.to_thread(self.store.purge, self.retention)
+            except sqlite3.Error:
+                # Заета база (напр. друг worker пише) - следващия път
+                pass
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        async with self._claim_lock:
+            busy = [tenant for tenant, count in self._running_tenants.items()
+                    if count >= self.per_tenant_concurrency]
+            job = await asyncio.to_thread(self.store.claim, busy, dict(self._served))
+            if job is not None:
+                tenant = job['tenant']
+                self._running_tenants[tenant] = self._running_tenants.get(tenant, 0) + 1
+                self._served_seq += 1
+                self._served[tenant] = self._served_seq
+            return job
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id, kind, tenant = job['job_id'], job['kind'], job['tenant']
+        start = time.perf_counter()
+        task = asyncio.ensure_future(asyncio.wait_for(self.handlers[kind](job['params']), self.timeout))
+        self._running[job_id] = task
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled():
+                # Отменена през cancel() - статусът вече е записан
+                JOBS_FINISHED.inc(kind=kind, status=CANCELLED)
+                return
+            # Worker-ът спира (shutdown) - задачата ще бъде възстановена
+            task.cancel()
+            raise
+        except asyncio.TimeoutError:
+            await asyncio.to_thread(self.store.finish, job_id, FAILED, None, f'Превишено време ({self.timeout} s)')
+            JOBS_FINISHED.inc(kind=kind, status=FAILED)
+        except Exception as e:
+            await asyncio.to_thread(self.store.finish, job_id, FAILED, None, str(e) or type(e).__name__)
+            JOBS_FINISHED.inc(kind=kind, status=FAILED)
+        else:
+            await asyncio.to_thread(self.store.finish, job_id, SUCCEEDED, result)
+            JOBS_FINISHED.inc(kind=kind, status=SUCCEEDED)
+        finally:
+            self._running.pop(job_id, None)
+            self._running_tenants[tenant] -= 1
+            if not self._running_tenants[tenant]:
+                del self._running_tenants[tenant]
+            JOB_DURATION.observe(time.perf_counter() - start, kind=kind)
+            # Освободеният слот на tenant-а може да отключи чакаща задача
+            self._wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.workers,
+            'running': len(self._running),
+            'running_by_tenant': dict(self._running_tenants),
+        }
+
+
+_default_store: Optional[JobStore] = None
+_default_loaded = False
+
+
+def get_job_store() -> Optional[JobStore]:
+    """Споделената опашка от SEOAPP_JOBS_PATH (None, ако е изключена)."""
+    global _default_store, _default_loaded
+    if not _default_loaded:
+        _default_loaded = True
+        if settings.jobs_path:
+            _default_store = JobStore(settings.jobs_path)
+    return _default_store
@@ -0,0 +1,55 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Hashable
+
+
+class _Slot:
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+        self.waiting = 0
+
+
+class KeyedLimiter:
+    """
+    Ограничава едновременната работа за всеки ключ (host, домейн и т.н.).
+
+    Семафорът за даден ключ съществува само докато някой го използва или
+    чака, така че паметта не расте с броя на видените ключове.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._slots: Dict[Hashable, _Slot] = {}
+        self.active = 0
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable) -> AsyncIterator[None]:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot(self.limit)
+        slot.users += 1
+        slot.waiting += 1
+        waiting = True
+        try:
+            async with slot.semaphore:
+                slot.waiting -= 1
+                waiting = False
+                self.active += 1
+                try:
+                    yield
+                finally:
+                    self.active -= 1
+        finally:
+            if waiting:
+                slot.waiting -= 1
+            slot.users -= 1
+            if slot.users == 0:
+                self._slots.pop(key, None)
+
+    @property
+    def waiting(self) -> int:
+        return sum(slot.waiting for slot in self._slots.values())
+
+    def __len__(self) -> int:
+        return len(self._slots)
@@ -0,0 +1,174 @@
+import asyncio
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from app.config import Settings, settings as default_settings
+from app.services.http_client import HTTPClientPool
+from app.services.metrics import REGISTRY
+from app.services.ttl_cache import MISSING, TTLCache
+
+
+LINK_CHECKS = REGISTRY.counter(
+    'seoapp_link_checks_total', 'Проверени линкове по резултат (cache = от кеша на статусите)', ('result',)
+)
+
+# Статуси на HEAD, след които се пробва GET - много сървъри не поддържат HEAD
+HEAD_FALLBACK_STATUSES = frozenset((400, 403, 405, 406, 501))
+# Статуси, които вероятно са временни - кешират се за кратко
+TRANSIENT_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+
+
+class LinkChecker:
+    """
+    Проверява дали линковете работят - HEAD, а при неподдържан HEAD GET с
+    Range: bytes=0-0, без да се сваля тялото.
+
+    Заявките минават през споделения HTTPClientPool (ограничение на
+    едновременните заявки към един host) и общ лимит concurrency. Статусите
+    се пазят в TTL кеш, общ за всички анализи, така че линкове, които се
+    срещат на много страници и сайтове (CDN, социални профили), се проверяват
+    веднъж на ttl; едновременните проверки на един URL се обединяват.
+    """
+
+    def __init__(self, http_pool: HTTPClientPool, cache: Optional[TTLCache] = None,
+                 concurrency: int = 20, timeout: float = 10.0,
+                 ttl: float = 3600, error_ttl: float = 300):
+        self.http = http_pool
+        self.cache = cache if cache is not None else get_link_status_cache()
+        self.timeout = timeout
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.requests_sent = 0
+
+    @classmethod
+    def from_settings(cls, http_pool: HTTPClientPool, config: Optional[Settings] = None) -> 'LinkChecker':
+        config = config or default_settings
+        return cls(
+            http_pool,
+            concurrency=config.link_check_concurrency,
+            timeout=config.link_check_timeout,
+            ttl=config.link_check_ttl,
+            error_ttl=config.link_check_error_ttl,
+        )
+
+    async def check(self, url: str) -> dict:
+        """
+        Връща {url, status, ok, final_url, method, error, cached} за един линк.
+        status е None при мрежова грешка.
+        """
+        cached = self.cache.get(url)
+        if cached is not MISSING:
+            LINK_CHECKS.inc(result='cache')
+            return dict(cached, cached=True)
+
+        inflight = self._inflight.get(url)
+        if inflight is not None:
+            return dict(await asyncio.shield(inflight), cached=True)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[url] = future
+        try:
+            async with self._slots:
+                result = await self._check(url)
+            transient = result['status'] is None or result['status'] in TRANSIENT_STATUSES
+            self.cache.set(url, result, self.error_ttl if transient else self.ttl)
+            LINK_CHECKS.inc(result='error' if result['status'] is None else 'ok' if result['ok'] else 'broken')
+            future.set_result(result)
+        finally:
+            if not future.done():
+                future.set_result({
+                    'url': url, 'status': None, 'ok': False, 'final_url': None,
+                    'method': None, 'error': 'Проверката беше прекъсната',
+                })
+            self._inflight.pop(url, None)
+        return dict(result, cached=False)
+
+    async def check_many(self, urls: Iterable[str]) -> List[dict]:
+        """Проверява уникалните URL-и паралелно; редът на резултатите следва входа."""
+        unique = list(dict.fromkeys(urls))
+        return list(await asyncio.gather(*(self.check(url) for url in unique)))
+
+    async def _check(self, url: str) -> dict:
+        result = {'url': url, 'status': None, 'ok': False, 'final_url': None, 'method': 'HEAD', 'error': None}
+        try:
+            response = await self._head(url)
+        except (httpx.TimeoutException, httpx.ConnectError) as e:
+            # Host-ът не отговаря - GET няма да помогне
+            result['error'] = str(e) or type(e).__name__
+            return result
+        except (httpx.HTTPError, httpx.InvalidURL, OSError):
+            # Някои сървъри прекъсват връзката при HEAD - опитва се с GET
+            response = None
+
+        if response is None or response.status_code in HEAD_FALLBACK_STATUSES:
+            result['method'] = 'GET'
+            try:
+                response = await self._ranged_get(url)
+            except (httpx.HTTPError, httpx.InvalidURL, OSError) as e:
+                result['error'] = str(e) or type(e).__name__
+                return result
+
+        result['status'] = response.status_code
+        # 416 на GET с Range - ресурсът съществува, но е празен
+        result['ok'] = response.status_code < 400 or (result['method'] == 'GET' and response.status_code == 416)
+        result['final_url'] = str(response.url)
+        return result
+
+    async def _head(self, url: str) -> httpx.Response:
+        self.requests_sent += 1
+        return await self.http.request('HEAD', url, timeout=self.timeout)
+
+    async def _ranged_get(self, url: str) -> httpx.Response:
+        self.requests_sent += 1
+        # Тялото не се чете - връзката се затваря веднага след headers
+        async with self.http.stream('GET', url, headers={'Range': 'bytes=0-0'}, timeout=self.timeout) as response:
+            return response
+
+    def stats(self) -> dict:
+        return {
+            'cache_entries': len(self.cache),
+            'cache_hits': self.cache.hits,
+            'cache_misses': self.cache.misses,
+            'requests_sent': self.requests_sent,
+            'inflight': len(self._inflight),
+        }
+
+
+def summarize(results: List[dict], limit_reached: bool = False, max_listed: int = 100) -> dict:
+    """Обобщение на проверката за секцията link_health."""
+    status_counts: Dict[str, int] = {}
+    broken = []
+    redirected = []
+    for result in results:
+        key = str(result['status']) if result['status'] is not None else 'error'
+        status_counts[key] = status_counts.get(key, 0) + 1
+        if not result['ok']:
+            broken.append({'url': result['url'], 'status': result['status'], 'error': result['error']})
+        elif result['final_url'] and result['final_url'] != result['url']:
+            redirected.append({'url': result['url'], 'final_url': result['final_url']})
+
+    return {
+        'checked': len(results),
+        'ok': len(results) - len(broken),
+        'broken': len(broken),
+        'redirected': len(redirected),
+        'from_cache': sum(1 for result in results if result.get('cached')),
+        'limit_reached': limit_reached,
+        'status_counts': status_counts,
+        'broken_links': broken[:max_listed],
+        'redirected_links': redirected[:max_listed],
+    }
+
+
+_status_cache: Optional[TTLCache] = None
+
+
+def get_link_status_cache() -> TTLCache:
+    """Споделеният за процеса кеш URL -> статус."""
+    global _status_cache
+    if _status_cache is None:
+        _status_cache = TTLCache(max_entries=default_settings.link_check_cache_size)
+    return _status_cache
@@ -1,5 +1,5 @@
-from bs4 import BeautifulSoup
-from typing import Dict, List
+from typing import Dict, List, Union
+from app.services.document import ParsedDocument
 import json
 import re
 
@@ -7,31 +7,31 @@ import re
 class MetadataParser:
     """Парсва metadata и structured data."""
     
-    def parse(self, html: str) -> dict:
-        soup = BeautifulSoup(html, 'lxml')
+    def parse(self, document: Union[ParsedDocument, str]) -> dict:
+        doc = ParsedDocument.ensure(document)
         
         result = {
-            'canonical': self._get_canonical(soup),
-            'open_graph': self._get_open_graph(soup),
-            'twitter_cards': self._get_twitter_cards(soup),
-            'json_ld': self._get_json_ld(soup),
-            'feeds': self._get_feeds(soup),
-            'robots_meta': self._get_robots_meta(soup)
+            'canonical': self._get_canonical(doc),
+            'open_graph': self._get_open_graph(doc),
+            'twitter_cards': self._get_twitter_cards(doc),
+            'json_ld': self._get_json_ld(doc),
+            'feeds': self._get_feeds(doc),
+            'robots_meta': self._get_robots_meta(doc)
         }
         
         return result
     
-    def _get_canonical(self, soup: BeautifulSoup) -> str:
+    def _get_canonical(self, doc: ParsedDocument) -> str:
         """Взима canonical URL."""
-        canonical = soup.find('link', {'rel': 'canonical'})
+        canonical = doc.find('link', {'rel': 'canonical'})
         if canonical:
             return canonical.get('href', '')
         return ''
     
-    def _get_open_graph(self, soup: BeautifulSoup) -> dict:
+    def _get_open_graph(self, doc: ParsedDocument) -> dict:
         """Взима OpenGraph tags."""
         og_tags = {}
-        og_meta = soup.find_all('meta', {'property': re.compile(r'^og:', re.I)})
+        og_meta = doc.find_all('meta', {'property': re.compile(r'^og:', re.I)})
         
         for meta in og_meta:
             prop = meta.get('property', '').lower()
@@ -42,10 +42,10 @@ class MetadataParser:
         
         return og_tags
     
-    def _get_twitter_cards(self, soup: BeautifulSoup) -> dict:
+    def _get_twitter_cards(self, doc: ParsedDocument) -> dict:
         """Взима Twitter Card tags."""
         twitter_tags = {}
-        twitter_meta = soup.find_all('meta', {'name': re.compile(r'^twitter:', re.I)})
+        twitter_meta = doc.find_all('meta', {'name': re.compile(r'^twitter:', re.I)})
         
         for meta in twitter_meta:
             name = meta.get('name', '').lower()
@@ -56,10 +56,10 @@ class MetadataParser:
         
         return twitter_tags
     
-    def _get_json_ld(self, soup: BeautifulSoup) -> List[dict]:
+    def _get_json_ld(self, doc: ParsedDocument) -> List[dict]:
         """Взима JSON-LD structured data."""
         json_ld_data = []
-        scripts = soup.find_all('script', {'type': 'application/ld+json'})
+        scripts = doc.find_all('script', {'type': 'application/ld+json'})
         
         for script in scripts:
             try:
@@ -72,19 +72,19 @@ class MetadataParser:
         
         return json_ld_data
     
-    def _get_feeds(self, soup: BeautifulSoup) -> List[str]:
+    def _get_feeds(self, doc: ParsedDocument) -> List[str]:
         """Взима RSS/JSON feeds."""
         feeds = []
         
         # RSS
-        rss_links = soup.find_all('link', {'type': re.compile(r'application/(rss|atom)', re.I)})
+        rss_links = doc.find_all('link', {'type': re.compile(r'application/(rss|atom)', re.I)})
         for link in rss_links:
             href = link.get('href', '')
             if href:
                 feeds.append(href)
         
         # JSON Feed
-        json_feeds = soup.find_all('link', {'type': 'application/json'})
+        json_feeds = doc.find_all('link', {'type': 'application/json'})
         for link in json_feeds:
             href = link.get('href', '')
             if 'feed' in href.lower() or 'json' in href.lower():
@@ -92,9 +92,9 @@ class MetadataParser:
         
         return feeds
     
-    def _get_robots_meta(self, soup: BeautifulSoup) -> str:
+    def _get_robots_meta(self, doc: ParsedDocument) -> str:
         """Взима robots meta tag."""
-        robots = soup.find('meta', {'name': 'robots'})
+        robots = doc.find('meta', {'name': 'robots'})
         if robots:
             return robots.get('content', '')
         return ''
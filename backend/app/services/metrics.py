@@ -0,0 +1,278 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge, чиято стойност се чете от функция в момента на export-а."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._functions: List[Callable[[], Dict[LabelValues, float]]] = []
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]):
+        """function връща {стойности на етикетите: стойност}."""
+        self._functions = [function]
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for function in self._functions:
+            try:
+                samples = function()
+            except Exception:
+                continue
+            for key, value in sorted(samples.items()):
+                if value is not None:
+                    lines.append(f'{self.name}{_labels(self.labelnames, key)} {_number(value)}')
+        return lines
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # етикети -> (броячи по bucket, сума, общ брой)
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class Registry:
+    """Регистър на метриките и export в Prometheus text формат."""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = Histogram.DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_DURATION = REGISTRY.histogram(
+    'seoapp_stage_duration_seconds', 'Продължителност на етапите на анализа', ('stage',)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'seoapp_stage_errors_total', 'Грешки по етапи на анализа', ('stage',)
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'seoapp_cache_requests_total', 'Заявки към кеша на резултатите по секция и резултат', ('section', 'result')
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    'seoapp_http_requests_total', 'HTTP заявки към API-то', ('method', 'route', 'status')
+)
+HTTP_DURATION = REGISTRY.histogram(
+    'seoapp_http_request_duration_seconds', 'Време за отговор на API-то', ('method', 'route')
+)
+
+
+class Timings:
+    """
+    Монотонни таймери за етапите на една заявка.
+
+    Всеки етап се записва в durations (ms) и в хистограмата
+    seoapp_stage_duration_seconds; грешките в етапа се броят отделно.
+    """
+
+    def __init__(self, observe: bool = True):
+        self.observe = observe
+        self.durations: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if self.observe:
+                STAGE_ERRORS.inc(stage=name)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name: str, seconds: float):
+        # Повтарящ се етап (напр. няколко DNS заявки) се натрупва
+        self.durations[name] = self.durations.get(name, 0.0) + seconds * 1000
+        if self.observe:
+            STAGE_DURATION.observe(seconds, stage=name)
+
+    def merge(self, durations_ms: Dict[str, float], observe: bool = True):
+        """
+        Добавя етапи, измерени другаде (напр. в worker процес). observe=False -
+        етапите вече са отчетени в хистограмата (споделено изчисление).
+        """
+        for name, milliseconds in durations_ms.items():
+            if observe:
+                self.record(name, milliseconds / 1000)
+            else:
+                self.durations[name] = self.durations.get(name, 0.0) + milliseconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {name: round(value, 2) for name, value in self.durations.items()}
+
+    def server_timing(self) -> str:
+        """Стойност за Server-Timing header-а."""
+        return ', '.join(f'{name};dur={value:.1f}' for name, value in self.durations.items())
+
+
+def stage(timings: Optional[Timings], name: str):
+    """timings.stage(name) или празен context manager, ако няма timings."""
+    return timings.stage(name) if timings is not None else _null_stage()
+
+
+@contextmanager
+def _null_stage() -> Iterator[None]:
+    yield
+
+
+class MetricsMiddleware:
+    """ASGI middleware - брой заявки и време за отговор по route и статус."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {'code': 500}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self._route(scope)
+            HTTP_REQUESTS.inc(method=scope['method'], route=route, status=status['code'])
+            HTTP_DURATION.observe(time.perf_counter() - start, method=scope['method'], route=route)
+
+    def _route(self, scope) -> str:
+        # Шаблонът на пътя (/snapshots/{snapshot_id}), а не конкретният URL
+        endpoint = scope.get('endpoint')
+        if endpoint is None:
+            return 'other'
+        route = self._routes.get(endpoint)
+        if route is None:
+            route = 'other'
+            for candidate in getattr(scope.get('app'), 'routes', []):
+                if getattr(candidate, 'endpoint', None) is endpoint:
+                    route = candidate.path
+                    break
+            self._routes[endpoint] = route
+        return route
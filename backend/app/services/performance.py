@@ -0,0 +1,232 @@
+import asyncio
+import socket
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config import Settings, settings as default_settings
+from app.services.http_client import HTTP2_AVAILABLE
+
+# Метриките на един hop (ms), за които се смятат percentile-и
+HOP_METRICS = ('dns', 'connect', 'tls', 'ttfb', 'download', 'total')
+PERCENTILES = (50, 90, 95)
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def connection_info(response: httpx.Response) -> Dict[str, Optional[str]]:
+    """HTTP версия, TLS версия и cipher от реалната връзка на отговора."""
+    info: Dict[str, Optional[str]] = {
+        'http_version': response.http_version, 'tls_version': None, 'tls_cipher': None,
+    }
+    stream = response.extensions.get('network_stream')
+    ssl_object = stream.get_extra_info('ssl_object') if stream is not None else None
+    if ssl_object is not None:
+        info['tls_version'] = ssl_object.version()
+        cipher = ssl_object.cipher()
+        info['tls_cipher'] = cipher[0] if cipher else None
+    return info
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Percentile с линейна интерполация (q от 0 до 100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize_values(values: List[float]) -> Dict[str, Optional[float]]:
+    summary = {
+        'min': min(values) if values else None,
+        'max': max(values) if values else None,
+        'mean': sum(values) / len(values) if values else None,
+    }
+    for q in PERCENTILES:
+        summary[f'p{q}'] = percentile(values, q)
+    return {key: round(value, 2) if value is not None else None for key, value in summary.items()}
+
+
+class _HopTrace:
+    """httpcore trace callback - моментите на събитията за един hop."""
+
+    def __init__(self):
+        self.events: Dict[str, float] = {}
+        self.tls_stream = None
+
+    async def __call__(self, event_name: str, info: dict):
+        # 'connection.connect_tcp.started', 'http11.receive_response_headers.complete', ...
+        self.events.setdefault(event_name.partition('.')[2], time.perf_counter())
+        if event_name == 'connection.start_tls.complete':
+            self.tls_stream = info.get('return_value')
+
+    def duration(self, name: str) -> Optional[float]:
+        started, completed = self.events.get(f'{name}.started'), self.events.get(f'{name}.complete')
+        if started is None or completed is None:
+            return None
+        return (completed - started) * 1000
+
+
+class PerformanceProbe:
+    """
+    Времена на зареждане на страницата по етапи за всеки redirect hop: DNS,
+    TCP connect, TLS handshake, time to first byte и сваляне на тялото, плюс
+    договорените HTTP версия, TLS версия и cipher.
+
+    Всяка проба използва нов клиент (без преизползвани връзки от споделения
+    pool), така че DNS/connect/TLS се измерват като при първо посещение;
+    redirect-ите се следват ръчно, за да се измери всеки hop поотделно.
+    Времената идват от httpcore trace събитията. httpx не позволява връзката
+    да се отвори към вече resolve-нат IP, затова connect_ms включва и DNS
+    заявката на самата връзка, а dns_ms е отделен getaddrinfo преди
+    заявката (същият системен resolver, но не същото търсене - второто
+    често идва от кеша на resolver-а). Пробите са последователни, а
+    обобщението съдържа min/max/mean и percentile-и по проби.
+    """
+
+    def __init__(self, timeout: float = 30.0, max_redirects: int = 10,
+                 max_bytes: int = 20 * 1024 * 1024, http2: bool = True,
+                 user_agent: str = 'Mozilla/5.0'):
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.max_bytes = max_bytes
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.user_agent = user_agent
+        self._ssl_context = httpx.create_ssl_context()
+
+    @classmethod
+    def from_settings(cls, config: Optional[Settings] = None) -> 'PerformanceProbe':
+        config = config or default_settings
+        return cls(
+            timeout=config.performance_timeout,
+            max_bytes=config.html_max_bytes,
+            http2=config.http2,
+            user_agent=config.user_agent,
+        )
+
+    async def measure(self, url: str, samples: int = 1) -> Dict[str, Any]:
+        """Прави samples последователни проби и връща секцията performance."""
+        results = []
+        for _ in range(max(1, samples)):
+            results.append(await self.sample(url))
+        return self.summarize(results)
+
+    async def sample(self, url: str) -> Dict[str, Any]:
+        """Една проба: hops (всеки със собствените си времена) и общото време."""
+        hops: List[Dict[str, Any]] = []
+        resolved = set()
+        start = time.perf_counter()
+        error = None
+        async with httpx.AsyncClient(
+            http2=self.http2, verify=self._ssl_context, timeout=self.timeout,
+            follow_redirects=False, headers={'User-Agent': self.user_agent}
+        ) as client:
+            request: Optional[httpx.Request] = client.build_request('GET', url)
+            try:
+                while request is not None:
+                    if len(hops) > self.max_redirects:
+                        raise httpx.TooManyRedirects('Твърде много redirect-и', request=request)
+                    hop, request = await self._hop(client, request, resolved)
+                    hops.append(hop)
+            except (httpx.HTTPError, httpx.InvalidURL, OSError) as e:
+                error = str(e) or type(e).__name__
+
+        return {
+            'hops': hops,
+            'redirects': max(0, len(hops) - 1),
+            'total_ms': round((time.perf_counter() - start) * 1000, 2),
+            'error': error,
+        }
+
+    async def _hop(self, client: httpx.AsyncClient, request: httpx.Request,
+                   resolved: set) -> Tuple[Dict[str, Any], Optional[httpx.Request]]:
+        trace = _HopTrace()
+        request.extensions['trace'] = trace
+        hop: Dict[str, Any] = {'url': str(request.url)}
+        start = time.perf_counter()
+
+        host, port = request.url.host, request.url.port or DEFAULT_PORTS.get(request.url.scheme, 443)
+        hop['dns_ms'] = None
+        if (host, port) not in resolved:
+            # Нова връзка - DNS се мери само веднъж за host в пробата, с отделен
+            # getaddrinfo; connect_tcp по-долу resolve-ва host-а отново
+            resolved.add((host, port))
+            dns_start = time.perf_counter()
+            await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            hop['dns_ms'] = round((time.perf_counter() - dns_start) * 1000, 2)
+
+        response = await client.send(request, stream=True)
+        headers_at = time.perf_counter()
+        info = connection_info(response)
+        stream = response.extensions.get('network_stream')
+        address = stream.get_extra_info('server_addr') if stream is not None else None
+        received = 0
+        try:
+            async for chunk in response.aiter_raw():
+                received += len(chunk)
+                if received >= self.max_bytes:
+                    break
+        finally:
+            await response.aclose()
+        end = time.perf_counter()
+
+        request_started = trace.events.get('send_request_headers.started', start)
+        first_byte = trace.events.get('receive_response_headers.complete', headers_at)
+        if info['tls_version'] is None and trace.tls_stream is not None:
+            ssl_object = trace.tls_stream.get_extra_info('ssl_object')
+            if ssl_object is not None:
+                info['tls_version'] = ssl_object.version()
+                info['tls_cipher'] = (ssl_object.cipher() or (None,))[0]
+
+        connect, tls = trace.duration('connect_tcp'), trace.duration('start_tls')
+        hop.update({
+            'status': response.status_code,
+            'ip_address': address[0] if address else None,
+            'new_connection': connect is not None,
+            'connect_ms': round(connect, 2) if connect is not None else None,
+            'tls_ms': round(tls, 2) if tls is not None else None,
+            'ttfb_ms': round((first_byte - request_started) * 1000, 2),
+            'download_ms': round((end - first_byte) * 1000, 2),
+            'total_ms': round((end - start) * 1000, 2),
+            'bytes': received,
+            **info,
+        })
+        return hop, response.next_request
+
+    @staticmethod
+    def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Секцията performance: последната проба с hop-овете, сумите по етапи
+        за всяка проба и min/max/mean/p50/p90/p95 по проби.
+        """
+        totals: Dict[str, List[float]] = {metric: [] for metric in HOP_METRICS}
+        errors = []
+        for sample in samples:
+            if sample['error']:
+                errors.append(sample['error'])
+                continue
+            for metric in HOP_METRICS:
+                if metric == 'total':
+                    totals[metric].append(sample['total_ms'])
+                else:
+                    totals[metric].append(sum(hop.get(f'{metric}_ms') or 0.0 for hop in sample['hops']))
+
+        final_hop = next((sample['hops'][-1] for sample in reversed(samples) if sample['hops']), {})
+        return {
+            'samples': len(samples),
+            # connect_ms е connect_tcp на httpcore - DNS на връзката + TCP handshake
+            'connect_includes_dns': True,
+            'successful_samples': len(samples) - len(errors),
+            'final_url': final_hop.get('url'),
+            'http_version': final_hop.get('http_version'),
+            'tls_version': final_hop.get('tls_version'),
+            'tls_cipher': final_hop.get('tls_cipher'),
+            'redirects': samples[-1]['redirects'] if samples else 0,
+            'hops': samples[-1]['hops'] if samples else [],
+            'summary_ms': {metric: summarize_values(values) for metric, values in totals.items()},
+            'sample_totals_ms': totals['total'],
+            'errors': errors,
+        }
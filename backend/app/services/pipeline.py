@@ -0,0 +1,169 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.services.metrics import REGISTRY
+
+
+STAGE_FAILURES = REGISTRY.counter(
+    'seoapp_stage_failures_total',
+    'Неуспешни етапи на анализа по етап и причина (error, timeout, dependency)', ('stage', 'reason')
+)
+
+
+class StageContext:
+    """
+    Общото състояние на един анализ, достъпно за всеки етап: URL-ът,
+    параметрите на заявката, резултатите от завършилите етапи (results) и
+    помощните обекти на анализатора (crawler, timings, cached).
+    """
+
+    def __init__(self, url: str, options: Optional[Dict[str, Any]] = None, **helpers: Any):
+        self.url = url
+        self.options = options or {}
+        self.results: Dict[str, Any] = {}
+        for name, value in helpers.items():
+            setattr(self, name, value)
+
+
+class Stage:
+    """
+    Етап на анализа: име, етапите, от чиито резултати зависи (requires), и
+    асинхронна функция run(context) -> резултат.
+
+    emit превръща резултата в секции (двойки име, данни) за analyze_iter -
+    по подразбиране една секция с името на етапа. timeout е в секунди (None -
+    без ограничение). default=False - етапът се изпълнява само ако е поискан
+    изрично (в sections).
+    """
+
+    def __init__(self, name: str, run: Callable[[StageContext], Awaitable[Any]],
+                 requires: Iterable[str] = (),
+                 emit: Optional[Callable[[Any, StageContext], Iterable[Tuple[str, Any]]]] = None,
+                 timeout: Optional[float] = None,
+                 default: bool = True):
+        self.name = name
+        self.run = run
+        self.requires = tuple(requires)
+        self.emit = emit or (lambda result, context: [(name, result)])
+        self.timeout = timeout
+        self.default = default
+
+
+class StageFailed(Exception):
+    """Етапът не е завършил - грешка, timeout или неуспешна зависимост."""
+
+    def __init__(self, stage: str, reason: str, message: str, cause: Optional[BaseException] = None):
+        super().__init__(message)
+        self.stage = stage
+        self.reason = reason
+        self.cause = cause
+
+
+class Pipeline:
+    """
+    Изпълнява етапите като граф на зависимостите: всеки етап започва веднага
+    щом са готови етапите в requires, а независимите вървят паралелно.
+
+    Грешката или timeout-ът на един етап не прекъсва останалите - етапът се
+    връща като StageFailed, а зависимите от него етапи не се изпълняват.
+    """
+
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: Dict[str, Stage] = {stage.name: stage for stage in stages}
+
+    def resolve(self, names: Iterable[str]) -> List[str]:
+        """Етапите names и всички техни зависимости, в топологичен ред."""
+        order: List[str] = []
+        visiting: Set[str] = set()
+
+        def visit(name: str):
+            if name in order:
+                return
+            if name in visiting:
+                raise ValueError(f"Цикъл в зависимостите на етапите: {name}")
+            stage = self.stages.get(name)
+            if stage is None:
+                raise ValueError(f"Непознат етап: {name}")
+            visiting.add(name)
+            for dependency in stage.requires:
+                visit(dependency)
+            visiting.discard(name)
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    async def run(self, context: StageContext,
+                  names: Iterable[str]) -> AsyncIterator[Tuple[str, Any, Optional[StageFailed]]]:
+        """
+        Връща (етап, резултат, грешка) по реда на завършване; при неуспех
+        резултатът е None. Незавършените етапи се прекъсват, ако итерацията
+        спре по-рано.
+        """
+        waiting = self.resolve(names)
+        failed: Dict[str, StageFailed] = {}
+        running: Dict[asyncio.Future, str] = {}
+        try:
+            while waiting or running:
+                for name in list(waiting):
+                    stage = self.stages[name]
+                    broken = next((dep for dep in stage.requires if dep in failed), None)
+                    if broken is not None:
+                        waiting.remove(name)
+                        failed[name] = StageFailed(
+                            name, 'dependency', f"Етапът {broken} не е завършил: {failed[broken]}"
+                        )
+                        STAGE_FAILURES.inc(stage=name, reason='dependency')
+                        yield name, None, failed[name]
+                    elif all(dep in context.results for dep in stage.requires):
+                        waiting.remove(name)
+                        running[asyncio.ensure_future(self._run_stage(stage, context))] = name
+                if not running:
+                    continue
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    try:
+                        context.results[name] = task.result()
+                    except StageFailed as e:
+                        failed[name] = e
+                        STAGE_FAILURES.inc(stage=name, reason=e.reason)
+                        yield name, None, e
+                    else:
+                        yield name, context.results[name], None
+        finally:
+            for task in running:
+                task.cancel()
+
+    @staticmethod
+    async def _run_stage(stage: Stage, context: StageContext) -> Any:
+        try:
+            return await asyncio.wait_for(stage.run(context), stage.timeout)
+        except asyncio.TimeoutError as e:
+            raise StageFailed(stage.name, 'timeout', f"Timeout след {stage.timeout:g} s", e)
+        except Exception as e:
+            raise StageFailed(stage.name, 'error', str(e) or type(e).__name__, e)
+
+
+# Етапи, добавени извън анализатора (register_stage)
+_registry: Dict[str, Stage] = {}
+
+
+def register_stage(stage: Stage):
+    """
+    Добавя етап към всеки следващ анализ. Резултатът му излиза като секция
+    със същото име (и може да се поиска в sections); requires може да сочи
+    вградените етапи (напр. 'page' - страницата с header-ите и секциите от
+    HTML) или други регистрирани етапи.
+    """
+    _registry[stage.name] = stage
+
+
+def unregister_stage(name: str):
+    _registry.pop(name, None)
+
+
+def registered_stages() -> List[Stage]:
+    return list(_registry.values())
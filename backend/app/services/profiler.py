@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+
+class SamplingProfiler:
+    """
+    Sampling profiler за нишката на event loop-а.
+
+    Отделна нишка на всеки interval секунди взима стека на наблюдаваната
+    нишка (sys._current_frames) и брои еднаквите стекове. Стековете са във
+    "folded" формат (root;...;leaf), подходящ за flame graph. Профилът
+    включва всичко, което event loop-ът е правил през това време - и
+    другите едновременни заявки; работата в process pool-а не се вижда.
+    """
+
+    def __init__(self, interval: float = 0.005, max_depth: int = 64,
+                 thread_id: Optional[int] = None):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.thread_id = thread_id or threading.get_ident()
+        self.samples = 0
+        self._stacks: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at = 0.0
+        self._duration = 0.0
+
+    def start(self) -> 'SamplingProfiler':
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='seoapp-profiler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> dict:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._duration = time.perf_counter() - self._started_at
+        return self.report()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            code = frame.f_code
+            if code.co_name == 'select' and code.co_filename.endswith('selectors.py'):
+                # Event loop-ът чака I/O
+                key = '(idle)'
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+                self.samples += 1
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self._stacks[key] = self._stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def report(self, top: int = 50) -> dict:
+        stacks = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            'interval_ms': self.interval * 1000,
+            'duration_ms': round(self._duration * 1000, 2),
+            'samples': self.samples,
+            'stacks': [{'stack': stack, 'count': count} for stack, count in stacks],
+        }
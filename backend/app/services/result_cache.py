@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import Settings, settings as default_settings
+from app.services.metrics import CACHE_REQUESTS
+
+
+class MemoryCacheBackend:
+    """In-process LRU кеш, ограничен по общия размер на сериализираните стойности."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._data: 'OrderedDict[str, Tuple[float, float, str]]' = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[float, float, str]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            self.delete(key)
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: str, stored_at: float, expires_at: float, payload: str):
+        self.delete(key)
+        if len(payload) > self.max_bytes:
+            return
+        self._data[key] = (stored_at, expires_at, payload)
+        self.size_bytes += len(payload)
+        while self.size_bytes > self.max_bytes and self._data:
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.size_bytes -= len(evicted)
+
+    def delete(self, key: str):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[2])
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """
+    Кеш на диск в SQLite (WAL режим), споделен между няколко uvicorn worker-а.
+
+    Изтеклите записи се изтриват при създаването и на всеки purge_every
+    записа (set), за да не расте файлът безкрайно; 0 = без чистене.
+    """
+
+    def __init__(self, path: str, purge_every: int = 1000):
+        self.path = path
+        self.purge_every = purge_every
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS result_cache ('
+            ' key TEXT PRIMARY KEY, stored_at REAL NOT NULL,'
+            ' expires_at REAL NOT NULL, value TEXT NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_expires ON result_cache (expires_at)')
+        conn.commit()
+        if purge_every > 0:
+            self.purge_expired()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[float, float, str]]:
+        row = self._connection().execute(
+            'SELECT stored_at, expires_at, value FROM result_cache WHERE key = ? AND expires_at > ?',
+            (key, time.time())
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def set(self, key: str, stored_at: float, expires_at: float, payload: str):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO result_cache (key, stored_at, expires_at, value) VALUES (?, ?, ?, ?)',
+            (key, stored_at, expires_at, payload)
+        )
+        conn.commit()
+        if self.purge_every > 0:
+            with self._writes_lock:
+                self._writes += 1
+                due = self._writes % self.purge_every == 0
+            if due:
+                self.purge_expired()
+
+    def purge_expired(self) -> int:
+        conn = self._connection()
+        cursor = conn.execute('DELETE FROM result_cache WHERE expires_at <= ?', (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+
+class ResultCache:
+    """
+    Двустепенен кеш за секциите на анализа: in-memory LRU пред (по избор)
+    SQLite на диск. Всяка секция има собствен TTL.
+    """
+
+    DEFAULT_TTLS = {
+        'whois_and_ip_whois': 7 * 24 * 3600,
+        'infrastructure': 6 * 3600,
+        'page': 10 * 60,
+        'robots_and_sitemaps': 6 * 3600,
+    }
+
+    def __init__(self, memory: Optional[MemoryCacheBackend] = None,
+                 disk: Optional[SQLiteCacheBackend] = None,
+                 ttls: Optional[Dict[str, float]] = None):
+        self.memory = memory or MemoryCacheBackend()
+        self.disk = disk
+        self.ttls = dict(self.DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    @classmethod
+    def from_settings(cls, config: Optional[Settings] = None) -> 'ResultCache':
+        config = config or default_settings
+        disk = (
+            SQLiteCacheBackend(config.cache_sqlite_path, config.cache_purge_every)
+            if config.cache_sqlite_path else None
+        )
+        return cls(
+            memory=MemoryCacheBackend(config.cache_max_bytes),
+            disk=disk,
+            ttls={
+                'whois_and_ip_whois': config.cache_ttl_whois,
+                'infrastructure': config.cache_ttl_infrastructure,
+                'page': config.cache_ttl_page,
+                'robots_and_sitemaps': config.cache_ttl_sitemaps,
+            }
+        )
+
+    async def get(self, section: str, key: str, max_age: Optional[float] = None) -> Optional[Tuple[Any, float]]:
+        """
+        Връща (стойност, възраст в секунди) или None. С max_age се приемат
+        само записи, по-нови от max_age секунди.
+        """
+        cache_key = f'{section}:{key}'
+        entry = self.memory.get(cache_key)
+        if entry is None and self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, cache_key)
+            if entry is not None:
+                self.memory.set(cache_key, *entry)
+
+        if entry is not None:
+            age = max(0.0, time.time() - entry[0])
+            if max_age is None or age <= max_age:
+                self.hits[section] = self.hits.get(section, 0) + 1
+                CACHE_REQUESTS.inc(section=section, result='hit')
+                return json.loads(entry[2]), age
+
+        self.misses[section] = self.misses.get(section, 0) + 1
+        CACHE_REQUESTS.inc(section=section, result='miss')
+        return None
+
+    async def set(self, section: str, key: str, value: Any):
+        ttl = self.ttls.get(section, 0)
+        if ttl <= 0:
+            return
+        cache_key = f'{section}:{key}'
+        stored_at = time.time()
+        payload = json.dumps(value, default=str)
+        self.memory.set(cache_key, stored_at, stored_at + ttl, payload)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, cache_key, stored_at, stored_at + ttl, payload)
+
+    def stats(self) -> dict:
+        return {
+            'memory_entries': len(self.memory),
+            'memory_bytes': self.memory.size_bytes,
+            'disk_enabled': self.disk is not None,
+            'hits': dict(self.hits),
+            'misses': dict(self.misses),
+        }
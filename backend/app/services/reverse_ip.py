@@ -0,0 +1,283 @@
+"""
+Обратен индекс IP -> домейни (за same_ip_websites).
+
+Данните са в SQLite таблици WITHOUT ROWID, т.е. сортирани на диск по
+първичния ключ (ip, domain) / (asn, domain). Търсене по IP, по /24 (/48 за
+IPv6) или по ASN е range scan по B-дървото - милисекунди и при десетки
+милиони записи, а добавянето е инкрементално (upsert), без преизграждане.
+
+Внос на passive DNS дъмпове (от директорията backend):
+    python -m app.services.reverse_ip import dump.jsonl [--db path]
+    python -m app.services.reverse_ip lookup 93.184.216.34 [--scope subnet]
+
+Поддържани редове: JSON ({"rrname", "rrtype", "rdata", "time_last"} или
+{"domain", "ip"}) и текст "домейн IP" / "IP,домейн" (разделител интервал,
+таб или запетая).
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from app.config import settings
+
+
+_V4_MAPPED_PREFIX = b'\x00' * 10 + b'\xff\xff'
+
+
+class ReverseIPIndex:
+    """Постоянен обратен индекс IP / подмрежа / ASN -> домейни."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        # IPv4 се пази като IPv4-mapped IPv6, за да са всички ключове по 16 байта
+        # и range заявките по подмрежа да не хващат адреси от другото семейство
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS ip_domains ('
+            ' ip BLOB NOT NULL, domain TEXT NOT NULL,'
+            ' first_seen INTEGER NOT NULL, last_seen INTEGER NOT NULL,'
+            ' PRIMARY KEY (ip, domain)) WITHOUT ROWID'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS asn_domains ('
+            ' asn INTEGER NOT NULL, domain TEXT NOT NULL, last_seen INTEGER NOT NULL,'
+            ' PRIMARY KEY (asn, domain)) WITHOUT ROWID'
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA cache_size=-65536')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(ip: str) -> Optional[bytes]:
+        # inet_pton вместо ipaddress - при масов внос парсването на адресите доминира
+        ip = ip.strip().strip('[]')
+        try:
+            return _V4_MAPPED_PREFIX + socket.inet_pton(socket.AF_INET, ip)
+        except OSError:
+            pass
+        try:
+            return socket.inet_pton(socket.AF_INET6, ip)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _subnet_bounds(key: bytes) -> Tuple[bytes, bytes]:
+        # /24 за IPv4 (последният байт), /48 за IPv6 (последните 10 байта)
+        prefix = 15 if key.startswith(_V4_MAPPED_PREFIX) else 6
+        padding = 16 - prefix
+        return key[:prefix] + b'\x00' * padding, key[:prefix] + b'\xff' * padding
+
+    @staticmethod
+    def _clean_domain(domain: str) -> str:
+        return domain.strip().lower().rstrip('.').split(':')[0]
+
+    def add(self, domain: str, ip: str, asn: Optional[int] = None, seen_at: Optional[int] = None) -> bool:
+        """Добавя (или опреснява) двойката домейн -> IP."""
+        return self.add_many([(domain, ip, asn, seen_at)]) > 0
+
+    def add_many(self, entries: Iterable[Tuple[str, str, Optional[int], Optional[int]]],
+                 batch_size: int = 200000) -> int:
+        """
+        Добавя (домейн, IP, ASN, unix time) записи на партиди в отделни
+        транзакции. Връща броя на валидните записи.
+        """
+        conn = self._connection()
+        now = int(time.time())
+        total = 0
+        ip_rows: List[tuple] = []
+        asn_rows: List[tuple] = []
+
+        def flush():
+            # Сортираните по ключ партиди се вмъкват с по-малко разместване на B-дървото
+            ip_rows.sort()
+            asn_rows.sort()
+            with conn:
+                conn.executemany(
+                    'INSERT INTO ip_domains (ip, domain, first_seen, last_seen) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT (ip, domain) DO UPDATE SET'
+                    ' first_seen = min(first_seen, excluded.first_seen),'
+                    ' last_seen = max(last_seen, excluded.last_seen)',
+                    ip_rows
+                )
+                if asn_rows:
+                    conn.executemany(
+                        'INSERT INTO asn_domains (asn, domain, last_seen) VALUES (?, ?, ?) '
+                        'ON CONFLICT (asn, domain) DO UPDATE SET'
+                        ' last_seen = max(last_seen, excluded.last_seen)',
+                        asn_rows
+                    )
+            ip_rows.clear()
+            asn_rows.clear()
+
+        for domain, ip, asn, seen_at in entries:
+            key = self._key(ip)
+            domain = self._clean_domain(domain)
+            if key is None or not domain or self._key(domain) is not None:
+                # Невалиден IP или "домейн", който всъщност е IP адрес
+                continue
+            seen_at = int(seen_at or now)
+            ip_rows.append((key, domain, seen_at, seen_at))
+            if asn:
+                asn_rows.append((int(asn), domain, seen_at))
+            total += 1
+            if len(ip_rows) >= batch_size:
+                flush()
+        if ip_rows:
+            flush()
+        return total
+
+    def domains_for_ip(self, ip: str, exclude: Optional[str] = None, limit: int = 100) -> List[str]:
+        key = self._key(ip)
+        if key is None:
+            return []
+        rows = self._connection().execute(
+            'SELECT domain FROM ip_domains WHERE ip = ? AND domain != ? ORDER BY domain LIMIT ?',
+            (key, self._clean_domain(exclude or ''), limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def domains_for_subnet(self, ip: str, exclude: Optional[str] = None, limit: int = 100) -> List[str]:
+        """Домейни в същата /24 (IPv4) или /48 (IPv6) мрежа."""
+        key = self._key(ip)
+        if key is None:
+            return []
+        low, high = self._subnet_bounds(key)
+        rows = self._connection().execute(
+            'SELECT DISTINCT domain FROM ip_domains WHERE ip BETWEEN ? AND ? AND domain != ? LIMIT ?',
+            (low, high, self._clean_domain(exclude or ''), limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def domains_for_asn(self, asn: int, exclude: Optional[str] = None, limit: int = 100) -> List[str]:
+        rows = self._connection().execute(
+            'SELECT domain FROM asn_domains WHERE asn = ? AND domain != ? ORDER BY domain LIMIT ?',
+            (int(asn), self._clean_domain(exclude or ''), limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def import_dump(self, lines: Iterable[str]) -> int:
+        """Внася passive DNS дъмп (виж описанието на модула). Връща броя записи."""
+        return self.add_many(parse_dump(lines))
+
+    def stats(self) -> dict:
+        conn = self._connection()
+        return {
+            'path': self.path,
+            'ip_entries': conn.execute('SELECT count(*) FROM ip_domains').fetchone()[0],
+            'asn_entries': conn.execute('SELECT count(*) FROM asn_domains').fetchone()[0],
+        }
+
+
+def parse_dump(lines: Iterable[str]) -> Iterator[Tuple[str, str, Optional[int], Optional[int]]]:
+    """(домейн, IP, None, unix time) от редовете на passive DNS дъмп."""
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('{'):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'rrname' in record:
+                if str(record.get('rrtype', 'A')).upper() not in ('A', 'AAAA'):
+                    continue
+                seen_at = record.get('time_last') or record.get('time_first')
+                rdata = record.get('rdata')
+                for ip in rdata if isinstance(rdata, list) else [rdata]:
+                    if ip:
+                        yield str(record['rrname']), str(ip), None, _timestamp(seen_at)
+            elif record.get('domain') and record.get('ip'):
+                yield str(record['domain']), str(record['ip']), record.get('asn'), _timestamp(record.get('seen_at'))
+            continue
+
+        parts = line.replace(',', ' ').replace('\t', ' ').split()
+        if len(parts) < 2:
+            continue
+        first, second = parts[0], parts[1]
+        if ReverseIPIndex._key(first) is not None:
+            yield second, first, None, None
+        else:
+            yield first, second, None, None
+
+
+def _timestamp(value) -> Optional[int]:
+    try:
+        return int(float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+_default_index: Optional[ReverseIPIndex] = None
+_default_loaded = False
+
+
+def get_reverse_index() -> Optional[ReverseIPIndex]:
+    """Споделеният индекс от SEOAPP_REVERSE_IP_PATH (None, ако е изключен)."""
+    global _default_index, _default_loaded
+    if not _default_loaded:
+        _default_loaded = True
+        if settings.reverse_ip_path:
+            _default_index = ReverseIPIndex(settings.reverse_ip_path)
+    return _default_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=settings.reverse_ip_path, help='път до SQLite файла')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='внася passive DNS дъмп ("-" за stdin)')
+    import_parser.add_argument('files', nargs='+')
+
+    lookup_parser = commands.add_parser('lookup', help='домейни за IP / подмрежа / ASN')
+    lookup_parser.add_argument('value')
+    lookup_parser.add_argument('--scope', choices=('ip', 'subnet', 'asn'), default='ip')
+    lookup_parser.add_argument('--limit', type=int, default=100)
+
+    args = parser.parse_args()
+    if not args.db:
+        parser.error('няма път до индекса (--db или SEOAPP_REVERSE_IP_PATH)')
+    index = ReverseIPIndex(args.db)
+
+    if args.command == 'import':
+        total = 0
+        started = time.perf_counter()
+        for path in args.files:
+            if path == '-':
+                total += index.import_dump(sys.stdin)
+            else:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    total += index.import_dump(f)
+        print(json.dumps({'imported': total, 'seconds': round(time.perf_counter() - started, 2),
+                          **index.stats()}, indent=2))
+    else:
+        started = time.perf_counter()
+        if args.scope == 'asn':
+            domains = index.domains_for_asn(int(args.value.upper().lstrip('AS')), limit=args.limit)
+        elif args.scope == 'subnet':
+            domains = index.domains_for_subnet(args.value, limit=args.limit)
+        else:
+            domains = index.domains_for_ip(args.value, limit=args.limit)
+        print(json.dumps({'domains': domains, 'ms': round((time.perf_counter() - started) * 1000, 3)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,66 +1,77 @@
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple, Union
+from app.services.document import ParsedDocument
 import re
 
 
+def resolve_link(base_url: str, href: str) -> Optional[str]:
+    """Абсолютен http(s) URL без fragment или None за празни и други схеми."""
+    href = href.strip()
+    if not href:
+        return None
+    absolute_url = urljoin(base_url, href).split('#', 1)[0]
+    if urlparse(absolute_url).scheme not in ('http', 'https'):
+        return None
+    return absolute_url
+
+
 class SEOParser:
     """Парсва on-page SEO данни от HTML."""
     
-    def parse(self, html: str, base_url: str) -> dict:
-        soup = BeautifulSoup(html, 'lxml')
+    def parse(self, document: Union[ParsedDocument, str], base_url: str) -> dict:
+        doc = ParsedDocument.ensure(document)
         parsed_base = urlparse(base_url)
         base_domain = f"{parsed_base.scheme}://{parsed_base.netloc}"
         
         result = {
-            'title': self._get_title(soup),
-            'meta_description': self._get_meta_description(soup),
-            'language': self._get_language(soup),
-            'page_size': len(html.encode('utf-8')),
-            'text_size': len(soup.get_text()),
-            'text_to_code_ratio': self._calculate_text_ratio(html, soup),
-            'headings': self._get_headings(soup),
-            'links': self._analyze_links(soup, base_domain),
-            'images': self._analyze_images(soup)
+            'title': self._get_title(doc),
+            'meta_description': self._get_meta_description(doc),
+            'language': self._get_language(doc),
+            'page_size': doc.size_bytes,
+            'text_size': len(doc.text),
+            'text_to_code_ratio': self._calculate_text_ratio(doc),
+            'headings': self._get_headings(doc),
+            'links': self._analyze_links(doc, base_domain),
+            'images': self._analyze_images(doc)
         }
         
         return result
     
-    def _get_title(self, soup: BeautifulSoup) -> str:
+    def _get_title(self, doc: ParsedDocument) -> str:
         """Взима title tag."""
-        title_tag = soup.find('title')
+        title_tag = doc.find('title')
         return title_tag.get_text(strip=True) if title_tag else ''
     
-    def _get_meta_description(self, soup: BeautifulSoup) -> str:
+    def _get_meta_description(self, doc: ParsedDocument) -> str:
         """Взима meta description."""
-        meta_desc = soup.find('meta', {'name': 'description'})
+        meta_desc = doc.find('meta', {'name': 'description'})
         if not meta_desc:
-            meta_desc = soup.find('meta', {'property': 'og:description'})
+            meta_desc = doc.find('meta', {'property': 'og:description'})
         return meta_desc.get('content', '') if meta_desc else ''
     
-    def _get_language(self, soup: BeautifulSoup) -> str:
+    def _get_language(self, doc: ParsedDocument) -> str:
         """Взима език на страницата."""
-        html_tag = soup.find('html')
+        html_tag = doc.find('html')
         if html_tag:
             lang = html_tag.get('lang')
             if lang:
                 return lang
         
-        meta_lang = soup.find('meta', {'http-equiv': 'Content-Language'})
+        meta_lang = doc.find('meta', {'http-equiv': 'Content-Language'})
         if meta_lang:
             return meta_lang.get('content', '')
         
         return ''
     
-    def _calculate_text_ratio(self, html: str, soup: BeautifulSoup) -> float:
+    def _calculate_text_ratio(self, doc: ParsedDocument) -> float:
         """Изчислява text-to-code ratio."""
-        text_size = len(soup.get_text())
-        total_size = len(html)
+        text_size = len(doc.text)
+        total_size = len(doc.html)
         if total_size == 0:
             return 0.0
         return round((text_size / total_size) * 100, 2)
     
-    def _get_headings(self, soup: BeautifulSoup) -> dict:
+    def _get_headings(self, doc: ParsedDocument) -> dict:
         """Взима всички headings H1-H6."""
         headings = {
             'h1': {'count': 0, 'content': []},
@@ -73,15 +84,15 @@ class SEOParser:
         
         for level in range(1, 7):
             tag_name = f'h{level}'
-            tags = soup.find_all(tag_name)
+            tags = doc.find_all(tag_name)
             headings[tag_name]['count'] = len(tags)
             headings[tag_name]['content'] = [tag.get_text(strip=True) for tag in tags]
         
         return headings
     
-    def _analyze_links(self, soup: BeautifulSoup, base_domain: str) -> dict:
+    def _analyze_links(self, doc: ParsedDocument, base_domain: str) -> dict:
         """Анализира всички линкове."""
-        links = soup.find_all('a', href=True)
+        links = doc.find_all('a', {'href': True})
         
         internal = []
         external = []
@@ -129,9 +140,61 @@ class SEOParser:
             'duplicated': len(duplicated)
         }
     
-    def _analyze_images(self, soup: BeautifulSoup) -> dict:
+    def internal_links(self, document: Union[ParsedDocument, str], base_url: str) -> List[str]:
+        """
+        Връща уникалните вътрешни http(s) линкове, resolve-нати спрямо URL-а на
+        страницата и без fragment.
+        """
+        doc = ParsedDocument.ensure(document)
+        base_netloc = urlparse(base_url).netloc
+        links = {}
+
+        for link in doc.find_all('a', {'href': True}):
+            absolute_url = resolve_link(base_url, link.get('href', ''))
+            if absolute_url and urlparse(absolute_url).netloc == base_netloc:
+                links[absolute_url] = True
+
+        return list(links)
+
+    def link_urls(self, document: Union[ParsedDocument, str], base_url: str,
+                  limit: int) -> Tuple[List[str], bool]:
+        """
+        Уникалните http(s) линкове (вътрешни и външни) за проверка - най-много
+        limit; втората стойност е True, ако на страницата има още.
+        """
+        doc = ParsedDocument.ensure(document)
+        links = {}
+
+        for link in doc.find_all('a', {'href': True}):
+            absolute_url = resolve_link(base_url, link.get('href', ''))
+            if absolute_url and absolute_url not in links:
+                if len(links) >= limit:
+                    return list(links), True
+                links[absolute_url] = True
+
+        return list(links), False
+
+    def image_urls(self, document: Union[ParsedDocument, str], base_url: str,
+                   limit: int) -> Tuple[List[str], bool]:
+        """
+        Уникалните http(s) адреси от <img src> за одит - най-много limit;
+        втората стойност е True, ако на страницата има още.
+        """
+        doc = ParsedDocument.ensure(document)
+        images = {}
+
+        for img in doc.find_all('img', {'src': True}):
+            absolute_url = resolve_link(base_url, img.get('src', ''))
+            if absolute_url and absolute_url not in images:
+                if len(images) >= limit:
+                    return list(images), True
+                images[absolute_url] = True
+
+        return list(images), False
+
+    def _analyze_images(self, doc: ParsedDocument) -> dict:
         """Анализира всички изображения."""
-        images = soup.find_all('img')
+        images = doc.find_all('img')
         
         missing_alt = []
         duplicated = []
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from app.services.metrics import REGISTRY
+
+
+SINGLE_FLIGHT_CALLS = REGISTRY.counter(
+    'seoapp_single_flight_calls_total',
+    'Извиквания през single-flight по вид (leader - изчислява, follower - изчаква чуждо изчисление)',
+    ('flight', 'role')
+)
+SINGLE_FLIGHT_CANCELLED = REGISTRY.counter(
+    'seoapp_single_flight_cancelled_total',
+    'Споделени изчисления, прекъснати след като всички чакащи са се отказали', ('flight',)
+)
+
+
+class _Call:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Обединява едновременните изчисления с един и същ ключ.
+
+    Първото извикване (leader) стартира изчислението като отделна задача, а
+    следващите за същия ключ (followers) чакат нейния резултат или грешка.
+    Задачата не принадлежи на никой от чакащите: прекъснат клиент само
+    престава да чака (asyncio.shield), а изчислението се прекъсва едва когато
+    не остане нито един чакащ. След завършване ключът се освобождава -
+    кеширането на резултата е работа на извикващия.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(compute()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._release(key, call))
+            self.leaders += 1
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='leader')
+        else:
+            self.followers += 1
+            SINGLE_FLIGHT_CALLS.inc(flight=self.name, role='follower')
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Никой не чака резултата - нови извиквания започват наново
+                self._release(key, call)
+                call.task.cancel()
+                SINGLE_FLIGHT_CANCELLED.inc(flight=self.name)
+
+    def _release(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        total = self.leaders + self.followers
+        return {
+            'inflight': len(self._calls),
+            'waiters': sum(call.waiters for call in self._calls.values()),
+            'leaders': self.leaders,
+            'followers': self.followers,
+            'coalesced_ratio': round(self.followers / total, 4) if total else 0.0,
+        }
+
+
+_flights: Dict[str, SingleFlight] = {}
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Споделеният за процеса SingleFlight с това име (по един за всеки вид изчисление)."""
+    flight = _flights.get(name)
+    if flight is None:
+        flight = _flights[name] = SingleFlight(name)
+    return flight
+
+
+def single_flight_stats() -> Dict[str, dict]:
+    return {name: flight.stats() for name, flight in _flights.items()}
@@ -0,0 +1,391 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+
+from app.services.crawler import WebsiteCrawler
+from app.services.html_pool import HTMLAnalysisPool, analyze_html
+from app.services.http_client import HTTPClientPool
+from app.services.limits import KeyedLimiter
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Нормализира URL за дедупликация: малки букви за схема/host, без fragment и порт по подразбиране."""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    netloc = host
+    if parsed.port and parsed.port != DEFAULT_PORTS.get(scheme):
+        netloc = f'{host}:{parsed.port}'
+    path = parsed.path or '/'
+    return urlunparse((scheme, netloc, path, parsed.params, parsed.query, ''))
+
+
+class VisitedSet:
+    """
+    Компактно множество от посетени URL-и: пази само 64-битов хеш на URL-а
+    (blake2b), вместо самия низ. Вероятността за колизия при 50k URL-а е
+    пренебрежимо малка.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+
+    @staticmethod
+    def _hash(url: str) -> int:
+        return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    def add(self, url: str) -> bool:
+        """Добавя URL-а; връща False, ако вече е бил посетен."""
+        digest = self._hash(url)
+        if digest in self._hashes:
+            return False
+        self._hashes.add(digest)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return self._hash(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def dumps(self) -> str:
+        return base64.b64encode(array('Q', self._hashes).tobytes()).decode('ascii')
+
+    @classmethod
+    def loads(cls, data: str) -> 'VisitedSet':
+        visited = cls()
+        hashes = array('Q')
+        hashes.frombytes(base64.b64decode(data))
+        visited._hashes = set(hashes)
+        return visited
+
+
+class SiteAggregate:
+    """Натрупва обобщени данни за сайта от анализите на отделните страници."""
+
+    def __init__(self):
+        self.pages = 0
+        self.errors = 0
+        self.status_codes: Dict[str, int] = {}
+        self.technologies: Dict[str, int] = {}
+        self.cms: Dict[str, int] = {}
+        self.missing_title = 0
+        self.missing_meta_description = 0
+        self.missing_h1 = 0
+        self.multiple_h1 = 0
+        self.title_counts: Dict[str, int] = {}
+        self.links = {'internal': 0, 'external': 0, 'nofollow': 0}
+        self.images_missing_alt = 0
+        self.text_to_code_ratio_sum = 0.0
+        self.page_size_sum = 0
+
+    def add_error(self):
+        self.errors += 1
+
+    def add_page(self, status_code: int, technology: dict, seo: dict):
+        self.pages += 1
+        code = str(status_code)
+        self.status_codes[code] = self.status_codes.get(code, 0) + 1
+
+        if technology.get('cms'):
+            self.cms[technology['cms']] = self.cms.get(technology['cms'], 0) + 1
+        for key in ('plugins', 'javascript_libraries', 'tag_managers', 'social_embeds'):
+            for name in technology.get(key, []):
+                self.technologies[name] = self.technologies.get(name, 0) + 1
+
+        title = seo.get('title', '')
+        if not title:
+            self.missing_title += 1
+        else:
+            self.title_counts[title] = self.title_counts.get(title, 0) + 1
+        if not seo.get('meta_description'):
+            self.missing_meta_description += 1
+
+        h1_count = seo.get('headings', {}).get('h1', {}).get('count', 0)
+        if h1_count == 0:
+            self.missing_h1 += 1
+        elif h1_count > 1:
+            self.multiple_h1 += 1
+
+        for key in self.links:
+            self.links[key] += seo.get('links', {}).get(key, 0)
+        self.images_missing_alt += seo.get('images', {}).get('missing_alt', 0)
+        self.text_to_code_ratio_sum += seo.get('text_to_code_ratio', 0.0)
+        self.page_size_sum += seo.get('page_size', 0)
+
+    def to_dict(self) -> dict:
+        duplicated_titles = {title: count for title, count in self.title_counts.items() if count > 1}
+        return {
+            'pages_analyzed': self.pages,
+            'pages_failed': self.errors,
+            'status_codes': self.status_codes,
+            'cms': self.cms,
+            'technologies': dict(sorted(self.technologies.items(), key=lambda item: -item[1])),
+            'missing_title': self.missing_title,
+            'missing_meta_description': self.missing_meta_description,
+            'missing_h1': self.missing_h1,
+            'multiple_h1': self.multiple_h1,
+            'duplicated_titles': dict(sorted(duplicated_titles.items(), key=lambda item: -item[1])[:50]),
+            'links': self.links,
+            'images_missing_alt': self.images_missing_alt,
+            'average_text_to_code_ratio': round(self.text_to_code_ratio_sum / self.pages, 2) if self.pages else 0.0,
+            'average_page_size': int(self.page_size_sum / self.pages) if self.pages else 0,
+        }
+
+    def state(self) -> dict:
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_state(cls, state: dict) -> 'SiteAggregate':
+        aggregate = cls()
+        aggregate.__dict__.update(state)
+        return aggregate
+
+
+class SiteCrawler:
+    """
+    Breadth-first обхождане на вътрешните линкове на сайт.
+
+    Спазва максимална дълбочина и брой страници, минимално забавяне и
+    ограничен брой едновременни заявки към host, а frontier-ът периодично
+    се записва на диск, така че обхождането да продължи след рестарт.
+    Всяка страница минава през analyze_html - в process pool-а, ако има
+    такъв, иначе в отделна нишка, за да не блокира event loop-а.
+
+    Данните по страници не се пазят в паметта - дописват се в
+    <checkpoint_path>.pages.jsonl (за /crawl/{id}/export), а checkpoint-ът
+    съдържа само frontier-а, посетените URL-и и обобщението.
+    """
+
+    def __init__(self, http_pool: Optional[HTTPClientPool] = None, max_depth: int = 2,
+                 max_pages: int = 100, per_host_delay: float = 1.0, concurrency: int = 4,
+                 per_host_concurrency: int = 2, checkpoint_path: Optional[str] = None,
+                 checkpoint_every: int = 25, html_pool: Optional[HTMLAnalysisPool] = None,
+                 link_limit: int = 5000):
+        self.http_pool = http_pool
+        self.html_pool = html_pool
+        # Най-много толкова линка от страница се добавят към frontier-а
+        self.link_limit = link_limit
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.per_host_delay = per_host_delay
+        self.concurrency = max(1, concurrency)
+        self.hosts = KeyedLimiter(per_host_concurrency)
+        self.checkpoint_path = checkpoint_path
+        # Страниците се дописват в отделен JSONL файл, за да не се презаписват при всеки checkpoint
+        self.pages_path = f'{checkpoint_path}.pages.jsonl' if checkpoint_path else None
+        self.checkpoint_every = max(1, checkpoint_every)
+
+        self.start_url: Optional[str] = None
+        self.frontier: Deque[Tuple[str, int]] = deque()
+        self.visited = VisitedSet()
+        self.in_progress: Dict[str, int] = {}
+        self.aggregate = SiteAggregate()
+        self.pages_written = 0
+        self.resumed = False
+        self._next_request_at: Dict[str, float] = {}
+        self._since_checkpoint = 0
+        self._pages_file = None
+
+    async def crawl(self, start_url: str) -> Dict[str, Any]:
+        """Обхожда сайта от start_url и връща обобщението и броя записани страници."""
+        self.start_url = normalize_url(start_url)
+        if not self._load_checkpoint():
+            self.visited.add(self.start_url)
+            self.frontier.append((self.start_url, 0))
+        if self.pages_path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.pages_path)), exist_ok=True)
+            self._pages_file = open(self.pages_path, 'a' if self.resumed else 'w', encoding='utf-8')
+
+        crawler = WebsiteCrawler(http_pool=self.http_pool)
+        wakeup = asyncio.Event()
+
+        async def worker():
+            while True:
+                if self.pages_written + len(self.in_progress) >= self.max_pages:
+                    return
+                if not self.frontier:
+                    if not self.in_progress:
+                        return
+                    # Чакаме другите worker-и да добавят нови линкове
+                    wakeup.clear()
+                    await wakeup.wait()
+                    continue
+                url, depth = self.frontier.popleft()
+                self.in_progress[url] = depth
+                try:
+                    await self._process(crawler, url, depth)
+                finally:
+                    self.in_progress.pop(url, None)
+                    wakeup.set()
+                    await self._maybe_checkpoint()
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+            completed = not self.frontier
+            self._save_checkpoint(completed=completed)
+        finally:
+            await crawler.close()
+            if self._pages_file is not None:
+                self._pages_file.close()
+        return {
+            'start_url': self.start_url,
+            'resumed': self.resumed,
+            'completed': completed,
+            'frontier_remaining': len(self.frontier),
+            'urls_discovered': len(self.visited),
+            'summary': self.aggregate.to_dict(),
+            'pages_written': self.pages_written,
+            'pages_path': self.pages_path,
+        }
+
+    async def _process(self, crawler: WebsiteCrawler, url: str, depth: int):
+        host = urlparse(url).netloc
+        async with self.hosts.slot(host):
+            await self._respect_delay(host)
+            try:
+                crawl_data = await crawler.fetch(url)
+            except Exception as e:
+                self.aggregate.add_error()
+                self._add_page({'url': url, 'depth': depth, 'error': str(e)})
+                return
+
+        page = {'url': url, 'depth': depth, 'status_code': crawl_data['status_code'],
+                'final_url': crawl_data['final_url']}
+        content_type = crawl_data['headers'].get('content-type', '')
+        if 'html' not in content_type.lower():
+            page['skipped'] = f'content-type {content_type}'
+            self._add_page(page)
+            return
+
+        link_limit = self.link_limit if depth < self.max_depth else 0
+        try:
+            if self.html_pool is not None:
+                sections = await self.html_pool.run(
+                    crawl_data['html'], crawl_data['headers'], url, crawl_data['final_url'],
+                    wait=True, link_limit=link_limit
+                )
+            else:
+                sections = await asyncio.to_thread(
+                    analyze_html, crawl_data['html'], crawl_data['headers'], url, crawl_data['final_url'],
+                    None, link_limit
+                )
+        except Exception as e:
+            # Напр. умрял worker на pool-а - страницата се отчита като грешка
+            self.aggregate.add_error()
+            page['error'] = f"Грешка при анализа: {str(e) or type(e).__name__}"
+            self._add_page(page)
+            return
+        technology = sections['technology_detection']
+        seo = sections['on_page_seo']
+        metadata = sections['metadata_and_structured_data']
+        self.aggregate.add_page(crawl_data['status_code'], technology, seo)
+
+        page.update({
+            'title': seo['title'],
+            'h1_count': seo['headings']['h1']['count'],
+            'canonical': metadata['canonical'],
+            'robots_meta': metadata['robots_meta'],
+        })
+        self._add_page(page)
+
+        if depth >= self.max_depth:
+            return
+        start_netloc = urlparse(self.start_url).netloc
+        for link in sections.get('links_to_check', {}).get('urls', []):
+            try:
+                link = normalize_url(link)
+            except ValueError:
+                continue
+            # Редиректът може да изведе извън сайта - следваме само началния host
+            if urlparse(link).netloc == start_netloc and self.visited.add(link):
+                self.frontier.append((link, depth + 1))
+
+    def _add_page(self, page: dict):
+        self.pages_written += 1
+        if self._pages_file is not None:
+            self._pages_file.write(json.dumps(page, ensure_ascii=False) + '\n')
+
+    async def _respect_delay(self, host: str):
+        """Минимално забавяне между две заявки към един и същ host."""
+        now = time.monotonic()
+        ready_at = self._next_request_at.get(host, now)
+        self._next_request_at[host] = max(ready_at, now) + self.per_host_delay
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    async def _maybe_checkpoint(self):
+        self._since_checkpoint += 1
+        if self.checkpoint_path and self._since_checkpoint >= self.checkpoint_every:
+            # Състоянието се копира в event loop-а, а записът на диск е в отделна нишка
+            state = self._checkpoint_state()
+            await asyncio.to_thread(self._write_checkpoint, state)
+
+    def _save_checkpoint(self, completed: bool = False):
+        if self.checkpoint_path:
+            self._write_checkpoint(self._checkpoint_state(completed))
+
+    def _checkpoint_state(self, completed: bool = False) -> dict:
+        self._since_checkpoint = 0
+        if self._pages_file is not None:
+            self._pages_file.flush()
+        # Страниците в процес на обработка се връщат във frontier-а
+        return {
+            'start_url': self.start_url,
+            'completed': completed,
+            'frontier': list(self.in_progress.items()) + list(self.frontier),
+            'visited': self.visited.dumps(),
+            'aggregate': json.loads(json.dumps(self.aggregate.state())),
+            'pages_written': self.pages_written,
+        }
+
+    def _write_checkpoint(self, state: dict):
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _load_checkpoint(self) -> bool:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return False
+        with open(self.checkpoint_path, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('start_url') != self.start_url or state.get('completed'):
+            return False
+        self.frontier = deque((url, depth) for url, depth in state['frontier'])
+        self.visited = VisitedSet.loads(state['visited'])
+        self.aggregate = SiteAggregate.from_state(state['aggregate'])
+        self.pages_written = self._truncate_pages(state.get('pages_written', 0))
+        self.resumed = True
+        return True
+
+    def _truncate_pages(self, count: int) -> int:
+        """
+        Отрязва редовете, записани след checkpoint-а (страниците им са отново
+        във frontier-а), без да чете файла в паметта. Връща броя на редовете.
+        """
+        if not self.pages_path or not os.path.exists(self.pages_path):
+            return 0
+        lines = 0
+        with open(self.pages_path, 'r+b') as f:
+            while lines < count:
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    # Недописан последен ред
+                    f.seek(-len(line), os.SEEK_CUR)
+                    break
+                lines += 1
+            f.truncate()
+        return lines
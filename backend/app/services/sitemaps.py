@@ -0,0 +1,555 @@
+import asyncio
+import re
+import zlib
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import quote, urljoin, urlsplit
+
+import httpx
+from lxml import etree
+
+from app.config import Settings, settings as default_settings
+from app.services.batch import spool_stream
+from app.services.http_client import HTTPClientPool
+from app.services.metrics import REGISTRY
+from app.services.site_crawler import VisitedSet, normalize_url
+from app.services.ttl_cache import MISSING, TTLCache
+
+
+SITEMAP_FETCHES = REGISTRY.counter(
+    'seoapp_sitemap_fetches_total', 'Прочетени sitemap файлове по резултат', ('result',)
+)
+SITEMAP_URLS = REGISTRY.counter(
+    'seoapp_sitemap_urls_total', 'URL-и от sitemap-ите по резултат', ('result',)
+)
+
+# RFC 9309: парсват се поне първите 500 KiB на robots.txt
+ROBOTS_MAX_BYTES = 500 * 1024
+# ASCII символите, които не се кодират при сравнението на пътища с правилата
+_ROBOTS_SAFE = ''.join(chr(code) for code in range(0x21, 0x7F))
+# Парче на декомпресирания поток - ограничава паметта и при "gzip бомби"
+_INFLATE_CHUNK = 256 * 1024
+_READ_CHUNK = 64 * 1024
+_MAX_TEXT_LINE = 8 * 1024
+
+
+class SitemapError(Exception):
+    """Sitemap файлът не може да бъде прочетен или е невалиден."""
+
+
+def _encode_path(value: str) -> str:
+    # Правилата и пътищата се сравняват percent-encoded (не-ASCII и интервали)
+    return quote(value, safe=_ROBOTS_SAFE)
+
+
+def _pattern_regex(pattern: str) -> str:
+    """Regex за правило от robots.txt: * е произволна последователност, $ в края - край на пътя."""
+    anchored = pattern.endswith('$')
+    if anchored:
+        pattern = pattern[:-1]
+    regex = '.*'.join(re.escape(part) for part in _encode_path(pattern).split('*'))
+    return regex + ('$' if anchored else '')
+
+
+class RobotsRules:
+    """
+    Правилата от robots.txt за един user agent, компилирани в един regex.
+
+    Правилата се подреждат по дължина (най-дългото първо, при равна дължина
+    Allow преди Disallow) и стават алтернативи на обща регулярна израз -
+    първата съвпаднала алтернатива е най-специфичното правило (RFC 9309), а
+    проверката на URL е едно извикване на match().
+    """
+
+    def __init__(self, rules: Optional[List[Tuple[bool, str]]] = None,
+                 sitemaps: Optional[List[str]] = None,
+                 crawl_delay: Optional[float] = None,
+                 group: Optional[str] = None,
+                 url: Optional[str] = None,
+                 status: Optional[int] = None,
+                 disallow_all: bool = False,
+                 error: Optional[str] = None):
+        ordered = sorted(set(rules or []), key=lambda rule: (-len(rule[1]), not rule[0]))
+        self.allow_rules = sum(1 for allow, _ in ordered if allow)
+        self.disallow_rules = len(ordered) - self.allow_rules
+        self.sitemaps = list(dict.fromkeys(sitemaps or []))
+        self.crawl_delay = crawl_delay
+        self.group = group
+        self.url = url
+        self.status = status
+        self.disallow_all = disallow_all
+        self.error = error
+        self._allow = [allow for allow, _ in ordered]
+        self._matcher = re.compile(
+            '|'.join(f'({_pattern_regex(pattern)})' for _, pattern in ordered)
+        ) if ordered else None
+
+    def allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if path == '/robots.txt':
+            return True
+        if self.disallow_all:
+            return False
+        if self._matcher is None:
+            return True
+        if parts.query:
+            path = f'{path}?{parts.query}'
+        match = self._matcher.match(_encode_path(path))
+        return match is None or self._allow[match.lastindex - 1]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'status': self.status,
+            'found': self.status is not None and 200 <= self.status < 300,
+            'user_agent_group': self.group,
+            'allow_rules': self.allow_rules,
+            'disallow_rules': self.disallow_rules,
+            'disallow_all': self.disallow_all,
+            'crawl_delay': self.crawl_delay,
+            'sitemaps': self.sitemaps,
+            'error': self.error,
+        }
+
+
+def parse_robots(text: str, user_agent: str = '*', url: Optional[str] = None,
+                 status: Optional[int] = None) -> RobotsRules:
+    """
+    Парсва robots.txt и избира групата за user_agent (product token, без
+    значение на регистъра); без такава група се използват групите за *.
+    Групите за един агент се обединяват, а Sitemap редовете са глобални.
+    """
+    token = user_agent.strip().lower()
+    groups: List[Tuple[List[str], List[Tuple[bool, str]], List[float]]] = []
+    sitemaps: List[str] = []
+    agents: List[str] = []
+    rules: List[Tuple[bool, str]] = []
+    delays: List[float] = []
+    in_rules = False
+
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        key, separator, value = line.partition(':')
+        if not separator:
+            continue
+        key = key.strip().lower()
+        value = value.strip()
+
+        if key == 'user-agent':
+            if in_rules:
+                agents, rules, delays = [], [], []
+                in_rules = False
+            if not agents:
+                groups.append((agents, rules, delays))
+            agents.append(value.lower())
+        elif key in ('allow', 'disallow'):
+            in_rules = True
+            if agents and value:
+                rules.append((key == 'allow', value))
+        elif key == 'crawl-delay':
+            in_rules = True
+            try:
+                delays.append(float(value))
+            except ValueError:
+                pass
+        elif key == 'sitemap' and value:
+            sitemaps.append(urljoin(url, value) if url else value)
+
+    selected = [group for group in groups if token != '*' and token in group[0]]
+    group = token if selected else None
+    if not selected:
+        selected = [group for group in groups if '*' in group[0]]
+        group = '*' if selected else None
+
+    return RobotsRules(
+        rules=[rule for _, group_rules, _ in selected for rule in group_rules],
+        sitemaps=sitemaps,
+        crawl_delay=max((delay for _, _, group_delays in selected for delay in group_delays), default=None),
+        group=group,
+        url=url,
+        status=status,
+    )
+
+
+def _local_name(tag: Any) -> str:
+    return tag.rpartition('}')[2] if isinstance(tag, str) else ''
+
+
+class SitemapParser:
+    """
+    Инкрементален парсер на един sitemap файл (urlset, sitemapindex или
+    текстов списък с URL-и), по избор gzip-нат.
+
+    feed() приема поредното парче байтове и връща готовите записи
+    ('url' | 'sitemap', loc, lastmod). Gzip се разпознава по magic байтовете и
+    се декомпресира на парчета, XML-ът минава през lxml XMLPullParser, а
+    обработените <url>/<sitemap> елементи се изтриват от дървото - паметта не
+    зависи от размера на файла.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.kind: Optional[str] = None
+        self.gzip = False
+        self.size = 0
+        self._head = b''
+        self._inflater = None
+        self._xml: Optional[etree.XMLPullParser] = None
+        self._text = b''
+        self._started = False
+
+    def feed(self, chunk: bytes) -> List[Tuple[str, str, Optional[str]]]:
+        if not self._started:
+            self._head += chunk
+            if len(self._head) < 2:
+                return []
+            chunk, self._head = self._head, b''
+            self._started = True
+            if chunk[:2] == b'\x1f\x8b':
+                self.gzip = True
+                self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+        if self._inflater is None:
+            return self._parse(chunk)
+
+        entries = []
+        try:
+            data = self._inflater.decompress(chunk, _INFLATE_CHUNK)
+            while True:
+                entries.extend(self._parse(data))
+                if not self._inflater.unconsumed_tail:
+                    break
+                data = self._inflater.decompress(self._inflater.unconsumed_tail, _INFLATE_CHUNK)
+        except zlib.error as e:
+            raise SitemapError(f'Невалиден gzip: {e}')
+        return entries
+
+    def close(self) -> List[Tuple[str, str, Optional[str]]]:
+        entries = []
+        if not self._started:
+            # Файл, по-къс от gzip magic байтовете
+            self._started = True
+            entries.extend(self._parse(self._head))
+        if self._inflater is not None:
+            entries.extend(self._parse(self._inflater.flush()))
+        if self._xml is not None:
+            try:
+                self._xml.close()
+            except etree.XMLSyntaxError as e:
+                raise SitemapError(f'Невалиден XML: {e}')
+            entries.extend(self._events())
+        elif self._text.strip():
+            entries.append(('url', self._text.decode('utf-8', 'replace').strip(), None))
+            self._text = b''
+        return entries
+
+    def _parse(self, data: bytes) -> List[Tuple[str, str, Optional[str]]]:
+        if not data:
+            return []
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise SitemapError(f'Sitemap-ът е по-голям от {self.max_bytes} байта')
+
+        if self.kind is None:
+            head = data.lstrip(b'\xef\xbb\xbf \t\r\n')
+            if not head:
+                return []
+            if head[:1] == b'<':
+                # XML декларацията трябва да е в началото на документа
+                data = head
+                self._xml = etree.XMLPullParser(
+                    events=('end',), tag=('{*}url', '{*}sitemap'), resolve_entities=False,
+                    no_network=True, remove_comments=True, remove_pis=True
+                )
+                self.kind = 'xml'
+            else:
+                self.kind = 'text'
+
+        if self._xml is not None:
+            try:
+                self._xml.feed(data)
+            except etree.XMLSyntaxError as e:
+                raise SitemapError(f'Невалиден XML: {e}')
+            return self._events()
+        return self._lines(data)
+
+    def _events(self) -> List[Tuple[str, str, Optional[str]]]:
+        entries = []
+        for _, element in self._xml.read_events():
+            name = _local_name(element.tag)
+            if self.kind == 'xml':
+                self.kind = 'urlset' if name == 'url' else 'sitemapindex'
+            loc = lastmod = None
+            for child in element:
+                child_name = _local_name(child.tag)
+                if child_name == 'loc':
+                    loc = (child.text or '').strip()
+                elif child_name == 'lastmod':
+                    lastmod = (child.text or '').strip() or None
+            if loc:
+                entries.append((name, loc, lastmod))
+            # Обработените елементи се махат от дървото
+            element.clear()
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+        return entries
+
+    def _lines(self, data: bytes) -> List[Tuple[str, str, Optional[str]]]:
+        self._text += data
+        lines = self._text.split(b'\n')
+        self._text = lines.pop()
+        if len(self._text) > _MAX_TEXT_LINE:
+            self._text = b''
+        return [
+            ('url', line.decode('utf-8', 'replace').strip(), None)
+            for line in lines if line.strip()
+        ]
+
+
+async def _capped(chunks: AsyncIterable[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise SitemapError(f'Sitemap-ът е по-голям от {max_bytes} байта')
+        yield chunk
+
+
+class SitemapIngestor:
+    """
+    Открива sitemap-ите на сайт (от robots.txt или /sitemap.xml) и връща
+    URL-ите им лениво, разрешени от robots.txt.
+
+    Всеки sitemap се сваля във временен файл (в паметта до 1 MiB, после на
+    диск) и се парсва на парчета - връзката не остава отворена, докато
+    анализите консумират URL-ите, а паметта е постоянна независимо от броя
+    URL-и (дедупликацията пази по 8 байта на URL). Sitemap index файловете се
+    обхождат в ширина до max_sitemaps файла. robots.txt се кешира по origin.
+    """
+
+    def __init__(self, http_pool: HTTPClientPool, robots_cache: Optional[TTLCache] = None,
+                 user_agent: str = 'seoapp', timeout: float = 60.0,
+                 robots_ttl: float = 24 * 3600, robots_error_ttl: float = 300,
+                 max_sitemaps: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 max_listed: int = 100):
+        self.http = http_pool
+        self.robots_cache = robots_cache if robots_cache is not None else get_robots_cache()
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.robots_ttl = robots_ttl
+        self.robots_error_ttl = robots_error_ttl
+        self.max_sitemaps = max_sitemaps
+        self.max_bytes = max_bytes
+        self.max_listed = max_listed
+
+    @classmethod
+    def from_settings(cls, http_pool: HTTPClientPool, config: Optional[Settings] = None) -> 'SitemapIngestor':
+        config = config or default_settings
+        return cls(
+            http_pool,
+            user_agent=config.robots_user_agent,
+            timeout=config.sitemap_timeout,
+            robots_ttl=config.robots_ttl,
+            max_sitemaps=config.sitemap_max_sitemaps,
+            max_bytes=config.sitemap_max_bytes,
+        )
+
+    async def robots(self, url: str) -> RobotsRules:
+        """Правилата от robots.txt за origin-а на url (от кеша, ако ги има)."""
+        parts = urlsplit(url)
+        robots_url = f'{parts.scheme}://{parts.netloc}/robots.txt'
+        cached = self.robots_cache.get(robots_url)
+        if cached is not MISSING:
+            return cached
+
+        rules = await self._fetch_robots(robots_url)
+        ttl = self.robots_error_ttl if rules.error or rules.disallow_all else self.robots_ttl
+        self.robots_cache.set(robots_url, rules, ttl)
+        return rules
+
+    async def _fetch_robots(self, robots_url: str) -> RobotsRules:
+        chunks = []
+        received = 0
+        try:
+            async with self.http.stream('GET', robots_url, timeout=self.timeout) as response:
+                if response.status_code < 300:
+                    async for chunk in response.aiter_bytes():
+                        chunks.append(chunk)
+                        received += len(chunk)
+                        if received >= ROBOTS_MAX_BYTES:
+                            break
+        except (httpx.HTTPError, httpx.InvalidURL, OSError) as e:
+            # RFC 9309: недостъпен robots.txt - всичко е забранено
+            return RobotsRules(url=robots_url, disallow_all=True, error=str(e) or type(e).__name__)
+
+        status = response.status_code
+        if status >= 500:
+            return RobotsRules(url=robots_url, status=status, disallow_all=True, error=f'HTTP {status}')
+        if status >= 400:
+            # 4xx - няма robots.txt, всичко е разрешено
+            return RobotsRules(url=robots_url, status=status)
+        text = b''.join(chunks)[:ROBOTS_MAX_BYTES].decode('utf-8', 'replace')
+        return parse_robots(text, self.user_agent, url=str(response.url), status=status)
+
+    async def iter_sitemap(self, sitemap_url: str,
+                           info: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[str, str, Optional[str]]]:
+        """
+        Записите от един sitemap файл: ('url' | 'sitemap', loc, lastmod).
+        В info (ако е подаден) се записват типът, gzip и размерът.
+        """
+        async with self.http.stream('GET', sitemap_url, timeout=self.timeout) as response:
+            if response.status_code >= 400:
+                raise SitemapError(f'HTTP {response.status_code}')
+            spool = await spool_stream(_capped(response.aiter_bytes(), self.max_bytes))
+
+        parser = SitemapParser(self.max_bytes)
+        try:
+            while True:
+                chunk = spool.read(_READ_CHUNK)
+                entries = parser.feed(chunk) if chunk else parser.close()
+                if info is not None:
+                    info.update(type=parser.kind, gzip=parser.gzip, bytes=parser.size)
+                for entry in entries:
+                    yield entry
+                if not chunk:
+                    break
+                # Парсването е CPU работа - дава път на останалите задачи
+                await asyncio.sleep(0)
+        finally:
+            spool.close()
+
+    async def iter_urls(self, site_url: str, report: Optional[Dict[str, Any]] = None,
+                        sitemaps: Optional[List[str]] = None,
+                        max_urls: Optional[int] = None,
+                        max_sitemaps: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        URL-ите от sitemap-ите на сайта, които са на същия host, не се
+        повтарят и са разрешени от robots.txt. Без sitemaps се взимат тези от
+        robots.txt или /sitemap.xml. Находките се натрупват в report
+        (виж new_report), докато итераторът се консумира.
+        """
+        report = report if report is not None else new_report()
+        max_sitemaps = self.max_sitemaps if max_sitemaps is None else max_sitemaps
+        robots = await self.robots(site_url)
+        report['robots_txt'] = robots.summary()
+
+        site = urlsplit(site_url)
+        host = (site.hostname or '').lower()
+        queue = deque(sitemaps or robots.sitemaps or [f'{site.scheme}://{site.netloc}/sitemap.xml'])
+        discovered = set(queue)
+        report['sitemaps_discovered'] = len(discovered)
+        seen = VisitedSet()
+
+        while queue:
+            if report['sitemaps_fetched'] >= max_sitemaps:
+                report['limit_reached'] = True
+                return
+            sitemap_url = queue.popleft()
+            info = {'url': sitemap_url, 'type': None, 'gzip': False, 'bytes': 0, 'entries': 0, 'error': None}
+            report['sitemaps_fetched'] += 1
+            if len(report['sitemaps']) < self.max_listed:
+                report['sitemaps'].append(info)
+
+            try:
+                async with aclosing(self.iter_sitemap(sitemap_url, info)) as entries:
+                    async for kind, loc, _ in entries:
+                        info['entries'] += 1
+                        if kind == 'sitemap':
+                            try:
+                                child = urljoin(sitemap_url, loc)
+                            except ValueError:
+                                report['invalid'] += 1
+                                continue
+                            if child not in discovered:
+                                discovered.add(child)
+                                queue.append(child)
+                                report['sitemaps_discovered'] += 1
+                            continue
+
+                        report['urls_found'] += 1
+                        result = self._classify(loc, host, robots, seen)
+                        SITEMAP_URLS.inc(result=result)
+                        if result != 'allowed':
+                            report[result] += 1
+                            continue
+                        report['urls_allowed'] += 1
+                        yield loc
+                        if max_urls is not None and report['urls_allowed'] >= max_urls:
+                            report['limit_reached'] = True
+                            return
+            except (SitemapError, httpx.HTTPError, httpx.InvalidURL, OSError) as e:
+                info['error'] = str(e) or type(e).__name__
+                report['sitemaps_failed'] += 1
+                SITEMAP_FETCHES.inc(result='error')
+            else:
+                SITEMAP_FETCHES.inc(result='ok')
+            finally:
+                if info['type'] == 'sitemapindex':
+                    report['index_files'] += 1
+                if info['gzip']:
+                    report['gzipped'] += 1
+
+    @staticmethod
+    def _classify(loc: str, host: str, robots: RobotsRules, seen: VisitedSet) -> str:
+        try:
+            parts = urlsplit(loc)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                return 'invalid'
+            if parts.hostname.lower() != host:
+                return 'off_site'
+            normalized = normalize_url(loc)
+        except ValueError:
+            # Напр. http://[bad/page или порт извън обхвата - един лош <loc>
+            # не трябва да спира целия sitemap
+            return 'invalid'
+        if not seen.add(normalized):
+            return 'duplicates'
+        if not robots.allowed(loc):
+            return 'disallowed_by_robots'
+        return 'allowed'
+
+    async def findings(self, site_url: str, max_urls: int = 50000, max_sitemaps: int = 20) -> Dict[str, Any]:
+        """
+        robots.txt и обобщение на sitemap-ите за секцията robots_and_sitemaps
+        (сканират се до max_urls URL-а в до max_sitemaps файла).
+        """
+        report = new_report()
+        async for _ in self.iter_urls(site_url, report, max_urls=max_urls, max_sitemaps=max_sitemaps):
+            pass
+        robots = report.pop('robots_txt')
+        return {'robots_txt': robots, 'sitemaps': report}
+
+
+def new_report() -> Dict[str, Any]:
+    """Празен отчет за SitemapIngestor.iter_urls."""
+    return {
+        'robots_txt': None,
+        'sitemaps_discovered': 0,
+        'sitemaps_fetched': 0,
+        'sitemaps_failed': 0,
+        'index_files': 0,
+        'gzipped': 0,
+        'urls_found': 0,
+        'urls_allowed': 0,
+        'disallowed_by_robots': 0,
+        'off_site': 0,
+        'duplicates': 0,
+        'invalid': 0,
+        'limit_reached': False,
+        'sitemaps': [],
+    }
+
+
+_robots_cache: Optional[TTLCache] = None
+
+
+def get_robots_cache() -> TTLCache:
+    """Споделеният за процеса кеш robots.txt URL -> RobotsRules."""
+    global _robots_cache
+    if _robots_cache is None:
+        _robots_cache = TTLCache(max_entries=default_settings.robots_cache_size)
+    return _robots_cache
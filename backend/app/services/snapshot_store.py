@@ -0,0 +1,366 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.services.site_crawler import normalize_url
+
+
+# Секциите, на които се разделя snapshot-ът; всяка се пази веднъж по хеш
+SECTIONS = (
+    'domain_and_infrastructure', 'response_headers', 'technology_detection',
+    'on_page_seo', 'metadata_and_structured_data', 'whois_and_ip_whois', 'robots_and_sitemaps',
+)
+
+# Headers, които се сменят при всяка заявка и не се пазят в историята
+VOLATILE_HEADERS = {
+    'date', 'age', 'expires', 'set-cookie', 'last-modified', 'etag', 'cf-ray',
+    'x-request-id', 'x-amz-cf-id', 'x-amz-request-id', 'x-served-by', 'x-timer',
+    'x-cache-hits', 'report-to', 'nel', 'server-timing', 'x-runtime',
+}
+
+# Версия на схемата (PRAGMA user_version); миграциите се изпълняват веднъж
+SCHEMA_VERSION = 1
+
+# Полета, които се игнорират при diff (дублират други полета)
+DIFF_IGNORED = {'technology_detection.fingerprints', 'robots_and_sitemaps.sitemaps.sitemaps'}
+
+# Списъци, чиито добавени/премахнати елементи се описват поотделно
+LIST_LABELS = {
+    'technology_detection.plugins': 'plugin',
+    'technology_detection.javascript_libraries': 'JavaScript library',
+    'technology_detection.cache_systems': 'cache system',
+    'technology_detection.tag_managers': 'tag manager',
+    'technology_detection.social_embeds': 'social embed',
+    'robots_and_sitemaps.robots_txt.sitemaps': 'sitemap',
+}
+
+# Полета със собствено име в съобщенията
+FIELD_LABELS = {
+    'on_page_seo.title': 'Title',
+    'on_page_seo.meta_description': 'Meta description',
+    'on_page_seo.language': 'Language',
+    'on_page_seo.headings.h1.content': 'H1 headings',
+    'technology_detection.cms': 'CMS',
+    'technology_detection.cms_version': 'CMS version',
+    'technology_detection.cdn': 'CDN',
+    'domain_and_infrastructure.name_servers': 'Name servers',
+    'domain_and_infrastructure.ip_address': 'IP address',
+    'domain_and_infrastructure.hosting_provider': 'Hosting provider',
+    'domain_and_infrastructure.server_location_country': 'Server location',
+    'domain_and_infrastructure.web_server': 'Web server',
+    'domain_and_infrastructure.registrar': 'Registrar',
+    'domain_and_infrastructure.expiry_date': 'Domain expiry date',
+    'domain_and_infrastructure.http_to_https_redirect': 'HTTP to HTTPS redirect',
+    'robots_and_sitemaps.url_allowed': 'Allowed by robots.txt',
+    'robots_and_sitemaps.robots_txt.disallow_all': 'Disallow all in robots.txt',
+}
+
+
+def section_hash(data: Any) -> str:
+    payload = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _domain_age_days(creation_date: Optional[str]) -> Optional[int]:
+    if not creation_date:
+        return None
+    try:
+        created = datetime.fromisoformat(str(creation_date).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    now = datetime.now(timezone.utc) if created.tzinfo else datetime.now()
+    return (now - created).days
+
+
+def snapshot_key(url: str) -> str:
+    """Ключът на историята: нормализираният URL (Example.com и example.com/ са един сайт)."""
+    try:
+        return normalize_url(url)
+    except ValueError:
+        return url.strip()
+
+
+def split_snapshot(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Разделя резултата от анализа на секции за съхранение. Променливите
+    headers и възрастта на домейна (изчислява се наново при четене) се
+    изпускат, за да не създават нова версия на секцията при всеки анализ.
+    """
+    infrastructure = dict(result.get('domain_and_infrastructure') or {})
+    headers = infrastructure.pop('response_headers', None) or {}
+    infrastructure.pop('domain_age_days', None)
+
+    whois_data = dict(result.get('whois_and_ip_whois') or {})
+    if whois_data.get('domain_whois'):
+        whois_data['domain_whois'] = dict(whois_data['domain_whois'])
+        whois_data['domain_whois'].pop('domain_age_days', None)
+
+    return {
+        'domain_and_infrastructure': infrastructure,
+        'response_headers': {
+            name: value for name, value in headers.items() if name.lower() not in VOLATILE_HEADERS
+        },
+        'technology_detection': result.get('technology_detection'),
+        'on_page_seo': result.get('on_page_seo'),
+        'metadata_and_structured_data': result.get('metadata_and_structured_data'),
+        'whois_and_ip_whois': whois_data,
+        'robots_and_sitemaps': result.get('robots_and_sitemaps'),
+    }
+
+
+def join_snapshot(sections: Dict[str, Any]) -> Dict[str, Any]:
+    """Обратното на split_snapshot - сглобява секциите в резултат от анализа."""
+    infrastructure = dict(sections.get('domain_and_infrastructure') or {})
+    whois_data = dict(sections.get('whois_and_ip_whois') or {})
+    domain_whois = dict(whois_data.get('domain_whois') or {})
+    if domain_whois:
+        domain_whois['domain_age_days'] = _domain_age_days(domain_whois.get('creation_date'))
+        whois_data['domain_whois'] = domain_whois
+    infrastructure['domain_age_days'] = domain_whois.get('domain_age_days')
+    infrastructure['response_headers'] = sections.get('response_headers') or {}
+
+    return {
+        'domain_and_infrastructure': infrastructure,
+        'technology_detection': sections.get('technology_detection'),
+        'on_page_seo': sections.get('on_page_seo'),
+        'metadata_and_structured_data': sections.get('metadata_and_structured_data'),
+        'whois_and_ip_whois': whois_data,
+        'robots_and_sitemaps': sections.get('robots_and_sitemaps'),
+    }
+
+
+def diff_sections(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Промените между две версии на секциите (от split_snapshot) като списък от
+    {'section', 'field', 'change', 'old', 'new', 'message'}.
+    """
+    changes: List[Dict[str, Any]] = []
+    for section in SECTIONS:
+        _diff_value(section, old.get(section), new.get(section), changes)
+    return changes
+
+
+def _diff_value(path: str, old: Any, new: Any, changes: List[Dict[str, Any]]):
+    if old == new or path in DIFF_IGNORED:
+        return
+
+    if isinstance(old, dict) and isinstance(new, dict) and path not in FIELD_LABELS:
+        for key in list(old) + [key for key in new if key not in old]:
+            _diff_value(f'{path}.{key}', old.get(key), new.get(key), changes)
+        return
+
+    section, _, field = path.partition('.')
+    if path in LIST_LABELS and isinstance(old or [], list) and isinstance(new or [], list):
+        label = LIST_LABELS[path]
+        old_items, new_items = old or [], new or []
+        for item in new_items:
+            if item not in old_items:
+                changes.append({
+                    'section': section, 'field': field, 'change': 'added', 'old': None, 'new': item,
+                    'message': f'New {label} detected: {item}',
+                })
+        for item in old_items:
+            if item not in new_items:
+                changes.append({
+                    'section': section, 'field': field, 'change': 'removed', 'old': item, 'new': None,
+                    'message': f'{label[0].upper()}{label[1:]} removed: {item}',
+                })
+        return
+
+    if old in (None, '', [], {}):
+        change = 'added'
+    elif new in (None, '', [], {}):
+        change = 'removed'
+    else:
+        change = 'changed'
+    label = FIELD_LABELS.get(path, field or section)
+    changes.append({
+        'section': section, 'field': field, 'change': change, 'old': old, 'new': new,
+        'message': f'{label} {change}',
+    })
+
+
+class SnapshotStore:
+    """
+    История на анализите в SQLite.
+
+    Всяка секция се пази веднъж по SHA-256 на съдържанието ѝ (компресирана),
+    а snapshot-ът е ред с URL, време и хешовете на секциите - непроменените
+    секции се реферират от по-новите snapshot-и, вместо да се копират.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS snapshot_sections ('
+            ' hash TEXT PRIMARY KEY, section TEXT NOT NULL, data BLOB NOT NULL) WITHOUT ROWID'
+        )
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS snapshots ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, final_url TEXT,'
+            ' taken_at REAL NOT NULL, sections TEXT NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_snapshots_url_time ON snapshots (url, taken_at)')
+        conn.commit()
+        self._migrate(conn)
+
+    def _migrate(self, conn: sqlite3.Connection):
+        with conn:
+            # BEGIN IMMEDIATE - два процеса да не мигрират едновременно
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < 1:
+                # По-старите snapshot-и са записани с URL-а както е подаден
+                for (url,) in conn.execute('SELECT DISTINCT url FROM snapshots').fetchall():
+                    if snapshot_key(url) != url:
+                        conn.execute('UPDATE snapshots SET url = ? WHERE url = ?', (snapshot_key(url), url))
+            if version < SCHEMA_VERSION:
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def save(self, result: Dict[str, Any], taken_at: Optional[float] = None) -> int:
+        """Записва резултат от анализа и връща id на snapshot-а."""
+        sections = split_snapshot(result)
+        hashes = {}
+        rows = []
+        for name, data in sections.items():
+            digest = section_hash(data)
+            hashes[name] = digest
+            payload = zlib.compress(json.dumps(data, default=str, ensure_ascii=False).encode('utf-8'))
+            rows.append((digest, name, payload))
+
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO snapshot_sections (hash, section, data) VALUES (?, ?, ?)', rows
+            )
+            cursor = conn.execute(
+                'INSERT INTO snapshots (url, final_url, taken_at, sections) VALUES (?, ?, ?, ?)',
+                (snapshot_key(result['url']), result.get('final_url'), taken_at or time.time(), json.dumps(hashes))
+            )
+        return cursor.lastrowid
+
+    def history(self, url: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Последните snapshot-и за URL (най-новият първи) с хешовете на секциите
+        и кои секции са се променили спрямо предходния.
+        """
+        url = snapshot_key(url)
+        rows = self._connection().execute(
+            'SELECT id, final_url, taken_at, sections FROM snapshots WHERE url = ?'
+            ' ORDER BY taken_at DESC, id DESC LIMIT ?',
+            (url, limit + 1)
+        ).fetchall()
+
+        items = []
+        for index, (snapshot_id, final_url, taken_at, sections) in enumerate(rows[:limit]):
+            hashes = json.loads(sections)
+            previous = json.loads(rows[index + 1][3]) if index + 1 < len(rows) else None
+            items.append({
+                'id': snapshot_id,
+                'url': url,
+                'final_url': final_url,
+                'taken_at': taken_at,
+                'section_hashes': hashes,
+                'changed_sections': None if previous is None else [
+                    name for name in SECTIONS if hashes.get(name) != previous.get(name)
+                ],
+            })
+        return items
+
+    def get(self, snapshot_id: int) -> Optional[Dict[str, Any]]:
+        """Пълният резултат от анализа за snapshot."""
+        row = self._row(snapshot_id)
+        if row is None:
+            return None
+        url, final_url, taken_at, hashes = row
+        result = {'url': url, 'final_url': final_url}
+        result.update(join_snapshot(self._sections(hashes)))
+        result.update({'snapshot_id': snapshot_id, 'taken_at': taken_at})
+        return result
+
+    def latest_ids(self, url: str, count: int = 2) -> List[int]:
+        rows = self._connection().execute(
+            'SELECT id FROM snapshots WHERE url = ? ORDER BY taken_at DESC, id DESC LIMIT ?',
+            (snapshot_key(url), count)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def diff(self, old_id: int, new_id: int) -> Optional[Dict[str, Any]]:
+        """Промените между два snapshot-а (None, ако някой липсва)."""
+        old_row, new_row = self._row(old_id), self._row(new_id)
+        if old_row is None or new_row is None:
+            return None
+        old_hashes, new_hashes = old_row[3], new_row[3]
+        changed = [name for name in SECTIONS if old_hashes.get(name) != new_hashes.get(name)]
+
+        # Зареждат се само секциите с различен хеш
+        old_sections = self._sections({name: old_hashes.get(name) for name in changed})
+        new_sections = self._sections({name: new_hashes.get(name) for name in changed})
+        return {
+            'from': {'id': old_id, 'taken_at': old_row[2]},
+            'to': {'id': new_id, 'taken_at': new_row[2]},
+            'changed_sections': changed,
+            'changes': diff_sections(old_sections, new_sections),
+        }
+
+    def stats(self) -> dict:
+        conn = self._connection()
+        return {
+            'path': self.path,
+            'snapshots': conn.execute('SELECT count(*) FROM snapshots').fetchone()[0],
+            'stored_sections': conn.execute('SELECT count(*) FROM snapshot_sections').fetchone()[0],
+            'stored_bytes': conn.execute('SELECT coalesce(sum(length(data)), 0) FROM snapshot_sections').fetchone()[0],
+        }
+
+    def _row(self, snapshot_id: int):
+        row = self._connection().execute(
+            'SELECT url, final_url, taken_at, sections FROM snapshots WHERE id = ?', (snapshot_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], row[1], row[2], json.loads(row[3])
+
+    def _sections(self, hashes: Dict[str, Optional[str]]) -> Dict[str, Any]:
+        digests = [digest for digest in hashes.values() if digest]
+        if not digests:
+            return {}
+        placeholders = ','.join('?' * len(digests))
+        rows = self._connection().execute(
+            f'SELECT hash, data FROM snapshot_sections WHERE hash IN ({placeholders})', digests
+        ).fetchall()
+        data = {digest: json.loads(zlib.decompress(payload)) for digest, payload in rows}
+        return {name: data.get(digest) for name, digest in hashes.items()}
+
+
+_default_store: Optional[SnapshotStore] = None
+_default_loaded = False
+
+
+def get_snapshot_store() -> Optional[SnapshotStore]:
+    """Споделеното хранилище от SEOAPP_SNAPSHOT_PATH (None, ако е изключено)."""
+    global _default_store, _default_loaded
+    if not _default_loaded:
+        _default_loaded = True
+        if settings.snapshot_path:
+            _default_store = SnapshotStore(settings.snapshot_path)
+    return _default_store
@@ -0,0 +1,422 @@
+import json
+import re
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from lxml import etree
+
+from app.services.document import ParsedDocument
+from app.services.metrics import Timings, stage
+from app.services.seo_parser import resolve_link
+from app.services.technology_detector import TechnologyDetector
+
+
+# Текстът в тези тагове не влиза в get_text() на BeautifulSoup
+# (Script, Stylesheet, TemplateString, RubyText, RubyParenthesis)
+EXCLUDED_TEXT_TAGS = frozenset(('script', 'style', 'template', 'rt', 'rp'))
+PRESERVE_WHITESPACE_TAGS = frozenset(('pre', 'textarea'))
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+OG_PROPERTY = re.compile(r'^og:', re.I)
+TWITTER_NAME = re.compile(r'^twitter:', re.I)
+FEED_TYPE = re.compile(r'application/(rss|atom)', re.I)
+
+
+class SEOStreamTarget:
+    """
+    lxml parser target, който изчислява on-page SEO и head metadata в едно
+    минаване, без да строи дърво.
+
+    lxml (libxml2) подава същите start/end/data събития, от които
+    BeautifulSoup строи ParsedDocument, и правилата тук повтарят SEOParser и
+    MetadataParser (включително кои низове влизат в get_text()). В паметта
+    остават само броячите, заглавията и малките head тагове.
+    """
+
+    def __init__(self, base_url: str, link_limit: int = 0, image_limit: int = 0):
+        self.base_url = base_url
+        parsed_base = urlparse(base_url)
+        self.base_domain = f"{parsed_base.scheme}://{parsed_base.netloc}"
+        self.base_netloc = parsed_base.netloc
+
+        self._stack: List[str] = []
+        self._excluded_depth = 0
+        self._preserve_depth = 0
+        self._pending: List[str] = []
+
+        self.text_size = 0
+        self.title: Optional[str] = None
+        self._title_parts: Optional[List[str]] = None
+        self.html_lang: Optional[str] = None
+        self.headings = {tag: {'count': 0, 'content': []} for tag in HEADING_TAGS}
+        # Отворените заглавия: (таг, части от текста, индекс в content)
+        self._open_headings: List[tuple] = []
+
+        self.links = {'internal': 0, 'external': 0, 'nofollow': 0, 'duplicated': 0}
+        # Хешове вместо самите URL-и - паметта не расте с дължината им
+        self._seen_links = set()
+        self._duplicated_links = set()
+        # Линковете за проверка (само при link_limit > 0)
+        self.link_limit = link_limit
+        self.link_urls: Dict[str, bool] = {}
+        self.link_limit_reached = False
+        self.images = {'missing_alt': 0, 'duplicated': 0, 'with_title': 0}
+        self._seen_images = set()
+        self._duplicated_images = set()
+        # Изображенията за одит (само при image_limit > 0)
+        self.image_limit = image_limit
+        self.image_urls: Dict[str, bool] = {}
+        self.image_limit_reached = False
+
+        # Head таговете (атрибути) - за metadata и за сигнатурите на технологиите
+        self.meta: List[Dict[str, str]] = []
+        self.link_tags: List[Dict[str, str]] = []
+        self.script_srcs: List[Dict[str, str]] = []
+        self.json_ld: List[Any] = []
+        self._json_ld_parts: Optional[List[str]] = None
+
+    # --- lxml target интерфейс ---
+
+    def start(self, tag, attrib):
+        self._flush()
+        if not isinstance(tag, str):
+            return
+        attrs = dict(attrib)
+        self._stack.append(tag)
+        if tag in EXCLUDED_TEXT_TAGS:
+            self._excluded_depth += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+
+        if tag == 'a':
+            if 'href' in attrs:
+                self._add_link(attrs)
+        elif tag == 'img':
+            self._add_image(attrs)
+        elif tag in HEADING_TAGS:
+            content = self.headings[tag]['content']
+            content.append('')
+            self.headings[tag]['count'] += 1
+            self._open_headings.append((tag, [], len(content) - 1))
+        elif tag == 'meta':
+            self.meta.append(attrs)
+        elif tag == 'link':
+            self.link_tags.append(attrs)
+        elif tag == 'script':
+            if 'src' in attrs:
+                self.script_srcs.append(attrs)
+            if attrs.get('type') == 'application/ld+json':
+                self._json_ld_parts = []
+        elif tag == 'title' and self.title is None and self._title_parts is None:
+            self._title_parts = []
+        elif tag == 'html' and self.html_lang is None:
+            self.html_lang = attrs.get('lang') or ''
+
+    def end(self, tag):
+        self._flush()
+        if not isinstance(tag, str) or not self._stack:
+            return
+        # libxml2 затваря имплицитно затворените елементи със собствени end събития
+        self._stack.pop()
+        if tag in EXCLUDED_TEXT_TAGS:
+            self._excluded_depth -= 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth -= 1
+
+        if tag in HEADING_TAGS:
+            for position in range(len(self._open_headings) - 1, -1, -1):
+                name, parts, index = self._open_headings[position]
+                if name == tag:
+                    self.headings[tag]['content'][index] = ''.join(parts)
+                    del self._open_headings[position]
+                    break
+        elif tag == 'title' and self._title_parts is not None:
+            self.title = ''.join(self._title_parts)
+            self._title_parts = None
+        elif tag == 'script' and self._json_ld_parts is not None:
+            try:
+                content = ''.join(self._json_ld_parts)
+                if content:
+                    self.json_ld.append(json.loads(content))
+            except:
+                pass
+            self._json_ld_parts = None
+
+    def data(self, data):
+        self._pending.append(data)
+
+    def comment(self, text):
+        self._flush()
+
+    def pi(self, target, data=None):
+        self._flush()
+
+    def doctype(self, *args):
+        self._flush()
+
+    def close(self):
+        self._flush()
+        # Незатворени заглавия в края на документа
+        for name, parts, index in self._open_headings:
+            self.headings[name]['content'][index] = ''.join(parts)
+        self._open_headings = []
+        if self._title_parts is not None:
+            self.title = ''.join(self._title_parts)
+            self._title_parts = None
+        return self
+
+    # --- текст ---
+
+    def _flush(self):
+        """Един текстов възел - повтаря BeautifulSoup.endData()."""
+        if not self._pending:
+            return
+        text = ''.join(self._pending)
+        self._pending = []
+        if not self._preserve_depth and not text.strip(ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+
+        if self._json_ld_parts is not None:
+            self._json_ld_parts.append(text)
+        if self._excluded_depth:
+            return
+
+        self.text_size += len(text)
+        stripped = text.strip()
+        if stripped:
+            if self._title_parts is not None:
+                self._title_parts.append(stripped)
+            for _, parts, _ in self._open_headings:
+                parts.append(stripped)
+
+    # --- линкове и изображения ---
+
+    def _add_link(self, attrs: Dict[str, str]):
+        href = attrs.get('href', '')
+        if not href:
+            return
+        absolute_url = urljoin(self.base_domain, href)
+        netloc = urlparse(absolute_url).netloc
+
+        if 'nofollow' in attrs.get('rel', '').lower():
+            self.links['nofollow'] += 1
+        if netloc == self.base_netloc or not netloc:
+            self.links['internal'] += 1
+        else:
+            self.links['external'] += 1
+
+        if self.link_limit > 0:
+            self._collect_link(href)
+
+        key = hash(absolute_url)
+        if key in self._seen_links:
+            self._duplicated_links.add(key)
+        else:
+            self._seen_links.add(key)
+
+    def _collect_link(self, href: str):
+        url = resolve_link(self.base_url, href)
+        if url and url not in self.link_urls:
+            if len(self.link_urls) >= self.link_limit:
+                self.link_limit_reached = True
+            else:
+                self.link_urls[url] = True
+
+    def _collect_image(self, src: str):
+        url = resolve_link(self.base_url, src)
+        if url and url not in self.image_urls:
+            if len(self.image_urls) >= self.image_limit:
+                self.image_limit_reached = True
+            else:
+                self.image_urls[url] = True
+
+    def _add_image(self, attrs: Dict[str, str]):
+        src = attrs.get('src', '')
+        alt = attrs.get('alt', '')
+        if not alt or alt.strip() == '':
+            self.images['missing_alt'] += 1
+        if attrs.get('title'):
+            self.images['with_title'] += 1
+        if self.image_limit > 0:
+            self._collect_image(src)
+        if src:
+            key = hash(src)
+            if key in self._seen_images:
+                self._duplicated_images.add(key)
+            else:
+                self._seen_images.add(key)
+
+    # --- резултат ---
+
+    def on_page_seo(self, page_size: int, html_chars: int) -> dict:
+        links = dict(self.links, duplicated=len(self._duplicated_links))
+        images = dict(self.images, duplicated=len(self._duplicated_images))
+        return {
+            'title': self.title or '',
+            'meta_description': self._meta_description(),
+            'language': self._language(),
+            'page_size': page_size,
+            'text_size': self.text_size,
+            'text_to_code_ratio': round((self.text_size / html_chars) * 100, 2) if html_chars else 0.0,
+            'headings': self.headings,
+            'links': links,
+            'images': images,
+        }
+
+    def metadata(self) -> dict:
+        og_tags = {}
+        twitter_tags = {}
+        for meta in self.meta:
+            prop = meta.get('property')
+            if prop is not None and OG_PROPERTY.search(prop):
+                og_tags[prop.lower().replace('og:', '')] = meta.get('content', '')
+            name = meta.get('name')
+            if name is not None and TWITTER_NAME.search(name):
+                twitter_tags[name.lower().replace('twitter:', '')] = meta.get('content', '')
+
+        canonical = next((link for link in self.link_tags if 'canonical' in link.get('rel', '').split()), None)
+
+        feeds = [link.get('href', '') for link in self.link_tags
+                 if FEED_TYPE.search(link.get('type', '')) and link.get('href')]
+        feeds += [link.get('href', '') for link in self.link_tags
+                  if link.get('type') == 'application/json'
+                  and ('feed' in link.get('href', '').lower() or 'json' in link.get('href', '').lower())]
+
+        robots = self._first_meta('name', 'robots')
+        return {
+            'canonical': canonical.get('href', '') if canonical else '',
+            'open_graph': og_tags,
+            'twitter_cards': twitter_tags,
+            'json_ld': self.json_ld,
+            'feeds': feeds,
+            'robots_meta': robots.get('content', '') if robots else '',
+        }
+
+    def _first_meta(self, attr: str, value: str) -> Optional[Dict[str, str]]:
+        return next((meta for meta in self.meta if meta.get(attr) == value), None)
+
+    def _meta_description(self) -> str:
+        meta = self._first_meta('name', 'description') or self._first_meta('property', 'og:description')
+        return meta.get('content', '') if meta else ''
+
+    def _language(self) -> str:
+        if self.html_lang:
+            return self.html_lang
+        meta = self._first_meta('http-equiv', 'Content-Language')
+        return meta.get('content', '') if meta else ''
+
+
+class StreamedDocument(ParsedDocument):
+    """
+    ParsedDocument без дърво - за TechnologyDetector след поточно парсване.
+
+    html е само началото на страницата (до fingerprint_bytes), а find_all
+    връща атрибутите на събраните <script src> и <meta> тагове от цялата
+    страница - точно това, което ползват сигнатурите.
+    """
+
+    def __init__(self, html_prefix: str, tags: Dict[str, List[Dict[str, str]]]):
+        self.html = html_prefix
+        self.soup = None
+        self._lower = None
+        self._text = None
+        self._size_bytes = None
+        self._tags_by_name = tags
+        self._attr_index = {}
+
+
+class StreamingHTMLAnalyzer:
+    """
+    Поточна алтернатива на analyze_html.
+
+    Crawler-ът извиква begin() с крайния URL и headers, после feed() за
+    всяко парче декодиран HTML и накрая close(), който връща същите секции
+    като analyze_html. Пълният HTML и DOM-ът не се пазят: паметта зависи от
+    броя на линковете и заглавията, а не от размера на страницата. За
+    сигнатурите на технологиите се пазят първите fingerprint_bytes символа.
+    """
+
+    def __init__(self, url: str, fingerprint_bytes: int = 512 * 1024,
+                 timings: Optional[Timings] = None, link_limit: int = 0,
+                 image_limit: int = 0):
+        self.url = url
+        self.link_limit = link_limit
+        self.image_limit = image_limit
+        self.fingerprint_bytes = fingerprint_bytes
+        self.timings = timings
+        self.final_url = url
+        self.headers: Dict[str, str] = {}
+        self.page_size = 0
+        self.html_chars = 0
+        self.truncated = False
+        self._prefix: List[str] = []
+        self._prefix_chars = 0
+        self._parse_seconds = 0.0
+        self._target: Optional[SEOStreamTarget] = None
+        self._parser = None
+
+    def begin(self, final_url: str, headers: Dict[str, str]):
+        self.final_url = final_url
+        self.headers = headers
+        self._target = SEOStreamTarget(final_url, self.link_limit, self.image_limit)
+        # Същите настройки като lxml builder-а на BeautifulSoup
+        self._parser = etree.HTMLParser(target=self._target, strip_cdata=False, recover=True)
+
+    def feed(self, text: str):
+        if not text:
+            return
+        if self._parser is None:
+            self.begin(self.final_url, self.headers)
+        started = time.perf_counter()
+        first = not self.html_chars
+        self.html_chars += len(text)
+        self.page_size += len(text.encode('utf-8'))
+        if self._prefix_chars < self.fingerprint_bytes:
+            piece = text[:self.fingerprint_bytes - self._prefix_chars]
+            self._prefix.append(piece)
+            self._prefix_chars += len(piece)
+        if first and text[0] == '\N{BYTE ORDER MARK}':
+            # Както BeautifulSoup - lxml не приема BOM в unicode вход
+            text = text[1:]
+        self._parser.feed(text)
+        self._parse_seconds += time.perf_counter() - started
+
+    def close(self) -> Dict[str, Any]:
+        if self._parser is None:
+            self.begin(self.final_url, self.headers)
+        started = time.perf_counter()
+        try:
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            # Празен документ - lxml няма какво да затвори
+            pass
+        self._parse_seconds += time.perf_counter() - started
+        if self.timings is not None:
+            self.timings.record('parse', self._parse_seconds)
+
+        target = self._target
+        with stage(self.timings, 'technology'):
+            document = StreamedDocument(''.join(self._prefix), {
+                'script': target.script_srcs,
+                'meta': target.meta,
+            })
+            technology_data = TechnologyDetector().detect(document, self.headers, self.url)
+
+        on_page_seo = target.on_page_seo(self.page_size, self.html_chars)
+        on_page_seo['truncated'] = self.truncated
+        result = {
+            'technology_detection': technology_data,
+            'on_page_seo': on_page_seo,
+            'metadata_and_structured_data': target.metadata(),
+        }
+        if self.link_limit > 0:
+            result['links_to_check'] = {
+                'urls': list(target.link_urls), 'limit_reached': target.link_limit_reached
+            }
+        if self.image_limit > 0:
+            result['images_to_audit'] = {
+                'urls': list(target.image_urls), 'limit_reached': target.image_limit_reached
+            }
+        return result
@@ -0,0 +1,467 @@
+import asyncio
+import ipaddress
+import os
+import re
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import settings
+from app.services.limits import KeyedLimiter
+from app.services.ttl_cache import MISSING, TTLCache
+
+
+IANA_WHOIS_SERVER = 'whois.iana.org'
+
+# Копие на https://publicsuffix.org/list/public_suffix_list.dat (MPL 2.0)
+DEFAULT_PUBLIC_SUFFIX_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'data', 'public_suffix_list.dat'
+)
+
+# WHOIS сървъри по TLD (останалите се откриват през whois.iana.org)
+TLD_SERVERS = {
+    'com': 'whois.verisign-grs.com',
+    'net': 'whois.verisign-grs.com',
+    'org': 'whois.pir.org',
+    'info': 'whois.nic.info',
+    'biz': 'whois.nic.biz',
+    'io': 'whois.nic.io',
+    'co': 'whois.nic.co',
+    'me': 'whois.nic.me',
+    'bg': 'whois.register.bg',
+    'uk': 'whois.nic.uk',
+    'de': 'whois.denic.de',
+    'eu': 'whois.eu',
+    'fr': 'whois.nic.fr',
+    'nl': 'whois.domain-registry.nl',
+    'it': 'whois.nic.it',
+    'es': 'whois.nic.es',
+    'pl': 'whois.dns.pl',
+    'ru': 'whois.tcinet.ru',
+    'us': 'whois.nic.us',
+    'ca': 'whois.cira.ca',
+    'au': 'whois.auda.org.au',
+    'app': 'whois.nic.google',
+    'dev': 'whois.nic.google',
+}
+
+# Формат на заявката за сървъри, които не приемат само името
+QUERY_FORMATS = {
+    'whois.denic.de': '-T dn,ace {domain}',
+    'whois.verisign-grs.com': 'domain {domain}',
+}
+
+# Кодиране на заявката за сървъри, които приемат IDN в UTF-8 (останалите - ASCII;
+# името вече е в punycode от registrable_domain)
+QUERY_ENCODINGS: Dict[str, str] = {}
+
+REFERRAL_PATTERNS = [
+    re.compile(r'^\s*Registrar WHOIS Server:\s*(\S+)', re.I | re.M),
+    re.compile(r'^\s*ReferralServer:\s*(\S+)', re.I | re.M),
+    re.compile(r'^\s*refer:\s*(\S+)', re.I | re.M),
+    re.compile(r'^\s*whois:\s*(\S+)', re.I | re.M),
+]
+
+FIELD_ALIASES = {
+    'registrar': ('registrar', 'sponsoring registrar', 'registrar name', 'registrar organization'),
+    'creation_date': ('creation date', 'created', 'created on', 'registered on', 'registration time',
+                      'domain registration date', 'registered'),
+    'expiry_date': ('registry expiry date', 'registrar registration expiration date', 'expiration date',
+                    'expiry date', 'expires', 'expires on', 'paid-till', 'registry expiration date'),
+    'name_servers': ('name server', 'nameserver', 'nserver', 'name servers'),
+    'status': ('domain status', 'status'),
+}
+
+DATE_FORMATS = (
+    '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d',
+    '%d-%b-%Y', '%d.%m.%Y', '%d/%m/%Y', '%Y.%m.%d', '%Y/%m/%d', '%d-%m-%Y',
+    '%Y%m%d', '%b %d %Y', '%d %b %Y',
+)
+
+
+class WhoisError(Exception):
+    """Грешка при WHOIS заявка."""
+
+
+class PublicSuffixList:
+    """
+    Public Suffix List (publicsuffix.org) - правила, wildcard-и (*.ck) и
+    изключения (!www.ck), по алгоритъма от publicsuffix.org/list/.
+    """
+
+    def __init__(self, rules: Iterable[str]):
+        self.rules: Set[str] = set()
+        self.wildcards: Set[str] = set()
+        self.exceptions: Set[str] = set()
+        for rule in rules:
+            rule = rule.strip().lower()
+            if not rule or rule.startswith('//'):
+                continue
+            rule = rule.split()[0]
+            exception = rule.startswith('!')
+            rule = rule.lstrip('!')
+            if not rule.isascii():
+                # Хостовете се сравняват в punycode (xn--...)
+                try:
+                    rule = '.'.join(label if label == '*' else label.encode('idna').decode('ascii')
+                                    for label in rule.split('.'))
+                except UnicodeError:
+                    continue
+            if exception:
+                self.exceptions.add(rule)
+            elif rule.startswith('*.'):
+                self.wildcards.add(rule[2:])
+            else:
+                self.rules.add(rule)
+
+    @classmethod
+    def load(cls, path: str) -> 'PublicSuffixList':
+        with open(path, encoding='utf-8') as f:
+            return cls(f)
+
+    def __len__(self) -> int:
+        return len(self.rules) + len(self.wildcards) + len(self.exceptions)
+
+    def suffix_length(self, labels: List[str]) -> int:
+        """Брой етикети на публичния суфикс (по подразбиране - само TLD)."""
+        for i in range(len(labels)):
+            candidate = '.'.join(labels[i:])
+            if candidate in self.exceptions:
+                return len(labels) - i - 1
+            if candidate in self.rules:
+                return len(labels) - i
+            if i + 1 < len(labels) and '.'.join(labels[i + 1:]) in self.wildcards:
+                return len(labels) - i
+        return 1
+
+
+_default_suffixes: Optional[PublicSuffixList] = None
+_default_suffixes_loaded = False
+
+
+def get_public_suffixes() -> Optional[PublicSuffixList]:
+    """
+    Списъкът от SEOAPP_PUBLIC_SUFFIX_PATH или копието в app/data (None, ако
+    файлът не може да се прочете).
+    """
+    global _default_suffixes, _default_suffixes_loaded
+    if not _default_suffixes_loaded:
+        _default_suffixes_loaded = True
+        try:
+            _default_suffixes = PublicSuffixList.load(settings.public_suffix_path or DEFAULT_PUBLIC_SUFFIX_PATH)
+        except OSError:
+            _default_suffixes = None
+    return _default_suffixes
+
+
+def registrable_domain(host: str, suffixes: Optional[PublicSuffixList] = None) -> Optional[str]:
+    """
+    Връща регистрируемия домейн (eTLD+1) за host по Public Suffix List:
+    www.example.com, shop.example.com и example.com:8443 дават example.com,
+    shop.example.com.pl - example.com.pl, user.github.io - user.github.io.
+
+    Ако списъкът не може да се прочете, суфиксът не може да се определи
+    сигурно - хост с повече от два етикета се връща цял.
+    """
+    host = (host or '').strip().lower()
+    host = host.replace('http://', '').replace('https://', '').split('/')[0]
+    if host.startswith('['):
+        return None
+    host = host.split(':')[0].rstrip('.')
+    if not host:
+        return None
+    try:
+        ipaddress.ip_address(host)
+        return None
+    except ValueError:
+        pass
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass
+
+    labels = host.split('.')
+    if len(labels) < 2:
+        return host
+    if suffixes is None:
+        suffixes = get_public_suffixes()
+    if suffixes is None:
+        return host
+    suffix_length = suffixes.suffix_length(labels)
+    if suffix_length >= len(labels):
+        return None
+    return '.'.join(labels[-suffix_length - 1:])
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        pass
+    cleaned = re.sub(r'\s*\(.*\)$', '', value).strip()
+    cleaned = re.sub(r'\s+(UTC|GMT)$', '', cleaned)
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, date_format)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_whois(text: str) -> dict:
+    """Извлича registrar, дати, name servers и статус от WHOIS отговор."""
+    fields: Dict[str, List[str]] = {}
+    lines = text.splitlines()
+    index = 0
+    while index < len(lines):
+        line = lines[index]
+        index += 1
+        if ':' not in line or line.lstrip().startswith(('%', '#', '>>>')):
+            continue
+        key, _, value = line.partition(':')
+        key = key.strip().lower()
+        value = value.strip()
+        if not value:
+            # Блоков формат (напр. .uk): стойностите са на следващите отстъпени редове
+            block = []
+            while index < len(lines) and lines[index].startswith((' ', '\t')) and lines[index].strip():
+                item = lines[index].strip()
+                index += 1
+                nested_key, separator, nested_value = item.partition(':')
+                if separator and nested_value.strip() and not nested_value.startswith('//'):
+                    # Вложено "ключ: стойност" (напр. "Registered on: ..." под "Relevant dates:")
+                    fields.setdefault(nested_key.strip().lower(), []).append(nested_value.strip())
+                else:
+                    block.append(item)
+            values = block
+        else:
+            values = [value]
+        if values:
+            fields.setdefault(key, []).extend(values)
+
+    def first(name: str) -> Optional[str]:
+        for alias in FIELD_ALIASES[name]:
+            if fields.get(alias):
+                return fields[alias][0]
+        return None
+
+    name_servers: List[str] = []
+    for alias in FIELD_ALIASES['name_servers']:
+        for value in fields.get(alias, []):
+            server = value.split()[0].lower().rstrip('.')
+            if server and server not in name_servers:
+                name_servers.append(server)
+
+    statuses: List[str] = []
+    for alias in FIELD_ALIASES['status']:
+        for value in fields.get(alias, []):
+            status = value.split()[0]
+            if status not in statuses:
+                statuses.append(status)
+
+    creation = first('creation_date')
+    expiry = first('expiry_date')
+    return {
+        'registrar': first('registrar'),
+        'creation_date': parse_date(creation) if creation else None,
+        'expiry_date': parse_date(expiry) if expiry else None,
+        'name_servers': name_servers,
+        'status': statuses or None,
+    }
+
+
+class AsyncWhoisClient:
+    """
+    Асинхронен WHOIS клиент (TCP порт 43).
+
+    Избира сървъра по TLD (неизвестните TLD се откриват през IANA), следва
+    препратките от thin регистрите към WHOIS сървъра на регистратора,
+    ограничава едновременните връзки и честотата на заявките към всеки
+    сървър и кешира резултатите по регистрируем домейн.
+    """
+
+    def __init__(self, port: int = 43, timeout: float = 10.0, max_referrals: int = 2,
+                 per_server_concurrency: int = 2, per_server_interval: float = 0.2,
+                 cache_ttl: float = 24 * 3600, error_ttl: float = 300,
+                 cache_size: int = 10000, tld_servers: Optional[Dict[str, str]] = None,
+                 max_response_bytes: int = 256 * 1024,
+                 query_encodings: Optional[Dict[str, str]] = None):
+        self.port = port
+        self.timeout = timeout
+        self.max_response_bytes = max_response_bytes
+        self.max_referrals = max_referrals
+        self.per_server_interval = per_server_interval
+        self.cache_ttl = cache_ttl
+        self.error_ttl = error_ttl
+        self.tld_servers = dict(TLD_SERVERS)
+        self.tld_servers.update(tld_servers or {})
+        self.query_encodings = dict(QUERY_ENCODINGS)
+        self.query_encodings.update(query_encodings or {})
+        self._connections = KeyedLimiter(per_server_concurrency)
+        self._next_query_at: Dict[str, float] = {}
+        self._cache = TTLCache(cache_size)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.queries_sent = 0
+
+    async def lookup(self, domain: str) -> dict:
+        """
+        Връща парснатите WHOIS данни за регистрируемия домейн на domain.
+        При неуспех хвърля WhoisError.
+        """
+        registrable = registrable_domain(domain)
+        if not registrable or '.' not in registrable:
+            raise WhoisError(f'Невалиден домейн: {domain}')
+
+        cached = self._cache.get(registrable)
+        if cached is not MISSING:
+            if isinstance(cached, WhoisError):
+                raise cached
+            return dict(cached)
+
+        inflight = self._inflight.get(registrable)
+        if inflight is not None:
+            result = await asyncio.shield(inflight)
+            if isinstance(result, WhoisError):
+                raise result
+            return dict(result)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[registrable] = future
+        try:
+            try:
+                result = await self._lookup(registrable)
+                self._cache.set(registrable, result, self.cache_ttl)
+            except (WhoisError, OSError, UnicodeError, asyncio.TimeoutError) as e:
+                result = e if isinstance(e, WhoisError) else WhoisError(str(e) or type(e).__name__)
+                self._cache.set(registrable, result, self.error_ttl)
+            future.set_result(result)
+        finally:
+            if not future.done():
+                future.set_result(WhoisError('Заявката беше прекъсната'))
+            self._inflight.pop(registrable, None)
+
+        if isinstance(result, WhoisError):
+            raise result
+        return dict(result)
+
+    async def _lookup(self, domain: str) -> dict:
+        server = await self._server_for(domain)
+        result = None
+        visited = set()
+        for _ in range(self.max_referrals + 1):
+            visited.add(server)
+            text = await self.query(server, domain)
+            parsed = parse_whois(text)
+            if result is None:
+                result = parsed
+            else:
+                # Данните от регистратора допълват/заместват тези от регистъра
+                for key, value in parsed.items():
+                    if value:
+                        result[key] = value
+            result['whois_server'] = server
+
+            referral = self._referral(text)
+            if not referral or referral in visited:
+                break
+            server = referral
+
+        if not result or not any(result.get(key) for key in ('registrar', 'creation_date', 'expiry_date', 'name_servers')):
+            raise WhoisError(f'Няма WHOIS данни за {domain}')
+        result['registrable_domain'] = domain
+        return result
+
+    async def _server_for(self, domain: str) -> str:
+        tld = domain.rsplit('.', 1)[-1]
+        server = self.tld_servers.get(tld)
+        if server:
+            return server
+        text = await self.query(IANA_WHOIS_SERVER, tld)
+        server = self._referral(text)
+        if not server:
+            raise WhoisError(f'Няма WHOIS сървър за .{tld}')
+        self.tld_servers[tld] = server
+        return server
+
+    @staticmethod
+    def _referral(text: str) -> Optional[str]:
+        for pattern in REFERRAL_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                server = match.group(1).strip().lower()
+                server = re.sub(r'^(r?whois|https?)://', '', server).split('/')[0]
+                host, _, port = server.partition(':')
+                if host and (not port or port == '43'):
+                    return host
+        return None
+
+    async def query(self, server: str, query: str) -> str:
+        """Изпраща една заявка към WHOIS сървър и връща отговора като текст."""
+        line = QUERY_FORMATS.get(server, '{domain}').format(domain=query)
+        encoding = self.query_encodings.get(server, 'ascii')
+        try:
+            payload = line.encode(encoding) + b'\r\n'
+        except UnicodeError:
+            raise WhoisError(f'Заявката {query!r} не може да се изпрати към {server} ({encoding})')
+        async with self._connections.slot(server):
+            await self._rate_limit(server)
+            self.queries_sent += 1
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(server, self.port), self.timeout
+            )
+            try:
+                writer.write(payload)
+                await writer.drain()
+                data = await asyncio.wait_for(self._read_response(reader), self.timeout)
+            finally:
+                writer.close()
+        return data.decode('utf-8', 'replace')
+
+    async def _read_response(self, reader: asyncio.StreamReader) -> bytes:
+        """Чете до затваряне на връзката, но не повече от max_response_bytes."""
+        chunks: List[bytes] = []
+        received = 0
+        while received < self.max_response_bytes:
+            chunk = await reader.read(min(65536, self.max_response_bytes - received))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+        return b''.join(chunks)
+
+    async def _rate_limit(self, server: str):
+        """Минимален интервал между две заявки към един сървър."""
+        now = time.monotonic()
+        ready_at = self._next_query_at.get(server, now)
+        self._next_query_at[server] = max(ready_at, now) + self.per_server_interval
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+
+    def stats(self) -> dict:
+        return {
+            'cache_entries': len(self._cache),
+            'cache_hits': self._cache.hits,
+            'cache_misses': self._cache.misses,
+            'queries_sent': self.queries_sent,
+            'inflight': len(self._inflight),
+        }
+
+
+_default_client: Optional[AsyncWhoisClient] = None
+
+
+def get_whois_client() -> AsyncWhoisClient:
+    """Връща споделения за процеса WHOIS клиент."""
+    global _default_client
+    if _default_client is None:
+        _default_client = AsyncWhoisClient(
+            timeout=settings.whois_timeout,
+            max_referrals=settings.whois_max_referrals,
+            per_server_concurrency=settings.whois_per_server_concurrency,
+            per_server_interval=settings.whois_per_server_interval,
+            max_response_bytes=settings.whois_max_response_bytes,
+        )
+    return _default_client
@@ -1,73 +1,55 @@
-import whois
-import socket
+import asyncio
 from urllib.parse import urlparse
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
+from app.config import settings
+from app.services.dns_resolver import AsyncResolver, get_resolver
+from app.services.reverse_ip import ReverseIPIndex, get_reverse_index
+from app.services.whois_client import AsyncWhoisClient, get_whois_client
 
 
 class WhoisEnricher:
     """Обогатява данните с WHOIS информация за домейна и IP."""
     
-    def enrich(self, domain: str, ip_address: Optional[str] = None) -> dict:
+    def __init__(self, resolver: Optional[AsyncResolver] = None,
+                 whois_client: Optional[AsyncWhoisClient] = None,
+                 reverse_index: Optional[ReverseIPIndex] = None):
+        self.resolver = resolver or get_resolver()
+        self.whois_client = whois_client or get_whois_client()
+        self.reverse_index = reverse_index or get_reverse_index()
+    
+    async def enrich(self, domain: str, ip_address: Optional[str] = None) -> dict:
         """
-        Взима WHOIS данни за домейна и IP адреса.
+        Взима WHOIS данни за домейна и IP адреса. Резултатът се кешира за
+        дни, затова домейните на същия IP (same_ip_websites) не са в него.
         """
         result = {
-            'domain_whois': self._get_domain_whois(domain),
-            'ip_whois': None,
-            'same_ip_websites': []
+            'domain_whois': await self._get_domain_whois(domain),
+            'ip_whois': None
         }
         
         if ip_address:
-            result['ip_whois'] = self._get_ip_whois(ip_address)
-            # За други сайтове на същия IP - не го правим засега (нямаме достъп до такава база)
-            result['same_ip_websites'] = []
+            result['ip_whois'] = await self._get_ip_whois(ip_address)
         
         return result
     
-    def _get_domain_whois(self, domain: str) -> dict:
-        """Взима WHOIS данни за домейна."""
+    async def _get_domain_whois(self, domain: str) -> dict:
+        """Взима WHOIS данни за регистрируемия домейн (www.x.com и x.com делят една заявка)."""
         try:
-            # Премахва протокола ако има
-            clean_domain = domain.replace('http://', '').replace('https://', '').split('/')[0]
-            
-            w = whois.whois(clean_domain)
+            w = await self.whois_client.lookup(domain)
             
-            # Парсване на дати
-            creation_date = None
-            expiry_date = None
-            
-            if w.creation_date:
-                if isinstance(w.creation_date, list):
-                    creation_date = w.creation_date[0]
-                else:
-                    creation_date = w.creation_date
-                if isinstance(creation_date, datetime):
-                    creation_date = creation_date.isoformat()
-            
-            if w.expiration_date:
-                if isinstance(w.expiration_date, list):
-                    expiry_date = w.expiration_date[0]
-                else:
-                    expiry_date = w.expiration_date
-                if isinstance(expiry_date, datetime):
-                    expiry_date = expiry_date.isoformat()
-            
-            # Name servers
-            name_servers = []
-            if w.name_servers:
-                if isinstance(w.name_servers, list):
-                    name_servers = [str(ns).lower() for ns in w.name_servers]
-                else:
-                    name_servers = [str(w.name_servers).lower()]
+            creation_date = w['creation_date'].isoformat() if w.get('creation_date') else None
+            expiry_date = w['expiry_date'].isoformat() if w.get('expiry_date') else None
             
             return {
-                'registrar': str(w.registrar) if w.registrar else None,
+                'registrar': w.get('registrar'),
                 'creation_date': creation_date,
                 'expiry_date': expiry_date,
-                'name_servers': name_servers,
-                'status': w.status if w.status else None,
-                'domain_age_days': self._calculate_domain_age(creation_date) if creation_date else None
+                'name_servers': w.get('name_servers') or [],
+                'status': w.get('status'),
+                'domain_age_days': self._calculate_domain_age(creation_date) if creation_date else None,
+                'registrable_domain': w.get('registrable_domain'),
+                'whois_server': w.get('whois_server')
             }
         except Exception as e:
             return {
@@ -80,15 +62,19 @@ class WhoisEnricher:
                 'error': str(e)
             }
     
-    def _get_ip_whois(self, ip_address: str) -> dict:
+    async def same_ip_websites(self, domain: str, ip_address: Optional[str]) -> List[str]:
+        """Други домейни на същия IP от обратния индекс (захранва се от всеки анализ)."""
+        if not ip_address or self.reverse_index is None:
+            return []
+        return await asyncio.to_thread(
+            self.reverse_index.domains_for_ip, ip_address, domain, settings.reverse_ip_limit
+        )
+    
+    async def _get_ip_whois(self, ip_address: str) -> dict:
         """Взима WHOIS данни за IP адреса (базови данни)."""
         try:
-            # Използваме socket за reverse DNS
-            hostname = None
-            try:
-                hostname = socket.gethostbyaddr(ip_address)[0]
-            except:
-                pass
+            # Reverse DNS през споделения resolver (кешира се и за InfrastructureDetector)
+            hostname = await self.resolver.reverse(ip_address)
             
             # За пълни WHOIS данни за IP трябва специализирана библиотека,
             # но за MVP ще върнем основни данни
@@ -0,0 +1,99 @@
+"""
+Benchmark на FingerprintEngine: цена на сканирането спрямо броя сигнатури.
+
+Стартиране (от директорията backend):
+    python -m benchmarks.bench_fingerprints --sizes 0 1000 5000 --page-mb 2
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from app.services.document import ParsedDocument
+from app.services.fingerprints import DEFAULT_SIGNATURES_PATH, FingerprintEngine, ahocorasick
+
+
+def synthetic_signatures(count: int, seed: int = 42) -> list:
+    """Генерира count случайни сигнатури (html, html_i и script_src литерали)."""
+    rng = random.Random(seed)
+    alphabet = string.ascii_lowercase + string.digits + '-.'
+    signatures = []
+    for i in range(count):
+        literal = ''.join(rng.choices(alphabet, k=rng.randint(6, 20)))
+        field = ('html', 'html_i', 'script_src')[i % 3]
+        signatures.append({'name': f'Synthetic {i}', 'category': 'javascript_libraries', field: [literal]})
+    return signatures
+
+
+def synthetic_page(size_mb: float, seed: int = 7) -> str:
+    """Генерира страница от типа WordPress/WooCommerce с приблизителен размер."""
+    rng = random.Random(seed)
+    words = ['product', 'price', 'cart', 'shipping', 'review', 'color', 'size', 'brand']
+    head = (
+        '<html><head><meta name="generator" content="WordPress 6.4.2">'
+        '<script src="/wp-content/plugins/woocommerce/assets/js/frontend.js"></script>'
+        '<script src="https://code.jquery.com/jquery-3.7.1.min.js"></script></head><body>'
+    )
+    blocks = []
+    size = len(head)
+    target = int(size_mb * 1024 * 1024)
+    while size < target:
+        text = ' '.join(rng.choices(words, k=12))
+        block = f'<div class="wc-product elementor-widget"><a href="/p/{size}">{text}</a></div>\n'
+        blocks.append(block)
+        size += len(block)
+    return head + ''.join(blocks) + '</body></html>'
+
+
+def time_engine(engine: FingerprintEngine, doc: ParsedDocument, headers: dict, repeat: int) -> float:
+    engine.match(doc, headers)  # warm-up (индекси на документа)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.match(doc, headers)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 1000, 5000],
+                        help='брой допълнителни синтетични сигнатури')
+    parser.add_argument('--page-mb', type=float, default=2.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='изход в JSON формат')
+    args = parser.parse_args()
+
+    with open(DEFAULT_SIGNATURES_PATH, encoding='utf-8') as f:
+        builtin = json.load(f)
+
+    doc = ParsedDocument(synthetic_page(args.page_mb))
+    headers = {'server': 'cloudflare', 'cf-ray': '1'}
+
+    results = []
+    for extra in args.sizes:
+        signatures = builtin + synthetic_signatures(extra)
+        start = time.perf_counter()
+        engine = FingerprintEngine(signatures)
+        compile_seconds = time.perf_counter() - start
+        scan_seconds = time_engine(engine, doc, headers, args.repeat)
+        results.append({
+            'signatures': len(signatures),
+            'compile_ms': round(compile_seconds * 1000, 2),
+            'scan_ms': round(scan_seconds * 1000, 2),
+        })
+
+    matcher = 'aho-corasick' if ahocorasick is not None else 'trie-regex'
+    if args.json:
+        print(json.dumps({'matcher': matcher, 'page_bytes': doc.size_bytes, 'results': results}, indent=2))
+        return
+
+    print(f'matcher: {matcher}, page: {doc.size_bytes / 1024 / 1024:.2f} MB')
+    print(f'{"signatures":>12} {"compile ms":>12} {"scan ms":>10}')
+    for row in results:
+        print(f'{row["signatures"]:>12} {row["compile_ms"]:>12} {row["scan_ms"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
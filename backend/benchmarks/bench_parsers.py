@@ -0,0 +1,240 @@
+"""
+Benchmark на анализаторите върху възпроизводимия корпус (benchmarks.corpus).
+
+За всяка страница се мерят поотделно парсването (ParsedDocument),
+TechnologyDetector, SEOParser, MetadataParser, целият analyze_html и
+поточният StreamingHTMLAnalyzer, а
+WebsiteAnalyzer.analyze - end to end през локален HTTP сървър. Времето е
+min/median от --repeat пуска, паметта е пикът по tracemalloc от отделен пуск
+(включва Python обектите на BeautifulSoup, но не и вътрешните буфери на
+libxml2; при end to end - и нишката на локалния сървър).
+
+Стартиране (от директорията backend):
+    python -m benchmarks.bench_parsers --out results.json
+    python -m benchmarks.bench_parsers --baseline results.json --threshold 0.15
+
+С --baseline резултатите се сравняват с предишен JSON и изходният код е 1,
+ако има регресия (по-бавно с повече от threshold или повече памет с повече
+от memory-threshold).
+"""
+import argparse
+import asyncio
+import functools
+import http.server
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from app.config import settings
+from app.services.analyzer import WebsiteAnalyzer
+from app.services.document import ParsedDocument
+from app.services.html_pool import analyze_html
+from app.services.http_client import HTTPClientPool
+from app.services.metadata_parser import MetadataParser
+from app.services.seo_parser import SEOParser
+from app.services.streaming_parser import StreamingHTMLAnalyzer
+from app.services.technology_detector import TechnologyDetector
+
+from benchmarks.corpus import build_corpus
+
+
+HEADERS = {'server': 'nginx', 'content-type': 'text/html; charset=utf-8'}
+URL = 'https://example.com/page'
+STREAM_CHUNK = 64 * 1024
+
+
+def analyze_streaming(html: str) -> dict:
+    """analyze_html през StreamingHTMLAnalyzer, на парчета като от мрежата."""
+    extractor = StreamingHTMLAnalyzer(URL)
+    extractor.begin(URL, HEADERS)
+    for offset in range(0, len(html), STREAM_CHUNK):
+        extractor.feed(html[offset:offset + STREAM_CHUNK])
+    return extractor.close()
+
+
+def _measure(run: Callable[[], None], prepare: Optional[Callable[[], tuple]], repeat: int) -> dict:
+    """Времена от repeat пуска и пиковата памет от още един (с tracemalloc)."""
+    times = []
+    for _ in range(repeat):
+        args = prepare() if prepare else ()
+        start = time.perf_counter()
+        run(*args)
+        times.append(time.perf_counter() - start)
+
+    args = prepare() if prepare else ()
+    tracemalloc.start()
+    try:
+        run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds_min': round(min(times), 6),
+        'seconds_median': round(statistics.median(times), 6),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def bench_analyzers(corpus: Dict[str, str], repeat: int) -> List[dict]:
+    results = []
+    for page, html in corpus.items():
+        fresh_document = lambda: (ParsedDocument(html),)
+        cases = {
+            'parse': (lambda: ParsedDocument(html), None),
+            'technology_detection': (lambda doc: TechnologyDetector().detect(doc, HEADERS, URL), fresh_document),
+            'on_page_seo': (lambda doc: SEOParser().parse(doc, URL), fresh_document),
+            'metadata_and_structured_data': (lambda doc: MetadataParser().parse(doc), fresh_document),
+            'analyze_html': (lambda: analyze_html(html, HEADERS, URL, URL), None),
+            'analyze_streaming': (lambda: analyze_streaming(html), None),
+        }
+        for name, (run, prepare) in cases.items():
+            results.append({'case': f'{name}/{page}', 'page_bytes': len(html.encode('utf-8')),
+                            **_measure(run, prepare, repeat)})
+            print(f'  {results[-1]["case"]}: {results[-1]["seconds_median"] * 1000:.1f} ms', file=sys.stderr)
+    return results
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def bench_end_to_end(corpus: Dict[str, str], repeat: int) -> List[dict]:
+    """WebsiteAnalyzer.analyze през локален HTTP сървър (без кеш и без process pool)."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for page, html in corpus.items():
+            with open(os.path.join(directory, f'{page}.html'), 'w', encoding='utf-8') as f:
+                f.write(html)
+
+        server = http.server.ThreadingHTTPServer(
+            ('127.0.0.1', 0), functools.partial(_QuietHandler, directory=directory)
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        async def run_all():
+            pool = HTTPClientPool.from_settings()
+            analyzer = WebsiteAnalyzer(http_pool=pool)
+            try:
+                for page, html in corpus.items():
+                    url = f'http://127.0.0.1:{port}/{page}.html'
+                    await analyzer.analyze(url)  # warm-up (връзки, DNS кеш, сигнатури)
+                    times = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        await analyzer.analyze(url)
+                        times.append(time.perf_counter() - start)
+
+                    tracemalloc.start()
+                    try:
+                        await analyzer.analyze(url)
+                        _, peak = tracemalloc.get_traced_memory()
+                    finally:
+                        tracemalloc.stop()
+
+                    results.append({
+                        'case': f'end_to_end/{page}',
+                        'page_bytes': len(html.encode('utf-8')),
+                        'seconds_min': round(min(times), 6),
+                        'seconds_median': round(statistics.median(times), 6),
+                        'peak_kb': round(peak / 1024, 1),
+                    })
+                    print(f'  {results[-1]["case"]}: {results[-1]["seconds_median"] * 1000:.1f} ms',
+                          file=sys.stderr)
+            finally:
+                await pool.aclose()
+
+        try:
+            asyncio.run(run_all())
+        finally:
+            server.shutdown()
+            server.server_close()
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float, memory_threshold: float,
+            min_delta: float) -> List[dict]:
+    """Регресиите спрямо baseline (само за случаите, които са и в двата файла)."""
+    previous = {row['case']: row for row in baseline.get('results', [])}
+    regressions = []
+    for row in current['results']:
+        base = previous.get(row['case'])
+        if base is None:
+            continue
+        old, new = base['seconds_median'], row['seconds_median']
+        if new > old * (1 + threshold) and new - old > min_delta:
+            regressions.append({'case': row['case'], 'metric': 'seconds_median', 'baseline': old,
+                                'current': new, 'ratio': round(new / old, 3) if old else None})
+        old_kb, new_kb = base.get('peak_kb'), row.get('peak_kb')
+        if old_kb and new_kb and new_kb > old_kb * (1 + memory_threshold):
+            regressions.append({'case': row['case'], 'metric': 'peak_kb', 'baseline': old_kb,
+                                'current': new_kb, 'ratio': round(new_kb / old_kb, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--link-heavy-mb', type=float, default=10.0)
+    parser.add_argument('--pages', nargs='+', help='само избрани страници от корпуса')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-end-to-end', action='store_true')
+    parser.add_argument('--out', help='запис на резултатите в JSON файл')
+    parser.add_argument('--baseline', help='JSON от предишен пуск за сравнение')
+    parser.add_argument('--threshold', type=float, default=0.15, help='допустимо забавяне (0.15 = 15%%)')
+    parser.add_argument('--memory-threshold', type=float, default=0.25)
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help='по-малки абсолютни разлики не се броят за регресия')
+    args = parser.parse_args()
+
+    # Benchmark-ът не пише в обратния IP индекс и историята на snapshot-ите
+    settings.reverse_ip_path = ''
+    settings.snapshot_path = ''
+
+    corpus = build_corpus(args.seed, args.link_heavy_mb)
+    if args.pages:
+        corpus = {name: html for name, html in corpus.items() if name in args.pages}
+
+    results = bench_analyzers(corpus, args.repeat)
+    if not args.skip_end_to_end:
+        results += bench_end_to_end(corpus, args.repeat)
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'link_heavy_mb': args.link_heavy_mb,
+            'repeat': args.repeat,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold, args.memory_threshold, args.min_delta_ms / 1000)
+        report['regressions'] = regressions
+        exit_code = 1 if regressions else 0
+
+    print(json.dumps(report, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
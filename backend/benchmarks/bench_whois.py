@@ -0,0 +1,169 @@
+"""
+Benchmark на AsyncWhoisClient срещу локален WHOIS сървър (заместител на порт 43).
+
+Сравнява асинхронния клиент (паралелни заявки, кеш по регистрируем домейн)
+с последователни блокиращи заявки по една за всеки хост - така, както
+работеше python-whois в WhoisEnricher.
+
+Стартиране (от директорията backend):
+    python -m benchmarks.bench_whois --domains 500 --latency-ms 50
+"""
+import argparse
+import asyncio
+import json
+import socket
+import threading
+import time
+
+from app.services.whois_client import AsyncWhoisClient, registrable_domain
+
+
+RESPONSE = (
+    'Domain Name: {domain}\r\n'
+    'Registrar WHOIS Server: localhost\r\n'
+    'Registrar: Example Registrar, Inc.\r\n'
+    'Creation Date: 2010-05-01T10:00:00Z\r\n'
+    'Registry Expiry Date: 2030-05-01T10:00:00Z\r\n'
+    'Name Server: NS1.{domain}\r\n'
+    'Name Server: NS2.{domain}\r\n'
+    'Domain Status: clientTransferProhibited https://icann.org/epp#clientTransferProhibited\r\n'
+)
+
+
+class StandInServer:
+    """WHOIS сървър в отделна нишка, отговарящ със закъснение latency."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.queries = 0
+        self.port = None
+        self._ready = threading.Event()
+        self._loop = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> 'StandInServer':
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, '127.0.0.1', 0, backlog=1024)
+        )
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        server.close()
+        self._loop.close()
+
+    async def _handle(self, reader, writer):
+        line = (await reader.readline()).decode().strip()
+        self.queries += 1
+        domain = line.split()[-1] if line else ''
+        await asyncio.sleep(self.latency)
+        writer.write(RESPONSE.format(domain=domain).encode())
+        await writer.drain()
+        writer.close()
+
+
+def workload(domains: int) -> list:
+    """Хостове така, както идват от анализите: няколко варианта на един домейн."""
+    hosts = []
+    for i in range(domains):
+        base = f'example{i}.com'
+        hosts.extend([base, f'www.{base}', f'shop.{base}:8443'])
+    return hosts
+
+
+def blocking_query(port: int, query: str, timeout: float = 10.0) -> str:
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as sock:
+        sock.sendall(query.encode() + b'\r\n')
+        chunks = []
+        while True:
+            chunk = sock.recv(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return b''.join(chunks).decode()
+
+
+def run_blocking(port: int, hosts: list) -> float:
+    start = time.perf_counter()
+    for host in hosts:
+        # Регистър + препратка към регистратора, без кеш
+        blocking_query(port, host.split(':')[0])
+        blocking_query(port, host.split(':')[0])
+    return time.perf_counter() - start
+
+
+async def run_async(port: int, hosts: list, concurrency: int) -> float:
+    client = AsyncWhoisClient(
+        port=port, tld_servers={'com': '127.0.0.1'},
+        per_server_concurrency=concurrency, per_server_interval=0,
+    )
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client.lookup(host) for host in hosts), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        raise RuntimeError(f'{len(errors)} неуспешни заявки, напр.: {errors[0]}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--domains', type=int, default=500, help='брой уникални регистрируеми домейни')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='закъснение на сървъра за заявка')
+    parser.add_argument('--concurrency', type=int, default=50, help='едновременни връзки към сървъра')
+    parser.add_argument('--blocking-limit', type=int, default=50,
+                        help='брой хостове за блокиращия вариант (екстраполира се)')
+    parser.add_argument('--json', action='store_true', help='изход в JSON формат')
+    args = parser.parse_args()
+
+    hosts = workload(args.domains)
+    server = StandInServer(args.latency_ms / 1000).start()
+    try:
+        async_seconds = asyncio.run(run_async(server.port, hosts, args.concurrency))
+        async_queries = server.queries
+
+        sample = hosts[:args.blocking_limit]
+        sample_seconds = run_blocking(server.port, sample)
+        blocking_seconds = sample_seconds * len(hosts) / max(1, len(sample))
+    finally:
+        server.stop()
+
+    result = {
+        'hosts': len(hosts),
+        'registrable_domains': len({registrable_domain(h) for h in hosts}),
+        'latency_ms': args.latency_ms,
+        'async': {
+            'seconds': round(async_seconds, 3),
+            'queries': async_queries,
+            'hosts_per_second': round(len(hosts) / async_seconds, 1),
+        },
+        'blocking': {
+            'seconds_estimated': round(blocking_seconds, 3),
+            'queries': len(hosts) * 2,
+            'hosts_per_second': round(len(hosts) / blocking_seconds, 1),
+        },
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f'hosts: {result["hosts"]} ({result["registrable_domains"]} регистрируеми домейна), '
+          f'latency: {args.latency_ms} ms')
+    print(f'{"mode":>10} {"seconds":>10} {"queries":>9} {"hosts/s":>10}')
+    print(f'{"async":>10} {result["async"]["seconds"]:>10} {result["async"]["queries"]:>9} '
+          f'{result["async"]["hosts_per_second"]:>10}')
+    print(f'{"blocking":>10} {result["blocking"]["seconds_estimated"]:>10} {result["blocking"]["queries"]:>9} '
+          f'{result["blocking"]["hosts_per_second"]:>10}')
+
+
+if __name__ == '__main__':
+    main()
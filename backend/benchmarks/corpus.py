@@ -0,0 +1,168 @@
+"""
+Възпроизводим корпус от HTML страници за benchmark-ите.
+
+Всички страници се генерират от seed, така че два пуска с еднакви
+параметри дават байт по байт еднакъв корпус:
+    tiny            минимална страница
+    wordpress       типична WordPress/WooCommerce страница
+    shopify         типична Shopify страница
+    link_heavy      голяма страница с много линкове (по подразбиране 10 MB)
+    pathological    дълбоко влагане, незатворени тагове, огромни атрибути,
+                    много <script> блокове и невалиден JSON-LD
+
+Записване на корпуса на диск (от директорията backend):
+    python -m benchmarks.corpus --out /tmp/corpus
+"""
+import argparse
+import json
+import os
+import random
+from typing import Dict
+
+
+WORDS = (
+    'product price cart shipping review color size brand quality fast free delivery '
+    'organic cotton summer winter sale discount new arrivals best seller gift'
+).split()
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+
+def tiny_page(rng: random.Random) -> str:
+    return (
+        '<!DOCTYPE html><html lang="en"><head><title>Tiny</title>'
+        '<meta name="description" content="A tiny page"></head>'
+        f'<body><h1>Tiny</h1><p>{_sentence(rng)}</p><a href="/about">About</a></body></html>'
+    )
+
+
+def wordpress_page(rng: random.Random, products: int = 120) -> str:
+    head = (
+        '<!DOCTYPE html><html lang="en-US"><head><meta charset="UTF-8">'
+        '<title>Shop - Example Store</title>'
+        '<meta name="description" content="Example WooCommerce store">'
+        '<meta name="generator" content="WordPress 6.4.2">'
+        '<meta property="og:title" content="Example Store"><meta property="og:type" content="website">'
+        '<meta name="twitter:card" content="summary_large_image">'
+        '<link rel="canonical" href="https://example.com/shop/">'
+        '<link rel="alternate" type="application/rss+xml" href="https://example.com/feed/">'
+        '<link rel="stylesheet" href="/wp-content/themes/astra/style.css">'
+        '<script src="/wp-includes/js/jquery/jquery.min.js?ver=3.7.1"></script>'
+        '<script src="/wp-content/plugins/woocommerce/assets/js/frontend/woocommerce.min.js"></script>'
+        '<script src="/wp-content/plugins/elementor/assets/js/frontend.min.js"></script>'
+        '<script src="https://www.googletagmanager.com/gtm.js?id=GTM-XXXX"></script>'
+        '<script type="application/ld+json">{"@context":"https://schema.org","@type":"Organization",'
+        '"name":"Example Store","url":"https://example.com"}</script>'
+        '</head><body class="home wp-theme-astra woocommerce">'
+        '<header><nav>' + ''.join(f'<a href="/category/{i}/">Category {i}</a>' for i in range(12)) +
+        '</nav></header><main><h1>Shop</h1>'
+    )
+    items = []
+    for i in range(products):
+        items.append(
+            f'<div class="product elementor-widget"><h2>{_sentence(rng, 4)}</h2>'
+            f'<a href="/product/item-{i}/"><img src="/wp-content/uploads/2024/01/item-{i}.jpg" '
+            f'alt="{"" if i % 7 == 0 else _sentence(rng, 3)}"></a>'
+            f'<p>{_sentence(rng)}</p><span class="price">{rng.randint(5, 500)}.00</span>'
+            f'<a rel="nofollow" href="/?add-to-cart={i}">Add to cart</a></div>'
+        )
+    footer = (
+        '</main><footer><a href="https://facebook.com/example">Facebook</a>'
+        '<a href="https://twitter.com/example">Twitter</a></footer></body></html>'
+    )
+    return head + ''.join(items) + footer
+
+
+def shopify_page(rng: random.Random, products: int = 80) -> str:
+    head = (
+        '<!doctype html><html lang="en"><head><title>Example - Shopify Store</title>'
+        '<meta name="description" content="Example Shopify store">'
+        '<link rel="preconnect" href="https://cdn.shopify.com">'
+        '<script src="https://cdn.shopify.com/s/files/1/0000/0001/t/1/assets/theme.js"></script>'
+        '<script>window.Shopify = window.Shopify || {}; Shopify.theme = {"name":"Dawn"};</script>'
+        '<script src="https://connect.facebook.net/en_US/fbevents.js"></script>'
+        '<script type="application/ld+json">{"@context":"http://schema.org","@type":"Product",'
+        '"name":"Example product","offers":{"@type":"Offer","price":"19.99"}}</script>'
+        '</head><body><h1>Collection</h1>'
+    )
+    items = []
+    for i in range(products):
+        items.append(
+            f'<div class="grid__item"><a href="/products/p-{i}">'
+            f'<img src="//cdn.shopify.com/s/files/1/0000/0001/products/p{i}.jpg?v=1" alt="{_sentence(rng, 3)}">'
+            f'</a><h3>{_sentence(rng, 4)}</h3><span>${rng.randint(5, 200)}</span></div>'
+        )
+    return head + ''.join(items) + '</body></html>'
+
+
+def link_heavy_page(rng: random.Random, size_mb: float = 10.0) -> str:
+    head = '<html><head><title>Sitemap</title></head><body><h1>All pages</h1><ul>'
+    target = int(size_mb * 1024 * 1024)
+    parts = [head]
+    size = len(head)
+    i = 0
+    while size < target:
+        if i % 5 == 0:
+            href = f'https://external-{rng.randint(0, 500)}.example.org/page/{i}'
+        else:
+            href = f'/section/{i % 97}/page-{i}.html'
+        if i % 11 == 0:
+            href += '#top'
+        part = f'<li><a href="{href}">{_sentence(rng, 4)}</a></li>\n'
+        parts.append(part)
+        size += len(part)
+        i += 1
+    parts.append('</ul></body></html>')
+    return ''.join(parts)
+
+
+def pathological_page(rng: random.Random) -> str:
+    parts = ['<html><head><title>Broken</title>']
+    # Много script блокове и невалиден JSON-LD
+    for i in range(300):
+        parts.append(f'<script>var x{i} = "{"<div>" * 5}";</script>')
+    parts.append('<script type="application/ld+json">{"@type": "Thing", "name": </script>')
+    parts.append(f'<meta name="description" content="{"A" * 200000}">')
+    parts.append('</head><body>')
+    # Дълбоко влагане
+    parts.append('<div>' * 3000 + 'deep' + '</div>' * 3000)
+    # Незатворени тагове и смесени атрибути
+    for i in range(2000):
+        parts.append(f'<p class="c{i}"><span data-x="{i}"><a href=/u{i}>{_sentence(rng, 3)}<b><i>')
+    parts.append('<table>' + '<tr><td>cell' * 5000 + '</table>')
+    parts.append('<h1>' + '<h2>nested heading' * 500)
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def build_corpus(seed: int = 1234, link_heavy_mb: float = 10.0) -> Dict[str, str]:
+    """Генерира корпуса; всяка страница има собствен генератор от seed."""
+    return {
+        'tiny': tiny_page(random.Random(seed)),
+        'wordpress': wordpress_page(random.Random(seed + 1)),
+        'shopify': shopify_page(random.Random(seed + 2)),
+        'link_heavy': link_heavy_page(random.Random(seed + 3), link_heavy_mb),
+        'pathological': pathological_page(random.Random(seed + 4)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--out', required=True, help='директория за HTML файловете')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--link-heavy-mb', type=float, default=10.0)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    sizes = {}
+    for name, html in build_corpus(args.seed, args.link_heavy_mb).items():
+        with open(os.path.join(args.out, f'{name}.html'), 'w', encoding='utf-8') as f:
+            f.write(html)
+        sizes[name] = len(html.encode('utf-8'))
+    print(json.dumps(sizes, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 const API_URL = 'http://localhost:8000/analyze';
+const STREAM_URL = `${API_URL}/stream`;
 
-document.getElementById('analyzeForm').addEventListener('submit', async (e) => {
+let currentStream = null;
+
+document.getElementById('analyzeForm').addEventListener('submit', (e) => {
     e.preventDefault();
     
     const urlInput = document.getElementById('urlInput');
@@ -10,35 +13,93 @@ document.getElementById('analyzeForm').addEventListener('submit', async (e) => {
     const report = document.getElementById('report');
     
     // Reset UI
+    if (currentStream) {
+        currentStream.close();
+    }
     loading.classList.remove('hidden');
     error.classList.add('hidden');
     report.classList.add('hidden');
     report.innerHTML = '';
     
-    try {
-        const response = await fetch(API_URL, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ url: url })
+    // Секциите пристигат като Server-Sent Events и се рендерират веднага
+    const data = { url: url };
+    const stream = new EventSource(`${STREAM_URL}?url=${encodeURIComponent(url)}`);
+    currentStream = stream;
+    
+    const finish = () => {
+        stream.close();
+        currentStream = null;
+        loading.classList.add('hidden');
+    };
+    
+    SECTION_EVENTS.forEach(name => {
+        stream.addEventListener(name, (event) => {
+            applySection(data, name, JSON.parse(event.data));
+            renderReport(data);
+            report.classList.remove('hidden');
         });
-        
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        
-        const data = await response.json();
-        renderReport(data);
+    });
+    
+    stream.addEventListener('done', (event) => {
+        renderReport(JSON.parse(event.data));
         report.classList.remove('hidden');
-    } catch (err) {
-        error.textContent = `Грешка: ${err.message}`;
+        finish();
+    });
+    
+    stream.addEventListener('error', (event) => {
+        // Събитие от сървъра (с данни) или прекъсната връзка (без данни)
+        const message = event.data ? JSON.parse(event.data).detail : 'Връзката със сървъра беше прекъсната';
+        error.textContent = `Грешка: ${message}`;
         error.classList.remove('hidden');
-    } finally {
-        loading.classList.add('hidden');
-    }
+        finish();
+    });
 });
 
+const SECTION_EVENTS = [
+    'crawl',
+    'technology_detection',
+    'on_page_seo',
+    'metadata_and_structured_data',
+    'infrastructure',
+    'whois'
+];
+
+function applySection(data, name, payload) {
+    const infra = data.domain_and_infrastructure = data.domain_and_infrastructure || {};
+    
+    if (name === 'crawl') {
+        data.final_url = payload.final_url;
+        infra.domain = payload.domain;
+        infra.ip_address = payload.ip_address;
+        infra.web_server = payload.web_server;
+        infra.http_to_https_redirect = payload.http_to_https_redirect;
+        infra.response_headers = payload.headers;
+    } else if (name === 'whois') {
+        const domainWhois = payload.domain_whois || {};
+        data.whois_and_ip_whois = payload;
+        infra.domain_age_days = domainWhois.domain_age_days;
+        infra.registrar = domainWhois.registrar;
+        infra.expiry_date = domainWhois.expiry_date;
+        infra.name_servers = domainWhois.name_servers || [];
+    } else if (name === 'infrastructure') {
+        infra.hosting_provider = payload.hosting_provider;
+        infra.server_location_country = payload.server_location_country;
+        infra.asn = payload.asn;
+        infra.as_organization = payload.as_organization;
+    } else {
+            data[name] = payload;
+    }
+}
+
+function renderPendingSection(title) {
+    return `
+        <div class="section">
+            <h3 class="section-title">${title}</h3>
+            <div class="empty-list">Loading...</div>
+        </div>
+    `;
+}
+
 function renderReport(data) {
     const report = document.getElementById('report');
     const now = new Date();
@@ -91,6 +152,14 @@ function renderReport(data) {
                     <th>Server Location</th>
                     <td>${escapeHtml(data.domain_and_infrastructure?.server_location_country || 'Not detected')}</td>
                 </tr>
+                <tr>
+                    <th>Hosting Provider</th>
+                    <td>${escapeHtml(data.domain_and_infrastructure?.hosting_provider || 'Not detected')}</td>
+                </tr>
+                <tr>
+                    <th>ASN</th>
+                    <td>${data.domain_and_infrastructure?.asn ? escapeHtml(`AS${data.domain_and_infrastructure.asn} ${data.domain_and_infrastructure.as_organization || ''}`) : 'Not detected'}</td>
+                </tr>
                 <tr>
                     <th>HTTP → HTTPS Redirect</th>
                     <td>${data.domain_and_infrastructure?.http_to_https_redirect ? 'Yes' : 'No'}</td>
@@ -133,311 +202,328 @@ function renderReport(data) {
     `;
     
     // Technologies Section
-    html += `
-        <div class="section">
-            <h3 class="section-title">Technologies</h3>
-    `;
+    if (!data.technology_detection) {
+        html += renderPendingSection('Technologies');
+    } else {
+        html += `
+            <div class="section">
+                <h3 class="section-title">Technologies</h3>
+        `;
     
-    const tech = data.technology_detection || {};
+        const tech = data.technology_detection || {};
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">CMS</div>
-                <table>
-                    <tr>
-                        <th>Name</th>
-                        <td>${escapeHtml(tech.cms || 'Not detected')}</td>
-                    </tr>
-                    <tr>
-                        <th>Version</th>
-                        <td>${escapeHtml(tech.cms_version || 'Not detected')}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">CMS</div>
+                    <table>
+                        <tr>
+                            <th>Name</th>
+                            <td>${escapeHtml(tech.cms || 'Not detected')}</td>
+                        </tr>
+                        <tr>
+                            <th>Version</th>
+                            <td>${escapeHtml(tech.cms_version || 'Not detected')}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Plugins</div>
-                ${renderList(tech.plugins)}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Plugins</div>
+                    ${renderList(tech.plugins)}
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">JavaScript Libraries</div>
-                ${renderList(tech.javascript_libraries)}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">JavaScript Libraries</div>
+                    ${renderList(tech.javascript_libraries)}
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Cache Systems</div>
-                ${renderList(tech.cache_systems)}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Cache Systems</div>
+                    ${renderList(tech.cache_systems)}
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">CDN</div>
-                <table>
-                    <tr>
-                        <th>CDN Provider</th>
-                        <td>${escapeHtml(tech.cdn || 'Not detected')}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">CDN</div>
+                    <table>
+                        <tr>
+                            <th>CDN Provider</th>
+                            <td>${escapeHtml(tech.cdn || 'Not detected')}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Tag Managers</div>
-                ${renderList(tech.tag_managers)}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Tag Managers</div>
+                    ${renderList(tech.tag_managers)}
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">HTTP/TLS</div>
-                <table>
-                    <tr>
-                        <th>HTTP Version</th>
-                        <td>${escapeHtml(tech.http_version || 'Not detected')}</td>
-                    </tr>
-                    <tr>
-                        <th>TLS Version</th>
-                        <td>${escapeHtml(tech.tls_version || 'Not detected')}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">HTTP/TLS</div>
+                    <table>
+                        <tr>
+                            <th>HTTP Version</th>
+                            <td>${escapeHtml(tech.http_version || 'Not detected')}</td>
+                        </tr>
+                        <tr>
+                            <th>TLS Version</th>
+                            <td>${escapeHtml(tech.tls_version || 'Not detected')}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `</div>`;
+        html += `</div>`;
+    }
     
     // On-Page SEO Section
-    html += `
-        <div class="section">
-            <h3 class="section-title">On-Page SEO</h3>
-    `;
+    if (!data.on_page_seo) {
+        html += renderPendingSection('On-Page SEO');
+    } else {
+        html += `
+            <div class="section">
+                <h3 class="section-title">On-Page SEO</h3>
+        `;
     
-    // Headings
-    const headings = data.on_page_seo?.headings || {};
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Headings</div>
-                <table>
-                    <tr>
-                        <th>H1</th>
-                        <td>${formatValue(headings.h1?.count || 0)}</td>
-                    </tr>
-                    <tr>
-                        <th>H2</th>
-                        <td>${formatValue(headings.h2?.count || 0)}</td>
-                    </tr>
-                    <tr>
-                        <th>H3</th>
-                        <td>${formatValue(headings.h3?.count || 0)}</td>
-                    </tr>
-                    <tr>
-                        <th>H4</th>
-                        <td>${formatValue(headings.h4?.count || 0)}</td>
-                    </tr>
-                    <tr>
-                        <th>H5</th>
-                        <td>${formatValue(headings.h5?.count || 0)}</td>
-                    </tr>
-                    <tr>
-                        <th>H6</th>
-                        <td>${formatValue(headings.h6?.count || 0)}</td>
-                    </tr>
-                </table>
-                ${renderHeadingContent(headings)}
-            </div>
-    `;
+        // Headings
+        const headings = data.on_page_seo?.headings || {};
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Headings</div>
+                    <table>
+                        <tr>
+                            <th>H1</th>
+                            <td>${formatValue(headings.h1?.count || 0)}</td>
+                        </tr>
+                        <tr>
+                            <th>H2</th>
+                            <td>${formatValue(headings.h2?.count || 0)}</td>
+                        </tr>
+                        <tr>
+                            <th>H3</th>
+                            <td>${formatValue(headings.h3?.count || 0)}</td>
+                        </tr>
+                        <tr>
+                            <th>H4</th>
+                            <td>${formatValue(headings.h4?.count || 0)}</td>
+                        </tr>
+                        <tr>
+                            <th>H5</th>
+                            <td>${formatValue(headings.h5?.count || 0)}</td>
+                        </tr>
+                        <tr>
+                            <th>H6</th>
+                            <td>${formatValue(headings.h6?.count || 0)}</td>
+                        </tr>
+                    </table>
+                    ${renderHeadingContent(headings)}
+                </div>
+        `;
     
-    // Links
-    const links = data.on_page_seo?.links || {};
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Links</div>
-                <table>
-                    <tr>
-                        <th>Internal</th>
-                        <td>${formatValue(links.internal)}</td>
-                    </tr>
-                    <tr>
-                        <th>External</th>
-                        <td>${formatValue(links.external)}</td>
-                    </tr>
-                    <tr>
-                        <th>Nofollow</th>
-                        <td>${formatValue(links.nofollow)}</td>
-                    </tr>
-                    <tr>
-                        <th>Duplicated</th>
-                        <td>${formatValue(links.duplicated)}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        // Links
+        const links = data.on_page_seo?.links || {};
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Links</div>
+                    <table>
+                        <tr>
+                            <th>Internal</th>
+                            <td>${formatValue(links.internal)}</td>
+                        </tr>
+                        <tr>
+                            <th>External</th>
+                            <td>${formatValue(links.external)}</td>
+                        </tr>
+                        <tr>
+                            <th>Nofollow</th>
+                            <td>${formatValue(links.nofollow)}</td>
+                        </tr>
+                        <tr>
+                            <th>Duplicated</th>
+                            <td>${formatValue(links.duplicated)}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    // Images
-    const images = data.on_page_seo?.images || {};
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Images</div>
-                <table>
-                    <tr>
-                        <th>Missing Alt</th>
-                        <td>${formatValue(images.missing_alt)}</td>
-                    </tr>
-                    <tr>
-                        <th>Duplicated</th>
-                        <td>${formatValue(images.duplicated)}</td>
-                    </tr>
-                    <tr>
-                        <th>With Title</th>
-                        <td>${formatValue(images.with_title)}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        // Images
+        const images = data.on_page_seo?.images || {};
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Images</div>
+                    <table>
+                        <tr>
+                            <th>Missing Alt</th>
+                            <td>${formatValue(images.missing_alt)}</td>
+                        </tr>
+                        <tr>
+                            <th>Duplicated</th>
+                            <td>${formatValue(images.duplicated)}</td>
+                        </tr>
+                        <tr>
+                            <th>With Title</th>
+                            <td>${formatValue(images.with_title)}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `</div>`;
+        html += `</div>`;
+    }
     
     // Metadata Section
-    html += `
-        <div class="section">
-            <h3 class="section-title">Metadata</h3>
-    `;
+    if (!data.metadata_and_structured_data) {
+        html += renderPendingSection('Metadata');
+        html += renderPendingSection('Structured Data');
+    } else {
+        html += `
+            <div class="section">
+                <h3 class="section-title">Metadata</h3>
+        `;
     
-    const metadata = data.metadata_and_structured_data || {};
+        const metadata = data.metadata_and_structured_data || {};
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Canonical</div>
-                <table>
-                    <tr>
-                        <th>URL</th>
-                        <td>${escapeHtml(metadata.canonical || 'Not detected')}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Canonical</div>
+                    <table>
+                        <tr>
+                            <th>URL</th>
+                            <td>${escapeHtml(metadata.canonical || 'Not detected')}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">OpenGraph</div>
-                ${renderKeyValueTable(metadata.open_graph)}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">OpenGraph</div>
+                    ${renderKeyValueTable(metadata.open_graph)}
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Twitter Cards</div>
-                ${renderKeyValueTable(metadata.twitter_cards)}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Twitter Cards</div>
+                    ${renderKeyValueTable(metadata.twitter_cards)}
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Feeds</div>
-                ${renderFeedList(metadata.feeds)}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Feeds</div>
+                    ${renderFeedList(metadata.feeds)}
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Robots Meta</div>
-                <table>
-                    <tr>
-                        <th>Content</th>
-                        <td>${escapeHtml(metadata.robots_meta || 'Not detected')}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Robots Meta</div>
+                    <table>
+                        <tr>
+                            <th>Content</th>
+                            <td>${escapeHtml(metadata.robots_meta || 'Not detected')}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `</div>`;
+        html += `</div>`;
     
-    // Structured Data Section
-    html += `
-        <div class="section">
-            <h3 class="section-title">Structured Data</h3>
-            ${renderJSONLD(metadata.json_ld)}
-        </div>
-    `;
+        // Structured Data Section
+        html += `
+            <div class="section">
+                <h3 class="section-title">Structured Data</h3>
+                ${renderJSONLD(metadata.json_ld)}
+            </div>
+        `;
+    }
     
     // WHOIS Section
-    html += `
-        <div class="section">
-            <h3 class="section-title">WHOIS Information</h3>
-    `;
+    if (!data.whois_and_ip_whois) {
+        html += renderPendingSection('WHOIS Information');
+    } else {
+        html += `
+            <div class="section">
+                <h3 class="section-title">WHOIS Information</h3>
+        `;
     
-    const whois = data.whois_and_ip_whois || {};
-    const domainWhois = whois.domain_whois || {};
-    const ipWhois = whois.ip_whois || {};
+        const whois = data.whois_and_ip_whois || {};
+        const domainWhois = whois.domain_whois || {};
+        const ipWhois = whois.ip_whois || {};
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Domain WHOIS</div>
-                <table>
-                    <tr>
-                        <th>Registrar</th>
-                        <td>${escapeHtml(domainWhois.registrar || 'Not detected')}</td>
-                    </tr>
-                    <tr>
-                        <th>Creation Date</th>
-                        <td>${formatDate(domainWhois.creation_date)}</td>
-                    </tr>
-                    <tr>
-                        <th>Expiry Date</th>
-                        <td>${formatDate(domainWhois.expiry_date)}</td>
-                    </tr>
-                    <tr>
-                        <th>Status</th>
-                        <td>${formatValue(domainWhois.status)}</td>
-                    </tr>
-                    <tr>
-                        <th>Name Servers</th>
-                        <td>${renderList(domainWhois.name_servers)}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Domain WHOIS</div>
+                    <table>
+                        <tr>
+                            <th>Registrar</th>
+                            <td>${escapeHtml(domainWhois.registrar || 'Not detected')}</td>
+                        </tr>
+                        <tr>
+                            <th>Creation Date</th>
+                            <td>${formatDate(domainWhois.creation_date)}</td>
+                        </tr>
+                        <tr>
+                            <th>Expiry Date</th>
+                            <td>${formatDate(domainWhois.expiry_date)}</td>
+                        </tr>
+                        <tr>
+                            <th>Status</th>
+                            <td>${formatValue(domainWhois.status)}</td>
+                        </tr>
+                        <tr>
+                            <th>Name Servers</th>
+                            <td>${renderList(domainWhois.name_servers)}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">IP WHOIS</div>
-                <table>
-                    <tr>
-                        <th>IP Address</th>
-                        <td>${escapeHtml(ipWhois.ip || 'Not detected')}</td>
-                    </tr>
-                    <tr>
-                        <th>Hostname</th>
-                        <td>${escapeHtml(ipWhois.hostname || 'Not detected')}</td>
-                    </tr>
-                    <tr>
-                        <th>Organization</th>
-                        <td>${escapeHtml(ipWhois.organization || 'Not detected')}</td>
-                    </tr>
-                    <tr>
-                        <th>Country</th>
-                        <td>${escapeHtml(ipWhois.country || 'Not detected')}</td>
-                    </tr>
-                </table>
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">IP WHOIS</div>
+                    <table>
+                        <tr>
+                            <th>IP Address</th>
+                            <td>${escapeHtml(ipWhois.ip || 'Not detected')}</td>
+                        </tr>
+                        <tr>
+                            <th>Hostname</th>
+                            <td>${escapeHtml(ipWhois.hostname || 'Not detected')}</td>
+                        </tr>
+                        <tr>
+                            <th>Organization</th>
+                            <td>${escapeHtml(ipWhois.organization || 'Not detected')}</td>
+                        </tr>
+                        <tr>
+                            <th>Country</th>
+                            <td>${escapeHtml(ipWhois.country || 'Not detected')}</td>
+                        </tr>
+                    </table>
+                </div>
+        `;
     
-    html += `
-            <div class="subsection">
-                <div class="subsection-title">Same IP Websites</div>
-                ${renderList(whois.same_ip_websites, 'None detected')}
-            </div>
-    `;
+        html += `
+                <div class="subsection">
+                    <div class="subsection-title">Same IP Websites</div>
+                    ${renderList(whois.same_ip_websites, 'None detected')}
+                </div>
+        `;
     
-    html += `</div>`;
+        html += `</div>`;
+    }
     
     report.innerHTML = html;
     
@@ -0,0 +1,200 @@
+"""
+Тестове на AsyncResolver срещу локален DNS сървър (заместител на порт 53).
+
+Стартиране (от директорията backend):
+    python -m pytest -q tests
+"""
+import asyncio
+import socket
+import struct
+from typing import Tuple
+
+from app.services.dns_resolver import TYPE_A, TYPE_PTR, AsyncResolver, _encode_name, read_hosts
+
+
+def _answer(records: dict, data: bytes) -> Tuple[Tuple[str, int], bytes]:
+    """(име, тип) на заявката и отговор от records (NXDOMAIN, ако няма запис)."""
+    labels, offset = [], 12
+    while data[offset]:
+        length = data[offset]
+        labels.append(data[offset + 1:offset + 1 + length].decode())
+        offset += 1 + length
+    question = data[12:offset + 5]
+    qtype = struct.unpack('!H', data[offset + 1:offset + 3])[0]
+    name = '.'.join(labels)
+
+    value = records.get((name, qtype))
+    if value is None:
+        return (name, qtype), data[:2] + struct.pack('!HHHHH', 0x8183, 1, 0, 0, 0) + question
+    rdata = socket.inet_aton(value) if qtype == TYPE_A else _encode_name(value)
+    answer = b'\xc0\x0c' + struct.pack('!HHIH', qtype, 1, 300, len(rdata)) + rdata
+    return (name, qtype), data[:2] + struct.pack('!HHHHH', 0x8180, 1, 1, 0, 0) + question + answer
+
+
+class StubDNSServer(asyncio.DatagramProtocol):
+    """
+    Отговаря на A и PTR заявки от records; за останалите - NXDOMAIN.
+    С truncate всеки UDP отговор е празен с TC флаг (клиентът минава на TCP).
+    """
+
+    def __init__(self, records: dict, garbage: bool = False, truncate: bool = False):
+        self.records = records
+        self.garbage = garbage
+        self.truncate = truncate
+        self.queries = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        query, response = _answer(self.records, data)
+        self.queries.append(query)
+        question = response[12:len(data)]
+        if self.garbage:
+            # Отговор с верния id, но с обещан запис, който липсва
+            response = data[:2] + struct.pack('!HHHHH', 0x8180, 1, 1, 0, 0) + question
+        elif self.truncate:
+            response = data[:2] + struct.pack('!HHHHH', 0x8380, 1, 0, 0, 0) + question
+        self.transport.sendto(response, addr)
+
+
+class StubTCPServer:
+    """DNS през TCP на същия порт; с wrong_id отговаря с друго id на заявката."""
+
+    def __init__(self, records: dict, wrong_id: bool = False):
+        self.records = records
+        self.wrong_id = wrong_id
+        self.queries = []
+
+    async def handle(self, reader, writer):
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+        query, response = _answer(self.records, await reader.readexactly(length))
+        self.queries.append(query)
+        if self.wrong_id:
+            response = bytes([response[0] ^ 0xFF]) + response[1:]
+        writer.write(struct.pack('!H', len(response)) + response)
+        await writer.drain()
+        writer.close()
+
+
+RECORDS = {
+    ('example.test', TYPE_A): '10.0.0.1',
+    ('1.0.0.10.in-addr.arpa', TYPE_PTR): 'host.example.test',
+}
+
+
+async def _with_server(check, garbage: bool = False, **resolver_options):
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: StubDNSServer(RECORDS, garbage), local_addr=('127.0.0.1', 0)
+    )
+    try:
+        port = transport.get_extra_info('sockname')[1]
+        options = {'timeout': 1.0, 'attempts': 1, 'hosts': {}, **resolver_options}
+        resolver = AsyncResolver(nameservers=['127.0.0.1'], port=port, **options)
+        await check(resolver, server)
+    finally:
+        transport.close()
+
+
+async def _with_tcp_fallback(check, wrong_id: bool = False):
+    loop = asyncio.get_running_loop()
+    transport, udp = await loop.create_datagram_endpoint(
+        lambda: StubDNSServer(RECORDS, truncate=True), local_addr=('127.0.0.1', 0)
+    )
+    port = transport.get_extra_info('sockname')[1]
+    tcp = StubTCPServer(RECORDS, wrong_id)
+    server = await asyncio.start_server(tcp.handle, '127.0.0.1', port)
+    try:
+        resolver = AsyncResolver(nameservers=['127.0.0.1'], port=port, timeout=1.0, attempts=1, hosts={})
+        await check(resolver, udp, tcp)
+    finally:
+        server.close()
+        transport.close()
+
+
+def test_resolves_and_caches_a_records():
+    async def check(resolver, server):
+        results = await asyncio.gather(*[resolver.resolve_ip('example.test') for _ in range(5)])
+        assert results == ['10.0.0.1'] * 5
+        assert await resolver.resolve_ip('Example.Test.') == '10.0.0.1'
+        assert server.queries == [('example.test', TYPE_A)]
+
+    asyncio.run(_with_server(check))
+
+
+def test_nxdomain_goes_to_negative_cache():
+    async def check(resolver, server):
+        assert await resolver.resolve('missing.test') == []
+        assert await resolver.resolve('missing.test') == []
+        assert server.queries == [('missing.test', TYPE_A)]
+        assert resolver.stats()['negative_cache_entries'] == 1
+
+    asyncio.run(_with_server(check))
+
+
+def test_reverse_lookup():
+    async def check(resolver, server):
+        assert await resolver.reverse('10.0.0.1') == 'host.example.test'
+        assert await resolver.reverse('not-an-ip') is None
+
+    asyncio.run(_with_server(check))
+
+
+def test_malformed_response_is_not_an_exception():
+    async def check(resolver, server):
+        # Повреденият отговор е DNSError -> fallback към системния resolver,
+        # който не познава .test; резултатът е просто "няма адрес"
+        assert await resolver.resolve_ip('example.test') is None
+        assert server.queries
+
+    asyncio.run(_with_server(check, garbage=True))
+
+
+def test_truncated_reply_retries_over_tcp():
+    async def check(resolver, udp, tcp):
+        assert await resolver.resolve_ip('example.test') == '10.0.0.1'
+        assert udp.queries == tcp.queries == [('example.test', TYPE_A)]
+
+    asyncio.run(_with_tcp_fallback(check))
+
+
+def test_tcp_reply_for_another_query_is_rejected():
+    async def check(resolver, udp, tcp):
+        # Отговорът с чуждо id не се приема; .test не е познат и на системния resolver
+        assert await resolver.resolve_ip('example.test') is None
+        assert tcp.queries
+
+    asyncio.run(_with_tcp_fallback(check, wrong_id=True))
+
+
+def test_invalid_names_are_rejected_locally():
+    async def check(resolver, server):
+        assert await resolver.resolve('a' * 64 + '.test') == []
+        assert await resolver.resolve('bad..' + 'b' * 300) == []
+        assert server.queries == []
+
+    asyncio.run(_with_server(check))
+
+
+def test_hosts_file_takes_precedence(tmp_path):
+    hosts_file = tmp_path / 'hosts'
+    hosts_file.write_text(
+        '# коментар\n'
+        '192.0.2.7   example.test alias.test  # inline\n'
+        '2001:db8::7 example.test\n'
+        'not-an-ip   broken.test\n'
+    )
+    hosts = read_hosts(str(hosts_file))
+    assert hosts == {
+        'example.test': ['192.0.2.7', '2001:db8::7'],
+        'alias.test': ['192.0.2.7'],
+    }
+
+    async def check(resolver, server):
+        assert await resolver.resolve_ip('example.test') == '192.0.2.7'
+        assert await resolver.resolve('alias.test') == ['192.0.2.7']
+        assert await resolver.reverse('192.0.2.7') == 'example.test'
+        assert server.queries == []
+
+    asyncio.run(_with_server(check, hosts=hosts))
@@ -0,0 +1,244 @@
+"""
+Тестове на правилата от robots.txt, парсера на sitemap файлове и
+SitemapIngestor срещу локален HTTP сървър.
+
+Стартиране (от директорията backend):
+    python -m pytest -q tests
+"""
+import asyncio
+import gzip
+
+from app.services.http_client import HTTPClientPool
+from app.services.sitemaps import RobotsRules, SitemapIngestor, SitemapParser, new_report, parse_robots
+from app.services.ttl_cache import TTLCache
+
+
+ROBOTS = (
+    'User-agent: *\n'
+    'Disallow: /private\n'
+    'Allow: /private/public\n'
+    '\n'
+    'User-agent: SeoApp\n'
+    'User-agent: other\n'
+    'Disallow: /blocked  # коментар\n'
+    'Crawl-delay: 2\n'
+    '\n'
+    'Sitemap: /sitemap_index.xml\n'
+    '\n'
+    'user-agent: seoapp\n'
+    'Disallow: /also-blocked\n'
+    'Crawl-delay: 5\n'
+)
+
+SITEMAP_INDEX = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    + ''.join(
+        f'<sitemap><loc>https://example.test/sitemap{i}.xml</loc><lastmod>2024-0{i}-01</lastmod></sitemap>\n'
+        for i in range(1, 4)
+    )
+    + '</sitemapindex>\n'
+).encode()
+
+URLSET = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    '<!-- коментар -->\n'
+    '<url><loc> https://example.test/a </loc><lastmod>2024-01-01</lastmod></url>\n'
+    '<url><loc>https://example.test/b</loc></url>\n'
+    '<url><lastmod>2024-01-01</lastmod></url>\n'
+    '</urlset>\n'
+).encode()
+
+
+def _parse(data: bytes, chunk_size: int = 7):
+    parser = SitemapParser()
+    entries = []
+    for offset in range(0, len(data), chunk_size):
+        entries.extend(parser.feed(data[offset:offset + chunk_size]))
+    entries.extend(parser.close())
+    return parser, entries
+
+
+def test_longest_match_wins_and_allow_wins_ties():
+    rules = RobotsRules([
+        (False, '/shop'),
+        (True, '/shop/sale'),
+        (False, '/shop/sale/old'),
+        (True, '/page'),
+        (False, '/page'),
+    ])
+    assert rules.allowed('https://example.test/') is True
+    assert rules.allowed('https://example.test/shop/cart') is False
+    assert rules.allowed('https://example.test/shop/sale/today') is True
+    assert rules.allowed('https://example.test/shop/sale/old/1') is False
+    assert rules.allowed('https://example.test/page') is True
+    assert rules.allowed('https://example.test/robots.txt') is True
+
+
+def test_wildcards_and_end_anchor():
+    rules = RobotsRules([
+        (False, '/*.pdf$'),
+        (False, '/search$'),
+        (False, '/*?sort='),
+        (True, '/docs/*/public'),
+        (False, '/docs/'),
+    ])
+    assert rules.allowed('https://example.test/files/report.pdf') is False
+    assert rules.allowed('https://example.test/files/report.pdf?v=2') is True
+    assert rules.allowed('https://example.test/files/report.pdf.html') is True
+    assert rules.allowed('https://example.test/search') is False
+    assert rules.allowed('https://example.test/search/results') is True
+    assert rules.allowed('https://example.test/list?sort=asc') is False
+    assert rules.allowed('https://example.test/list?page=2&sort=asc') is True
+    assert rules.allowed('https://example.test/docs/v1/public/index') is True
+    assert rules.allowed('https://example.test/docs/v1/internal') is False
+
+
+def test_paths_and_rules_are_compared_percent_encoded():
+    rules = RobotsRules([(False, '/цени'), (False, '/a b'), (True, '/%D1%86%D0%B5%D0%BD%D0%B8/public')])
+    assert rules.allowed('https://example.test/цени/2024') is False
+    assert rules.allowed('https://example.test/%D1%86%D0%B5%D0%BD%D0%B8') is False
+    assert rules.allowed('https://example.test/цени/public') is True
+    assert rules.allowed('https://example.test/a%20b') is False
+    assert rules.allowed('https://example.test/ab') is True
+
+
+def test_groups_are_selected_and_merged():
+    rules = parse_robots(ROBOTS, 'SeoApp', url='https://example.test/robots.txt', status=200)
+    assert rules.group == 'seoapp'
+    assert rules.allowed('https://example.test/blocked/1') is False
+    assert rules.allowed('https://example.test/also-blocked') is False
+    # Групата за * не се прилага, когато има група за агента
+    assert rules.allowed('https://example.test/private') is True
+    assert rules.crawl_delay == 5
+    assert rules.sitemaps == ['https://example.test/sitemap_index.xml']
+
+    fallback = parse_robots(ROBOTS, 'otherbot')
+    assert fallback.group == '*'
+    assert fallback.allowed('https://example.test/private/x') is False
+    assert fallback.allowed('https://example.test/private/public/x') is True
+    assert fallback.allowed('https://example.test/blocked') is True
+    assert fallback.crawl_delay is None
+
+    nothing = parse_robots('User-agent: googlebot\nDisallow: /\n', 'seoapp')
+    assert nothing.group is None
+    assert nothing.allowed('https://example.test/anything') is True
+
+
+def test_disallow_all_blocks_everything_but_robots_txt():
+    rules = RobotsRules([(True, '/')], disallow_all=True, error='HTTP 503')
+    assert rules.allowed('https://example.test/') is False
+    assert rules.allowed('https://example.test/page') is False
+    assert rules.allowed('https://example.test/robots.txt') is True
+    assert rules.summary()['disallow_all'] is True
+
+
+def test_gzipped_sitemap_index_fed_in_chunks():
+    parser, entries = _parse(gzip.compress(SITEMAP_INDEX), chunk_size=1)
+    assert parser.gzip is True
+    assert parser.kind == 'sitemapindex'
+    assert parser.size == len(SITEMAP_INDEX)
+    assert entries == [
+        ('sitemap', f'https://example.test/sitemap{i}.xml', f'2024-0{i}-01') for i in range(1, 4)
+    ]
+
+
+def test_urlset_and_text_sitemaps():
+    parser, entries = _parse(b'\xef\xbb\xbf\n' + URLSET)
+    assert parser.kind == 'urlset'
+    assert parser.gzip is False
+    assert entries == [
+        ('url', 'https://example.test/a', '2024-01-01'),
+        ('url', 'https://example.test/b', None),
+    ]
+
+    parser, entries = _parse(b'https://example.test/1\r\n\nhttps://example.test/2\nhttps://example.test/3')
+    assert parser.kind == 'text'
+    assert [loc for _, loc, _ in entries] == [f'https://example.test/{i}' for i in range(1, 4)]
+
+
+class StandInServer:
+    """
+    HTTP/1.1 сървър, който връща (статус, тяло) от routes по пътя (404 за
+    останалите); {origin} в текстово тяло се заменя с адреса на сървъра.
+    """
+
+    def __init__(self, routes: dict):
+        self.routes = routes
+        self.origin = None
+        self.paths = []
+
+    async def handle(self, reader, writer):
+        request = await reader.readuntil(b'\r\n\r\n')
+        path = request.split(b' ', 2)[1].decode()
+        self.paths.append(path)
+        status, body = self.routes.get(path, (404, b''))
+        if isinstance(body, str):
+            body = body.format(origin=self.origin).encode()
+        writer.write(
+            f'HTTP/1.1 {status} X\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
+        writer.close()
+
+
+async def _with_server(check, routes: dict):
+    server = StandInServer(routes)
+    listener = await asyncio.start_server(server.handle, '127.0.0.1', 0)
+    server.origin = f'http://127.0.0.1:{listener.sockets[0].getsockname()[1]}'
+    http = HTTPClientPool(http2=False, timeout=5.0)
+    try:
+        ingestor = SitemapIngestor(http, robots_cache=TTLCache(), user_agent='seoapp', timeout=5.0)
+        await check(ingestor, server, server.origin)
+    finally:
+        await http.aclose()
+        listener.close()
+
+
+def test_unavailable_robots_txt_disallows_everything():
+    async def check(ingestor, server, origin):
+        rules = await ingestor.robots(f'{origin}/page')
+        assert rules.disallow_all is True
+        assert rules.status == 503
+        assert rules.allowed(f'{origin}/page') is False
+        # Резултатът се кешира - robots.txt не се тегли повторно
+        await ingestor.robots(f'{origin}/other')
+        assert server.paths == ['/robots.txt']
+
+    asyncio.run(_with_server(check, {'/robots.txt': (503, b'')}))
+
+
+def test_missing_robots_txt_allows_everything():
+    async def check(ingestor, server, origin):
+        rules = await ingestor.robots(f'{origin}/page')
+        assert rules.disallow_all is False
+        assert rules.status == 404
+        assert rules.allowed(f'{origin}/page') is True
+
+    asyncio.run(_with_server(check, {}))
+
+
+def test_ingestor_follows_gzipped_index_and_applies_robots():
+    index = (
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        '<sitemap><loc>/pages.txt</loc></sitemap></sitemapindex>'
+    )
+    routes = {
+        '/robots.txt': (200, 'User-agent: *\nDisallow: /b\nSitemap: /index.xml.gz\n'),
+        '/index.xml.gz': (200, gzip.compress(index.encode())),
+        '/pages.txt': (200, '{origin}/a\n{origin}/b\n{origin}/c\n{origin}/a\nhttps://elsewhere.test/x\n'),
+    }
+
+    async def check(ingestor, server, origin):
+        report = new_report()
+        urls = [url async for url in ingestor.iter_urls(f'{origin}/', report)]
+        assert urls == [f'{origin}/a', f'{origin}/c']
+        assert report['sitemaps_fetched'] == 2
+        assert report['sitemaps'][0]['gzip'] is True
+        assert report['sitemaps'][0]['type'] == 'sitemapindex'
+        assert report['sitemaps'][1]['type'] == 'text'
+        assert report['urls_found'] == 5
+        assert report['urls_allowed'] == 2
+
+    asyncio.run(_with_server(check, routes))
@@ -0,0 +1,166 @@
+"""
+Тестове на AsyncWhoisClient срещу локални WHOIS сървъри (заместители на порт 43):
+регистър на 127.0.0.1, който препраща към регистратор на 127.0.0.2.
+
+Стартиране (от директорията backend):
+    python -m pytest -q tests
+"""
+import asyncio
+import time
+
+from app.services.whois_client import AsyncWhoisClient, PublicSuffixList, WhoisError, registrable_domain
+
+
+REGISTRY_RESPONSE = (
+    'Domain Name: {domain}\r\n'
+    'Registrar WHOIS Server: 127.0.0.2\r\n'
+    'Creation Date: 2010-05-01T10:00:00Z\r\n'
+    'Registry Expiry Date: 2030-05-01T10:00:00Z\r\n'
+    'Name Server: NS1.{domain}\r\n'
+)
+
+REGISTRAR_RESPONSE = (
+    'Domain Name: {domain}\r\n'
+    'Registrar: Example Registrar, Inc.\r\n'
+    'Registrar WHOIS Server: 127.0.0.1\r\n'
+    'Name Server: NS1.{domain}\r\n'
+    'Name Server: NS2.{domain}\r\n'
+)
+
+
+class StandInServer:
+    """Отговаря с response за всяка заявка и записва заявките и паралелните връзки."""
+
+    def __init__(self, response: str, latency: float = 0.0):
+        self.response = response
+        self.latency = latency
+        self.queries = []
+        self.started_at = []
+        self.active = 0
+        self.max_active = 0
+
+    async def handle(self, reader, writer):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.started_at.append(time.monotonic())
+        try:
+            line = (await reader.readline()).decode().strip()
+            self.queries.append(line)
+            await asyncio.sleep(self.latency)
+            if line == 'huge.test':
+                writer.write(b'%' * (1024 * 1024))
+            else:
+                writer.write(self.response.format(domain=line).encode())
+            await writer.drain()
+        finally:
+            self.active -= 1
+            writer.close()
+
+
+async def _with_servers(check, latency: float = 0.0, **client_options):
+    registry = StandInServer(REGISTRY_RESPONSE, latency)
+    registrar = StandInServer(REGISTRAR_RESPONSE, latency)
+    registry_server = await asyncio.start_server(registry.handle, '127.0.0.1', 0)
+    port = registry_server.sockets[0].getsockname()[1]
+    registrar_server = await asyncio.start_server(registrar.handle, '127.0.0.2', port)
+    try:
+        options = {'timeout': 5.0, 'per_server_interval': 0, **client_options}
+        client = AsyncWhoisClient(port=port, tld_servers={'test': '127.0.0.1'}, **options)
+        await check(client, registry, registrar)
+    finally:
+        registry_server.close()
+        registrar_server.close()
+
+
+def test_follows_referral_to_registrar():
+    async def check(client, registry, registrar):
+        result = await client.lookup('www.example.test')
+        assert result['registrable_domain'] == 'example.test'
+        assert result['whois_server'] == '127.0.0.2'
+        # Регистраторът допълва данните на регистъра
+        assert result['registrar'] == 'Example Registrar, Inc.'
+        assert result['expiry_date'].year == 2030
+        assert result['name_servers'] == ['ns1.example.test', 'ns2.example.test']
+        # Препратката обратно към регистъра не се следва повторно
+        assert registry.queries == ['example.test']
+        assert registrar.queries == ['example.test']
+
+        await client.lookup('example.test')
+        assert client.queries_sent == 2
+
+    asyncio.run(_with_servers(check))
+
+
+def test_max_referrals_zero_stays_on_registry():
+    async def check(client, registry, registrar):
+        result = await client.lookup('example.test')
+        assert result['whois_server'] == '127.0.0.1'
+        assert result['registrar'] is None
+        assert registrar.queries == []
+
+    asyncio.run(_with_servers(check, max_referrals=0))
+
+
+def test_per_server_concurrency_and_interval():
+    async def check(client, registry, registrar):
+        domains = [f'site{i}.test' for i in range(4)]
+        await asyncio.gather(*(client.lookup(domain) for domain in domains))
+        assert sorted(registry.queries) == domains
+        assert registry.max_active == 1
+        assert registrar.max_active == 1
+        gaps = [b - a for a, b in zip(registry.started_at, registry.started_at[1:])]
+        assert min(gaps) >= 0.04
+
+    asyncio.run(_with_servers(check, latency=0.01, per_server_concurrency=1, per_server_interval=0.05))
+
+
+def test_response_size_is_capped():
+    async def check(client, registry, registrar):
+        text = await client.query('127.0.0.1', 'huge.test')
+        assert len(text) == 4096
+
+    asyncio.run(_with_servers(check, max_response_bytes=4096))
+
+
+def test_long_and_non_ascii_queries():
+    async def check(client, registry, registrar):
+        long_label = 'a' * 70 + '.test'
+        result = await client.lookup(long_label)
+        assert result['registrable_domain'] == long_label
+        assert registry.queries == [long_label]
+
+        text = await client.query('127.0.0.1', 'two words.test')
+        assert 'Domain Name: two words.test' in text
+
+        # Етикет над 63 знака не минава през IDNA - остава Unicode и не е ASCII
+        try:
+            await client.lookup('ü' + 'x' * 70 + '.test')
+        except WhoisError as e:
+            assert 'ascii' in str(e)
+        else:
+            raise AssertionError('очаквана WhoisError')
+        assert len(registry.queries) == 2
+
+    asyncio.run(_with_servers(check, max_referrals=0))
+
+
+def test_registrable_domain_uses_public_suffix_list():
+    suffixes = PublicSuffixList([
+        '// коментар', 'com', 'pl', 'com.pl', 'io', 'github.io', 'uk', 'co.uk', '*.ck', '!www.ck',
+    ])
+    assert registrable_domain('shop.example.com:8443', suffixes) == 'example.com'
+    assert registrable_domain('shop.example.com.pl', suffixes) == 'example.com.pl'
+    assert registrable_domain('user.github.io', suffixes) == 'user.github.io'
+    assert registrable_domain('a.b.example.co.uk', suffixes) == 'example.co.uk'
+    assert registrable_domain('foo.bar.ck', suffixes) == 'foo.bar.ck'
+    assert registrable_domain('www.ck', suffixes) == 'www.ck'
+    assert registrable_domain('co.uk', suffixes) is None
+    assert registrable_domain('unknown.tld', suffixes) == 'unknown.tld'
+    assert registrable_domain('10.0.0.1', suffixes) is None
+
+
+def test_bundled_public_suffix_list():
+    assert registrable_domain('www.example.com') == 'example.com'
+    assert registrable_domain('shop.example.com') == 'example.com'
+    assert registrable_domain('shop.example.com.pl') == 'example.com.pl'
+    assert registrable_domain('user.github.io') == 'user.github.io'